@@ -1,6 +1,7 @@
 from __future__ import annotations
-import os, io, uuid
-from flask import Flask, request, render_template, redirect, url_for, send_file, flash
+import os, json, time
+from collections import OrderedDict
+from flask import Flask, Response, g, request, render_template, redirect, url_for, send_file, flash, jsonify
 import pandas as pd
 from werkzeug.exceptions import RequestEntityTooLarge
 
@@ -8,282 +9,660 @@ from werkzeug.exceptions import RequestEntityTooLarge
 from config import (
     MAX_CONTENT_LENGTH,
     ALLOWED_EXTENSIONS,
-    RATING_ORDER,
+    RESULT_STORE_MAX_ITEMS,
+    TABLE_PAGE_SIZE,
+    TABLE_MAX_PAGE_SIZE,
+    EXPLAIN_TOP,
+    ASYNC_SCORING,
+    JOB_EVENTS_MAX_S,
+    SCORING_CACHE,
+    PROFILE_REQUESTS,
 )
-from services.io_excel import read_excel
-from services.preprocessing import basic_clean, squash_pd
-from services.inference import predict_pd, NoModelAvailable
-from services.labeling import compute_defaillance
-from services.pd_rules import pd_from_rules
-from services.rating import apply_full_notation  # seuils dynamiques, overlay, cap
+from services.io_excel import read_upload, read_records, spool_upload
+from services.model_registry import REGISTRY, NoModelAvailable
+from services.pipeline import score_frame, compact_result  # nettoyage, cible, PD, notation, statut
+from services.schema import compile_schema
+from services.jobs import JobManager, JobQueueFull, TERMINAL_STATES
+from services.exports import ExportCache, EXPORT_FORMATS
+from services.tables import TableView, build_table_view, page_records, VIEW_COLUMNS
+from services.rerating import (
+    RatingInputs, rating_inputs, rating_columns, parse_params, expand_grid, rerate, rerate_summary, distribution, sweep,
+)
+from services.stress import parse_scenarios, build_context, baseline_summary, run_stress
+from services.result_store import make_result_store, SpillingResultStore
+from services.history import make_history_store
+from services.explain import ExplanationCache, model_explainer, input_columns, explain_frame
+from services.scoring_cache import UploadCache, ROW_CACHE, hash_stream, scoring_version
+from services.metrics import METRICS, MODE_LABELS, NULL_TIMER, BYTES_BUCKETS, SamplingProfiler, save_profile, load_profile
+from services.inference import BATCHER, model_info
 
 TARGET_COMPANY = "SONATEL SENEGAL"  # filtrage par defaut
+API_COLUMNS = ["Proba_defaillance", "Notation_finale", "Reason", "Statut"]
+API_CHUNK_ROWS = 5000
 
 def allowed_file(filename: str) -> bool:
     return os.path.splitext(filename.lower())[1] in ALLOWED_EXTENSIONS
 
-def create_app():
+def create_app(result_store=None, history=None):
     app = Flask(__name__)
     app.config["SECRET_KEY"] = os.getenv("APP_SECRET_KEY", "dev-secret")
     app.config["MAX_CONTENT_LENGTH"] = MAX_CONTENT_LENGTH
 
-    # Memoire volatile (prod: cache/DB)
-    RESULTS: dict[str, pd.DataFrame] = {}
+    # Modele charge une seule fois par processus (recharge si les fichiers changent)
+    REGISTRY.warm()
+
+    # Resultats : LRU/TTL borne en memoire + Parquet partage entre workers
+    STORE = result_store or make_result_store()
+    if isinstance(STORE, SpillingResultStore):
+        STORE.sweep()
+    # Historique persistant des lignes notees (SQLite indexe, tous uploads confondus ; None si HISTORY=0)
+    HISTORY = history if history is not None else make_history_store()
+    JOBS = JobManager(STORE, history=HISTORY)
+    JOBS.sweep()
+    EXPORTS = ExportCache()
+    EXPORTS.sweep()
+    # Explications par ligne : calculees a l'affichage (LRU par worker) ou par un job (Parquet partage)
+    EXPLANATIONS = ExplanationCache()
+    EXPLANATIONS.sweep()
+    # Uploads deja notes (memes octets, meme modele/config) -> ticket existant
+    UPLOADS = UploadCache() if SCORING_CACHE else None
+    if UPLOADS is not None:
+        UPLOADS.sweep()
+
+    # Index des noms, agregats et ordres de tri par ticket (cache local au worker, meme borne que le store)
+    TABLE_VIEWS: OrderedDict[str, TableView] = OrderedDict()
+
+    def _remember_view(ticket: str, view: TableView) -> TableView:
+        TABLE_VIEWS[ticket] = view
+        TABLE_VIEWS.move_to_end(ticket)
+        while len(TABLE_VIEWS) > RESULT_STORE_MAX_ITEMS:
+            TABLE_VIEWS.popitem(last=False)
+        return view
+
+    def _table_view(ticket: str, head: pd.DataFrame) -> TableView:
+        view = TABLE_VIEWS.get(ticket)
+        if view is None:
+            view = build_table_view(head, lambda cols: STORE.get(ticket, columns=cols))
+        return _remember_view(ticket, view)
+
+    # Entrees de notation (PD, rangs par annee, bonus secteur, tris) par ticket, pour les re-notations
+    RATING_INPUTS: OrderedDict[str, RatingInputs] = OrderedDict()
+
+    def _rating_inputs(ticket: str, head: pd.DataFrame) -> RatingInputs:
+        inputs = RATING_INPUTS.get(ticket)
+        if inputs is None:
+            cols = [c for c in (*rating_columns(head.columns), "Proba_defaillance", "Notation_finale")
+                    if c is not None and c in head.columns]
+            inputs = rating_inputs(STORE.get(ticket, columns=cols))
+        RATING_INPUTS[ticket] = inputs
+        RATING_INPUTS.move_to_end(ticket)
+        while len(RATING_INPUTS) > RESULT_STORE_MAX_ITEMS:
+            RATING_INPUTS.popitem(last=False)
+        return inputs
+
+    def _table_page(ticket: str, head: pd.DataFrame, kind: str) -> dict:
+        """Page demandee (company, sort, order, page, size) : lignes formatees + agregats du filtre."""
+        view = _table_view(ticket, head)
+        args = request.args
+        sort = args.get("sort", "ligne")
+        descending = args.get("order", "asc") == "desc"
+        try:
+            number, size = int(args.get("page", 1)), int(args.get("size", TABLE_PAGE_SIZE))
+        except ValueError:
+            number, size = 1, TABLE_PAGE_SIZE
+        company = args.get("company", "").strip()
+        out = view.page(company, sort, descending, number, size)
+
+        # seules les lignes de la page sont lues et formatees
+        ent_col, year_col = view.index.ent_col, view.year_col
+        cols = [ent_col] + ([year_col] if year_col else []) + [c for c in VIEW_COLUMNS[kind] if c in head.columns]
+        df = STORE.get(ticket, columns=cols).iloc[out["positions"]]
+        out.update(rows=page_records(df, kind, ent_col, year_col), positions=out["positions"].tolist(), company=company,
+                   sort=sort, order="desc" if descending else "asc")
+        return out
+
+    # ---------------- INSTRUMENTATION ----------------
+    # Sans METRICS ni PROFILE_REQUESTS, aucun hook n'est installe (cout nul)
+    if METRICS.enabled or PROFILE_REQUESTS:
+        @app.before_request
+        def _start_instrumentation():
+            g.timer = METRICS.timer()
+            if PROFILE_REQUESTS and request.args.get("profile") == "1":
+                g.profiler = SamplingProfiler().start()
+
+        @app.after_request
+        def _finish_instrumentation(resp):
+            timer = g.pop("timer", NULL_TIMER)
+            total = timer.stop()
+            if timer is not NULL_TIMER:
+                METRICS.observe("brvm_request_seconds", total, endpoint=request.endpoint or "inconnu")
+                resp.headers["Server-Timing"] = timer.server_timing(total)
+            profiler = g.pop("profiler", None)
+            if profiler is not None:
+                pid = save_profile(profiler.stop())
+                resp.headers["X-Profile"] = url_for("profile", pid=pid)
+            return resp
+
+    def _timer():
+        return g.get("timer", NULL_TIMER)
+
+    def _model_info() -> dict:
+        try:
+            bundle = REGISTRY.get()
+        except NoModelAvailable:
+            return {(("mode", "regles"), ("version", "")): 1}
+        return {(("mode", MODE_LABELS[bundle.mode]), ("version", bundle.version)): 1}
+
+    def _count_upload():
+        if request.content_length:
+            METRICS.observe("brvm_upload_bytes", request.content_length, buckets=BYTES_BUCKETS)
+
+    METRICS.collector("brvm_result_store_items", "gauge", "Résultats conservés par ce worker.",
+                      lambda: {(): STORE.stats()["items"]})
+    METRICS.collector("brvm_result_store_bytes", "gauge", "Mémoire des résultats conservés par ce worker.",
+                      lambda: {(): STORE.stats()["bytes"]})
+    METRICS.collector("brvm_model_info", "gauge", "Modèle chargé (mode A/B/C, version des artefacts).",
+                      _model_info)
+    METRICS.collector("brvm_cache_hits_total", "counter", "Succès des caches de notation.",
+                      lambda: {(("cache", "rows"),): ROW_CACHE.hits, (("cache", "explanations"),): EXPLANATIONS.hits,
+                               **({(("cache", "uploads"),): UPLOADS.hits} if UPLOADS is not None else {})})
+    METRICS.collector("brvm_cache_misses_total", "counter", "Échecs des caches de notation.",
+                      lambda: {(("cache", "rows"),): ROW_CACHE.misses, (("cache", "explanations"),): EXPLANATIONS.misses,
+                               **({(("cache", "uploads"),): UPLOADS.misses} if UPLOADS is not None else {})})
+    METRICS.collector("brvm_microbatch_batches_total", "counter", "Lots traités par le micro-batching.",
+                      lambda: {(): BATCHER.stats()["batches"]})
+    METRICS.collector("brvm_microbatch_queue_depth", "gauge", "Appels en attente du micro-batching.",
+                      lambda: {(): BATCHER.stats()["queue_depth"]})
+    def _microbatch_hist(counts: str, total: str):
+        def fn():
+            stats = BATCHER.stats()
+            return {(): (stats[counts], stats[total])}
+        return fn
+
+    METRICS.collector("brvm_microbatch_batch_rows", "histogram", "Lignes par lot du micro-batching.",
+                      _microbatch_hist("batch_rows", "rows"))
+    METRICS.collector("brvm_microbatch_batch_requests", "histogram", "Appelants regroupés par lot du micro-batching.",
+                      _microbatch_hist("batch_requests", "requests"))
+    METRICS.collector("brvm_microbatch_queue_depth_at_dispatch", "histogram",
+                      "File d'attente du micro-batching au départ de chaque lot.",
+                      _microbatch_hist("queue_depth_at_dispatch", "queued_at_dispatch"))
+
+    def _reusable(ticket: str, pending_ok: bool) -> bool:
+        """Resultat encore stocke (ou, en asynchrone, job du meme upload encore en cours)."""
+        if STORE.head(ticket) is not None:
+            return True
+        state = (JOBS.status(ticket) or {}).get("state")
+        return pending_ok and state is not None and state not in TERMINAL_STATES
 
     # ---------------- VUES ----------------
     @app.route("/", methods=["GET"])
     def home():
-        return render_template("upload.html")
+        return render_template("upload.html", job=request.args.get("job"), async_default=ASYNC_SCORING)
 
     @app.route("/predict", methods=["POST"])
     def predict():
         # 0) Fichier
         file = request.files.get("file")
         if not file or file.filename == "":
-            flash("Veuillez sélectionner un fichier Excel (.xlsx/.xls).")
+            flash("Veuillez sélectionner un fichier (.xlsx/.xls/.csv/.parquet).")
             return redirect(url_for("home"))
         if not allowed_file(file.filename):
-            flash("Format non autorisé. Formats acceptés : .xlsx, .xls")
+            flash("Format non autorisé. Formats acceptés : .xlsx, .xls, .csv, .parquet")
             return redirect(url_for("home"))
 
-        # 1) Lecture + nettoyage
-        stream = io.BytesIO(file.read())
+        timer = _timer()
+        _count_upload()
+
+        # 1) Meme contenu deja note par ce modele/cette config : on reutilise son ticket
+        run_async = ASYNC_SCORING or request.values.get("async") == "1"
+        cache_key = None
+        if UPLOADS is not None:
+            timer.stage("cache")
+            cache_key = UploadCache.key(hash_stream(file.stream), file.filename, scoring_version())
+            ticket = UPLOADS.get(cache_key, lambda t: _reusable(t, run_async))
+            if ticket is not None:
+                if run_async:
+                    if request.accept_mimetypes.best == "application/json":
+                        return jsonify(id=ticket, status_url=url_for("job_status", job_id=ticket)), 202
+                    return redirect(url_for("home", job=ticket))
+                return redirect(url_for("status", id=ticket, company=TARGET_COMPANY))
+
+        # 2) Mode asynchrone (opt-in) : ticket de job immediat, scoring dans le pool
+        if run_async:
+            try:
+                job_id = JOBS.submit(file, file.filename)
+            except JobQueueFull:
+                flash("Trop de traitements en cours, réessayez dans quelques instants.")
+                return redirect(url_for("home"))
+            if cache_key is not None:
+                UPLOADS.put(cache_key, job_id)
+            if request.accept_mimetypes.best == "application/json":
+                return jsonify(id=job_id, status_url=url_for("job_status", job_id=job_id)), 202
+            return redirect(url_for("home", job=job_id))
+
+        # 3) Lecture en flux depuis un fichier temporaire (xlsx par blocs, csv/parquet directs)
+        timer.stage("lecture")
+        path = spool_upload(file, suffix=os.path.splitext(file.filename.lower())[1])
         try:
-            df = read_excel(stream)
+            df = read_upload(path, file.filename)
         except Exception as e:
-            flash(f"Impossible de lire le fichier Excel : {e}")
+            flash(f"Impossible de lire le fichier : {e}")
             return redirect(url_for("home"))
-
-        df = basic_clean(df)
-
-        # 2) Cible metier
-        df["Défaillance"] = compute_defaillance(df)
-
-        # 3) PD modele si dispo, sinon regles
-        try:
-            id_cols = [c for c in df.columns if c.lower() in {
-                "nom de l'entreprise", "secteur d'activite", "secteur",
-                "identifiant", "annee", "pays"
-            }]
-            drop_cols = set(id_cols + ["Défaillance"])
-            features = (
-                df.drop(columns=[c for c in drop_cols if c in df.columns], errors="ignore")
-                  .select_dtypes(include=["number"])
-            )
-            raw_pd = predict_pd(features)
-        except NoModelAvailable:
-            raw_pd = pd_from_rules(df)
-
-        pd_adj = squash_pd(raw_pd)  # lissage leger
-
-        # 4) Notation complete
-        result = df.copy()
-        result["Proba_defaillance"] = pd_adj.values
-
-        # Colonnes robustes ANNEE / SECTEUR
-        col_pd = "Proba_defaillance"
-
-        year_candidates = [c for c in result.columns if c.upper().strip() == "ANNEE"]
-        if year_candidates:
-            col_year = year_candidates[0]
-        else:
-            col_year = "__ANNEE__"
-            result[col_year] = ""
-
-        sector_candidates = [c for c in result.columns if c.upper().strip() in {"SECTEUR D'ACTIVITE", "SECTEUR"}]
-        if sector_candidates:
-            col_sector = sector_candidates[0]
-        else:
-            col_sector = "__SECTEUR__"
-            result[col_sector] = "Inconnu"
-
-        result = apply_full_notation(result, col_pd=col_pd, col_year=col_year, col_sector=col_sector)
-
-        # 5) Statut simple
-        if "Défaillance" in result.columns:
-            result["Statut"] = result["Défaillance"].map({1: "Défaillante", 0: "Saine"}).fillna("Inconnu")
-        else:
-            result["Statut"] = (result["Proba_defaillance"] >= 0.5).map({True: "Défaillante", False: "Saine"})
-
-        # 6) Stockage et redirection (filtre par defaut SONATEL SENEGAL)
-        ticket = str(uuid.uuid4())
-        RESULTS[ticket] = result
+        finally:
+            os.remove(path)
+
+        # 4) Nettoyage, cible metier, PD, notation, statut (stocke en dtypes compacts)
+        result = compact_result(score_frame(df, timer.stage))
+        METRICS.inc("brvm_rows_processed_total", len(result))
+
+        # 5) Stockage et redirection (filtre par defaut SONATEL SENEGAL)
+        timer.stage("stockage")
+        ticket = STORE.put(result)
+        _remember_view(ticket, build_table_view(result, lambda cols: STORE.get(ticket, columns=cols)))
+        if cache_key is not None:
+            UPLOADS.put(cache_key, ticket)
+        if HISTORY is not None:
+            HISTORY.submit(result, ticket, scoring_version(), file.filename)   # fil d'ecriture, sans attente
         return redirect(url_for("status", id=ticket, company=TARGET_COMPANY))
 
+    @app.route("/jobs/<job_id>", methods=["GET"])
+    def job_status(job_id):
+        st = JOBS.status(job_id)
+        if st is None:
+            return jsonify(error="Job introuvable."), 404
+        if st.get("state") == "done":
+            st["result_url"] = url_for("status", id=st["ticket"], company=TARGET_COMPANY)
+            if st.get("kind") == "explications":
+                st["download_url"] = url_for("explain_download", ticket=st["ticket"])
+        return jsonify(st)
+
+    @app.route("/jobs/<job_id>/events", methods=["GET"])
+    def job_events(job_id):
+        """
+        Variante SSE de /jobs/<id> : un evenement a chaque changement d'etat. Le flux retient un
+        worker : il est coupe apres JOB_EVENTS_MAX_S secondes et EventSource se reconnecte (retry).
+        """
+        result_url = url_for("status", id=job_id, company=TARGET_COMPANY)
+
+        def stream():
+            last = None
+            deadline = time.monotonic() + JOB_EVENTS_MAX_S
+            yield "retry: 1000\n\n"
+            while time.monotonic() < deadline:
+                st = JOBS.status(job_id) or {"id": job_id, "state": "error", "error": "Job introuvable."}
+                if st.get("state") == "done":
+                    st["result_url"] = result_url
+                if st != last:
+                    yield f"data: {json.dumps(st, ensure_ascii=False)}\n\n"
+                    last = st
+                if st.get("state") in TERMINAL_STATES:
+                    return
+                time.sleep(0.5)
+
+        return Response(stream(), mimetype="text/event-stream",
+                        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
     @app.route("/status", methods=["GET"])
     def status():
-        """Vue 1 — Entreprise | Année | Statut | PD (%) + bouton Evaluation note."""
+        """Vue 1 — Entreprise | Année | Statut | PD (%) + bouton Evaluation note (paginee)."""
         ticket = request.args.get("id")
         company = request.args.get("company", "").strip()
-        if not ticket or ticket not in RESULTS:
+        head = STORE.head(ticket) if ticket else None
+        if head is None:
             flash("Résultat introuvable.")
             return redirect(url_for("home"))
 
-        df = RESULTS[ticket].copy()
-
-        # Colonne entreprise
-        ent_col = None
-        for c in ["NOM DE L'ENTREPRISE", "Entreprise", "ENTREPRISE", "NOM ENTREPRISE", "NOM"]:
-            if c in df.columns:
-                ent_col = c
-                break
-        if not ent_col:
-            text_cols = df.select_dtypes(include=["object"]).columns.tolist()
-            ent_col = text_cols[0] if text_cols else df.columns[0]
-
-        # Colonne ANNEE robuste
-        year_col = next((c for c in df.columns if c.upper().strip() == "ANNEE"), None)
-        if not year_col:
-            year_col = "__ANNEE__"
-            df[year_col] = ""
-
-        # Filtre entreprise optionnel
-        if company:
-            def _norm(s: str) -> str:
-                s = str(s)
-                rep = (("é","e"),("è","e"),("ê","e"),("ë","e"),
-                       ("á","a"),("à","a"),("â","a"),("ä","a"),
-                       ("í","i"),("ì","i"),("î","i"),("ï","i"),
-                       ("ó","o"),("ò","o"),("ô","o"),("ö","o"),
-                       ("ú","u"),("ù","u"),("û","u"),("ü","u"),
-                       ("ç","c"))
-            # apply replacements
-                for a,b in rep:
-                    s = s.replace(a,b).replace(a.upper(), b.upper())
-                return " ".join(s.upper().split())
-
-            target = _norm(company)
-            ent_norm = df[ent_col].astype(str).map(_norm)
-            mask = pd.Series(True, index=df.index)
-            for t in target.split():
-                mask &= ent_norm.str.contains(rf"\b{t}\b", regex=True, na=False)
-            df = df[mask].copy()
-
-        # Tableau minimal avec ANNEE
-        cols = [ent_col, year_col, "Statut"]
-        if "Proba_defaillance" in df.columns:
-            df["_PD_percent"] = (df["Proba_defaillance"] * 100).round(2)
-            cols.append("_PD_percent")
-
-        table = (
-            df[cols]
-              .rename(columns={
-                  ent_col: "Entreprise",
-                  year_col: "Année",
-                  "_PD_percent": "PD (%)",
-              })
-              .to_dict(orient="records")
-        )
+        # Page demandee seulement ; KPI issus des agregats du ticket
+        timer = _timer()
+        timer.stage("lecture")
+        table = _table_page(ticket, head, "status")
 
-        # KPIs
-        kpi = {
-            "n": int(df.shape[0]),
-            "nb_saines": int((df["Statut"] == "Saine").sum()) if "Statut" in df else 0,
-            "nb_def": int((df["Statut"] == "Défaillante").sum()) if "Statut" in df else 0,
-        }
-
-        return render_template("status.html",
-                               table=table, kpi=kpi, ticket=ticket, company=company)
+        timer.stage("rendu")
+        return render_template("status.html", table=table["rows"], kpi=table["kpi"], pager=table,
+                               ticket=ticket, company=company, explain_top=EXPLAIN_TOP)
 
     @app.route("/rating", methods=["GET"])
     def rating():
-        """Vue 2 — Entreprise | Année | Notation finale."""
+        """Vue 2 — Entreprise | Année | Notation finale (paginee)."""
         ticket = request.args.get("id")
         company = request.args.get("company", "").strip()
-        if not ticket or ticket not in RESULTS:
+        head = STORE.head(ticket) if ticket else None
+        if head is None:
             flash("Résultat introuvable.")
             return redirect(url_for("home"))
 
-        df = RESULTS[ticket].copy()
-
-        # Colonne entreprise
-        ent_col = None
-        for c in ["NOM DE L'ENTREPRISE", "Entreprise", "ENTREPRISE", "NOM ENTREPRISE", "NOM"]:
-            if c in df.columns:
-                ent_col = c
-                break
-        if not ent_col:
-            text_cols = df.select_dtypes(include=["object"]).columns.tolist()
-            ent_col = text_cols[0] if text_cols else df.columns[0]
-
-        # Colonne ANNEE robuste
-        year_col = next((c for c in df.columns if c.upper().strip() == "ANNEE"), None)
-        if not year_col:
-            year_col = "__ANNEE__"
-            df[year_col] = ""
-
-        # Filtre optionnel
-        if company:
-            def _norm(s: str) -> str:
-                s = str(s)
-                rep = (("é","e"),("è","e"),("ê","e"),("ë","e"),
-                       ("á","a"),("à","a"),("â","a"),("ä","a"),
-                       ("í","i"),("ì","i"),("î","i"),("ï","i"),
-                       ("ó","o"),("ò","o"),("ô","o"),("ö","o"),
-                       ("ú","u"),("ù","u"),("û","u"),("ü","u"),
-                       ("ç","c"))
-                for a,b in rep:
-                    s = s.replace(a,b).replace(a.upper(), b.upper())
-                return " ".join(s.upper().split())
-            target = _norm(company)
-            ent_norm = df[ent_col].astype(str).map(_norm)
-            mask = pd.Series(True, index=df.index)
-            for t in target.split():
-                mask &= ent_norm.str.contains(rf"\b{t}\b", regex=True, na=False)
-            df = df[mask].copy()
-
-        if "Notation_finale" not in df.columns:
+        if "Notation_finale" not in head.columns:
             flash("La note n'est pas disponible.")
             return redirect(url_for("status", id=ticket, company=company or None))
 
-        table = (
-            df[[ent_col, year_col, "Notation_finale"]]
-              .rename(columns={ent_col: "Entreprise", year_col: "Année"})
-              .to_dict(orient="records")
-        )
-
-        dist = (
-            df["Notation_finale"].value_counts()
-              .reindex(RATING_ORDER, fill_value=0)
-              .to_dict()
-        )
-
-        return render_template("rating.html",
-                               table=table, dist=dist, ticket=ticket, company=company)
+        # Page demandee seulement ; distribution issue des agregats du ticket
+        timer = _timer()
+        timer.stage("lecture")
+        table = _table_page(ticket, head, "rating")
+
+        timer.stage("rendu")
+        return render_template("rating.html", table=table["rows"], dist=table["dist"], pager=table,
+                               ticket=ticket, company=company, explain_top=EXPLAIN_TOP)
+
+    @app.route("/api/v1/results/<ticket>/table", methods=["GET"])
+    def result_table(ticket):
+        """
+        Une page de tableau en JSON (gabarits status/rating) :
+        ?view=status|rating&company=&sort=ligne|pd|annee|note|entreprise&order=asc|desc&page=&size=
+        """
+        head = STORE.head(ticket)
+        if head is None:
+            return jsonify(error="Résultat introuvable."), 404
+        kind = request.args.get("view", "status")
+        if kind not in VIEW_COLUMNS:
+            return jsonify(error=f"Vue inconnue : {kind}"), 400
+        return jsonify(_table_page(ticket, head, kind))
 
     @app.route("/download", methods=["GET"])
     def download():
         ticket = request.args.get("id")
         fmt = request.args.get("fmt", "xlsx")
-        if not ticket or ticket not in RESULTS:
+        if fmt not in EXPORT_FORMATS:
+            return jsonify(error=f"Format inconnu : {fmt} (attendu : {' | '.join(EXPORT_FORMATS)})"), 400
+        if not ticket or STORE.head(ticket) is None:
             flash("Résultat introuvable.")
             return redirect(url_for("home"))
-        df = RESULTS[ticket]
-
-        if fmt == "csv":
-            buf = io.StringIO()
-            df.to_csv(buf, index=False)
-            buf.seek(0)
-            return send_file(
-                io.BytesIO(buf.getvalue().encode("utf-8")),
-                as_attachment=True,
-                download_name="notes.csv",
-                mimetype="text/csv",
-            )
-        else:
-            buf = io.BytesIO()
-            with pd.ExcelWriter(buf, engine="openpyxl") as writer:
-                df.to_excel(writer, index=False, sheet_name="Résultats")
-            buf.seek(0)
-            return send_file(
-                buf,
-                as_attachment=True,
-                download_name="notes.xlsx",
-                mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-            )
+        download_name, mimetype = EXPORT_FORMATS[fmt]
+
+        # Export deja produit pour ce ticket : servi depuis le disque (ETag, GET conditionnel)
+        path = EXPORTS.get(ticket, fmt)
+        if path is None:
+            df = STORE.get(ticket)
+            if fmt == "csv":
+                # premier export CSV : envoye en flux et mis en cache au passage
+                return Response(
+                    EXPORTS.stream_csv(df, ticket),
+                    mimetype=mimetype,
+                    headers={"Content-Disposition": f"attachment; filename={download_name}"},
+                )
+            path = EXPORTS.build(df, ticket, fmt)
+
+        return send_file(
+            path,
+            as_attachment=True,
+            download_name=download_name,
+            mimetype=mimetype,
+            conditional=True,
+            etag=True,
+        )
+
+    @app.route("/results/<ticket>/memory", methods=["GET"])
+    def result_memory(ticket):
+        """Empreinte memoire d'un resultat stocke (totale et par colonne)."""
+        report = STORE.memory_report(ticket)
+        if report is None:
+            return jsonify(error="Résultat introuvable."), 404
+        return jsonify(report)
+
+    @app.route("/cache/stats", methods=["GET"])
+    def cache_stats():
+        """Taux de succes des caches de notation (uploads deja notes, PD par ligne)."""
+        return jsonify(enabled=SCORING_CACHE, version=scoring_version(),
+                       uploads=UPLOADS.stats() if UPLOADS is not None else None,
+                       rows=ROW_CACHE.stats())
+
+    @app.route("/api/v1/model", methods=["GET"])
+    def api_model():
+        """Modele servi (mode, version) et manifest d'entrainement s'il correspond."""
+        return jsonify(model_info())
+
+    @app.route("/metrics", methods=["GET"])
+    def metrics():
+        """Compteurs et histogrammes de ce worker, format texte Prometheus."""
+        if not METRICS.enabled:
+            return Response("# metriques desactivees (METRICS=0)\n", status=404, mimetype="text/plain")
+        return Response(METRICS.render(), mimetype="text/plain; version=0.0.4; charset=utf-8")
+
+    @app.route("/profiles/<pid>", methods=["GET"])
+    def profile(pid):
+        """Profil echantillonne d'une requete ?profile=1 (piles repliees, cf. en-tete X-Profile)."""
+        text = load_profile(pid) if PROFILE_REQUESTS else None
+        if text is None:
+            return jsonify(error="Profil introuvable."), 404
+        return Response(text, mimetype="text/plain; charset=utf-8")
+
+    # ---------------- API ----------------
+    @app.route("/api/v1/score", methods=["POST"])
+    def api_score():
+        """
+        Scoring sans Excel ni HTML : corps JSON / NDJSON / CSV au schema de feature_list.json,
+        reponse NDJSON (une ligne par enregistrement note, `row` = position dans la requete).
+        """
+        timer = _timer()
+        _count_upload()
+        timer.stage("lecture")
+        try:
+            df = read_records(request.get_data(cache=False), request.content_type)
+        except TypeError as e:
+            return jsonify(error=str(e)), 415
+        except ValueError as e:
+            return jsonify(error=f"Corps illisible : {e}"), 400
+        if df.empty:
+            return jsonify(error="Aucun enregistrement."), 400
+
+        df.index = pd.RangeIndex(len(df), name="row")
+        result = score_frame(df, timer.stage)
+        timer.stop()
+        METRICS.inc("brvm_rows_processed_total", len(result))
+        ids = list(compile_schema(result.columns).id_cols)
+        cols = ids + [c for c in API_COLUMNS if c in result.columns]
+
+        def stream():
+            for start in range(0, len(result), API_CHUNK_ROWS):
+                block = result.iloc[start:start + API_CHUNK_ROWS][cols].reset_index()
+                yield block.to_json(orient="records", lines=True, force_ascii=False, double_precision=15) + "\n"
+
+        return Response(stream(), mimetype="application/x-ndjson")
+
+    @app.route("/api/v1/results/<ticket>/rerate", methods=["POST"])
+    def api_rerate(ticket):
+        """
+        Re-notation des PD stockees avec des parametres surcharges (sans relancer le modele) :
+        corps {"target_shares": {...}, "overlay_caps": {...}, "abs_edges": {...}, "store": true}.
+        Reponse : distribution, matrice de migration vs la note stockee et, si store, le nouveau ticket.
+        """
+        head = STORE.head(ticket)
+        if head is None or "Proba_defaillance" not in head.columns:
+            return jsonify(error="Résultat introuvable."), 404
+        body = request.get_json(silent=True) or {}
+        store = bool(body.pop("store", True)) if isinstance(body, dict) else True
+        try:
+            params = parse_params(body)
+        except ValueError as e:
+            return jsonify(error=str(e)), 400
+
+        timer = _timer()
+        timer.stage("lecture")
+        df = STORE.get(ticket)
+        timer.stage("notation")
+        result = rerate(df, params)
+        out = {"params": params.as_dict(), "rows": len(result), **rerate_summary(df, result)}
+        if store:
+            timer.stage("stockage")
+            result = compact_result(result)
+            new = STORE.put(result)
+            _remember_view(new, build_table_view(result, lambda cols: STORE.get(new, columns=cols)))
+            out.update(ticket=new, status_url=url_for("status", id=new), rating_url=url_for("rating", id=new))
+        return jsonify(out)
+
+    @app.route("/api/v1/results/<ticket>/sweep", methods=["POST"])
+    def api_sweep(ticket):
+        """
+        Balayage de jeux de parametres sur les PD stockees, en un passage vectorise :
+        corps {"sets": [{...}, ...]} et/ou {"grid": {"overlay_caps.max_up_over_abs": [1, 2, 3], ...}, "base": {...}}.
+        Reponse : distribution et matrice de migration (vs la note stockee) par jeu.
+        """
+        head = STORE.head(ticket)
+        if head is None or "Proba_defaillance" not in head.columns:
+            return jsonify(error="Résultat introuvable."), 404
+        try:
+            params = expand_grid(request.get_json(silent=True) or {})
+        except ValueError as e:
+            return jsonify(error=str(e)), 400
+
+        timer = _timer()
+        timer.stage("lecture")
+        inputs = _rating_inputs(ticket, head)
+        timer.stage("notation")
+        sets = sweep(inputs, params)
+        return jsonify(rows=len(inputs), baseline=distribution(inputs.baseline), sets=sets)
+
+    @app.route("/api/v1/results/<ticket>/stress", methods=["POST"])
+    def api_stress(ticket):
+        """
+        Stress test des ratios d'un resultat stocke : chocs de scenario et/ou perturbations
+        aleatoires (replicats empiles, un appel au modele par bloc). Reponse NDJSON : une ligne
+        `baseline`, puis une ligne par scenario des qu'il est calcule (PD, defauts, migrations).
+        """
+        head = STORE.head(ticket)
+        if head is None:
+            return jsonify(error="Résultat introuvable."), 404
+        try:
+            scenarios, calibration = parse_scenarios(request.get_json(silent=True) or {}, head)
+            ctx = build_context(STORE.get(ticket), calibration)
+        except ValueError as e:
+            return jsonify(error=str(e)), 400
+
+        def stream():
+            yield json.dumps({"baseline": baseline_summary(ctx)}, ensure_ascii=False) + "\n"
+            for summary in run_stress(ctx, scenarios):
+                yield json.dumps(summary, ensure_ascii=False) + "\n"
+
+        return Response(stream(), mimetype="application/x-ndjson")
+
+    # ---------------- HISTORIQUE ----------------
+    def _int_arg(name: str, default: int | None = None) -> int | None:
+        value = request.args.get(name)
+        if value in (None, ""):
+            return default
+        try:
+            return int(value)
+        except ValueError:
+            raise ValueError(f"Paramètre {name} invalide : {value!r}")
+
+    def _history_query(fn):
+        """404 si l'historique est desactive, 400 si un parametre est invalide."""
+        if HISTORY is None:
+            return jsonify(error="Historique désactivé (HISTORY=0)."), 404
+        try:
+            return fn()
+        except ValueError as e:
+            return jsonify(error=str(e)), 400
+
+    @app.route("/api/v1/history/uploads", methods=["GET"])
+    def history_uploads():
+        """Derniers uploads historises (ticket, date, version modele, fichier, lignes)."""
+        return _history_query(lambda: jsonify(uploads=HISTORY.uploads(_int_arg("limit", 20))))
+
+    @app.route("/api/v1/history/companies", methods=["GET"])
+    def history_companies():
+        """Entreprises historisees dont le nom commence par ?q= (nom normalise)."""
+        return _history_query(lambda: jsonify(
+            companies=HISTORY.companies(request.args.get("q", ""), _int_arg("limit", 20))))
+
+    @app.route("/api/v1/history/companies/<path:name>", methods=["GET"])
+    def history_company(name):
+        """Trajectoire d'une entreprise sur ses ?last= derniers uploads (defaut 8), ?year= optionnel."""
+        def query():
+            found = HISTORY.company_history(name, _int_arg("last", 8), _int_arg("year"))
+            if found is None:
+                return jsonify(error="Entreprise absente de l'historique."), 404
+            return jsonify(found)
+        return _history_query(query)
+
+    @app.route("/api/v1/history/migrations", methods=["GET"])
+    def history_migrations():
+        """Migration de la note finale entre ?from= et ?to= (defaut from+1) ; ?upload= et ?sector= optionnels."""
+        def query():
+            year_from = _int_arg("from")
+            if year_from is None:
+                raise ValueError("Paramètre from (année de départ) requis.")
+            found = HISTORY.migrations(year_from, _int_arg("to", year_from + 1),
+                                       request.args.get("upload") or None, request.args.get("sector") or None)
+            if found is None:
+                return jsonify(error="Upload absent de l'historique."), 404
+            return jsonify(found)
+        return _history_query(query)
+
+    # ---------------- EXPLICATIONS ----------------
+    def _explain_rows(n_rows: int) -> list[int]:
+        """?rows=0,5,9 : positions dans le ticket (au plus TABLE_MAX_PAGE_SIZE, ordre conserve)."""
+        raw = [r for r in request.args.get("rows", "").split(",") if r.strip()]
+        if not raw:
+            raise ValueError("Paramètre rows requis (positions séparées par des virgules).")
+        if len(raw) > TABLE_MAX_PAGE_SIZE:
+            raise ValueError(f"Au plus {TABLE_MAX_PAGE_SIZE} lignes par appel.")
+        try:
+            rows = list(dict.fromkeys(int(r) for r in raw))
+        except ValueError:
+            raise ValueError(f"Paramètre rows invalide : {request.args.get('rows')!r}")
+        if any(r < 0 or r >= n_rows for r in rows):
+            raise ValueError(f"Positions attendues entre 0 et {n_rows - 1}.")
+        return rows
+
+    @app.route("/api/v1/results/<ticket>/explain", methods=["GET"])
+    def explain_rows(ticket):
+        """
+        Explications des lignes ?rows= (positions, cf. `positions` des pages de tableau) : contributions
+        des ratios a la PD (?top=, defaut toutes) et criteres KO. Seules ces lignes sont relues et calculees.
+        """
+        head = STORE.head(ticket)
+        if head is None:
+            return jsonify(error="Résultat introuvable."), 404
+        timer = _timer()
+        timer.stage("lecture")
+        flat, version = model_explainer()
+        cols = input_columns(head.columns, flat)
+        view = _table_view(ticket, head)
+        try:
+            rows = _explain_rows(view.n_rows)
+            top = _int_arg("top")
+        except ValueError as e:
+            return jsonify(error=str(e)), 400
+
+        def compute(missing: list[int]) -> pd.DataFrame:
+            timer.stage("explications")
+            return explain_frame(STORE.get(ticket, columns=cols).iloc[missing], flat, missing)
+
+        records = EXPLANATIONS.lookup(ticket, version, rows, compute)
+        if top is not None:
+            records = [{**r, "contributions": r["contributions"] and r["contributions"][:max(0, top)]}
+                       for r in records]
+        return jsonify(version=version, rows=records)
+
+    @app.route("/api/v1/results/<ticket>/explain", methods=["POST"])
+    def explain_all(ticket):
+        """Explications de tout le portefeuille dans le pool (202 + id de job) ; 200 si deja calculees."""
+        head = STORE.head(ticket)
+        if head is None:
+            return jsonify(error="Résultat introuvable."), 404
+        flat, version = model_explainer()
+        if EXPLANATIONS.full(ticket, version) is not None:
+            return jsonify(version=version, download_url=url_for("explain_download", ticket=ticket))
+        try:
+            job_id = JOBS.submit_explain(ticket, input_columns(head.columns, flat), EXPLANATIONS.path(ticket, version))
+        except JobQueueFull:
+            return jsonify(error="Trop de traitements en cours, réessayez dans quelques instants."), 503
+        return jsonify(id=job_id, status_url=url_for("job_status", job_id=job_id)), 202
+
+    @app.route("/api/v1/results/<ticket>/explain.parquet", methods=["GET"])
+    def explain_download(ticket):
+        """Parquet du calcul complet (colonnes row, pd, base, c:<feature>, v:<feature>, ko:<critere>)."""
+        path = EXPLANATIONS.full(ticket, model_explainer()[1])
+        if path is None:
+            return jsonify(error="Explications non calculées pour ce résultat (POST .../explain)."), 404
+        return send_file(path, mimetype="application/vnd.apache.parquet", as_attachment=True,
+                         download_name="explications.parquet")
 
     @app.errorhandler(RequestEntityTooLarge)
     def handle_file_too_large(e):
+        if request.path.startswith("/api/"):
+            return jsonify(error=f"Requête supérieure à {MAX_CONTENT_LENGTH // (1024*1024)} Mo."), 413
         flash(f"Votre fichier dépasse la limite de {MAX_CONTENT_LENGTH // (1024*1024)} Mo. "
               f"Réduisez la taille ou augmentez MAX_UPLOAD_MB.")
         return redirect(url_for("home"))
@@ -0,0 +1 @@
+# benchmarks — panels synthétiques (synthetic) et mesures par étape (run, compare)
@@ -0,0 +1,51 @@
+# benchmarks/compare.py — écarts entre deux fichiers de résultats de benchmarks.run
+"""
+Usage :
+    python -m benchmarks.compare base.json new.json [--threshold 0.10]
+Code retour 1 si une étape est plus lente que `threshold` (relatif, sur min_s).
+"""
+from __future__ import annotations
+import argparse, json, sys
+
+
+def load(path: str) -> dict[tuple[str, int], dict]:
+    with open(path, "r", encoding="utf-8") as f:
+        report = json.load(f)
+    return {(r["stage"], r["rows"]): r for r in report["results"] if "min_s" in r}
+
+
+def compare(base: dict, new: dict) -> list[dict]:
+    """Une ligne par (étape, taille) mesurée des deux côtés : temps et rapport new / base."""
+    rows = []
+    for key in sorted(base.keys() & new.keys(), key=lambda k: (k[1], k[0])):
+        b, n = base[key]["min_s"], new[key]["min_s"]
+        rows.append({"stage": key[0], "rows": key[1], "base_s": b, "new_s": n,
+                     "ratio": round(n / b, 3) if b > 0 else None})
+    return rows
+
+
+def main(argv: list[str] | None = None) -> int:
+    ap = argparse.ArgumentParser(description="Compare deux résultats de benchmarks.")
+    ap.add_argument("base")
+    ap.add_argument("new")
+    ap.add_argument("--threshold", type=float, default=0.10,
+                    help="ralentissement relatif toléré avant échec (défaut 10 %%)")
+    ap.add_argument("--json", action="store_true", help="sortie JSON au lieu du tableau")
+    args = ap.parse_args(argv)
+
+    rows = compare(load(args.base), load(args.new))
+    slower = [r for r in rows if r["ratio"] is not None and r["ratio"] > 1 + args.threshold]
+    if args.json:
+        json.dump({"rows": rows, "regressions": slower}, sys.stdout, indent=2, ensure_ascii=False)
+        print()
+    else:
+        print(f"{'étape':<22}{'lignes':>10}{'base (s)':>12}{'new (s)':>12}{'x':>8}")
+        for r in rows:
+            flag = "  <-" if r in slower else ""
+            ratio = f"{r['ratio']:.2f}" if r["ratio"] is not None else "-"
+            print(f"{r['stage']:<22}{r['rows']:>10}{r['base_s']:>12.4f}{r['new_s']:>12.4f}{ratio:>8}{flag}")
+    return 1 if slower else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,246 @@
+# benchmarks/run.py — temps par étape du scoring sur panels synthétiques, résultats JSON comparables
+"""
+Usage :
+    python -m benchmarks.run                          # 1k, 100k, 1M lignes -> benchmarks/results/<commit>.json
+    python -m benchmarks.run --sizes 1k,10k --repeat 5 --out base.json
+    python -m benchmarks.compare base.json new.json   # écarts entre deux commits
+
+Sont aussi mesurés (sauf --no-startup) le démarrage à froid d'un processus et la
+mémoire (Rss / Pss / privée) de chaque worker gunicorn, avec et sans préchargement.
+"""
+from __future__ import annotations
+import argparse, io, json, os, platform, shutil, statistics, subprocess, sys, tempfile, time, uuid
+from typing import Callable
+import numpy as np
+import pandas as pd
+
+from benchmarks.synthetic import make_panel, write_upload
+from benchmarks.startup import cold_start, gunicorn_workers
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+DEFAULT_SIZES = "1k,100k,1M"
+EXCEL_MAX_ROWS = 100_000   # au-delà, étapes .xlsx (lecture, export) ignorées par défaut : plusieurs minutes chacune
+HEAVY_ROWS = 100_000       # au-delà, une seule mesure par étape
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def parse_size(text: str) -> int:
+    text = text.strip().lower()
+    mult = {"k": 1_000, "m": 1_000_000}.get(text[-1:], 1)
+    return int(float(text.rstrip("km")) * mult)
+
+
+def _timed(fn: Callable, setup: Callable | None, repeat: int) -> list[float]:
+    """`repeat` mesures de fn(setup()) ; la préparation n'est pas chronométrée."""
+    times = []
+    for _ in range(repeat):
+        arg = setup() if setup else None
+        t0 = time.perf_counter()
+        fn(arg) if setup else fn()
+        times.append(time.perf_counter() - t0)
+    return times
+
+
+def _record(stage: str, rows: int, times: list[float]) -> dict:
+    best = min(times)
+    return {
+        "stage": stage,
+        "rows": rows,
+        "repeat": len(times),
+        "min_s": round(best, 6),
+        "median_s": round(statistics.median(times), 6),
+        "rows_per_s": round(rows / best, 1) if best > 0 else None,
+    }
+
+
+def _git_commit() -> str | None:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                             capture_output=True, text=True, timeout=10)
+        return out.stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def environment() -> dict:
+    import sklearn
+    from config import INFERENCE_ENGINE, FOREST_THREADS
+    from services.model_registry import REGISTRY, NoModelAvailable
+
+    try:
+        model = REGISTRY.get().version
+    except NoModelAvailable:
+        model = None
+    return {
+        "commit": _git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "sklearn": sklearn.__version__,
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "model_version": model,
+        "inference_engine": INFERENCE_ENGINE,
+        "forest_threads": FOREST_THREADS,
+    }
+
+
+def bench_size(n_rows: int, repeat: int, workdir: str, excel_max_rows: int = EXCEL_MAX_ROWS,
+               seed: int = 0, log: Callable[[str], None] = lambda s: None) -> list[dict]:
+    """Toutes les étapes pour un panel de `n_rows` lignes."""
+    from app import create_app
+    from services.exports import EXPORT_FORMATS, ExportCache
+    from services.explain import explain_frame, model_explainer
+    from services.history import HistoryStore
+    from services.inference import predict_pd
+    from services.io_excel import read_excel, read_upload
+    from services.labeling import compute_defaillance
+    from services.pipeline import compact_result, score_frame
+    from services.preprocessing import basic_clean
+    from services.rating import apply_full_notation
+    from services.rerating import expand_grid, parse_params, rating_inputs, rerate, sweep
+    from services.result_store import MemoryResultStore
+    from services.stress import build_context, parse_scenarios, run_stress
+    from services.schema import compile_schema
+
+    repeat = 1 if n_rows > HEAVY_ROWS else repeat
+    out: list[dict] = []
+
+    def run(stage: str, fn: Callable, setup: Callable | None = None) -> None:
+        out.append(_record(stage, n_rows, _timed(fn, setup, repeat)))
+        log(f"{n_rows:>9} {stage:<22} {out[-1]['min_s']:.4f}s")
+
+    raw = make_panel(n_rows, seed=seed)
+
+    # Lecture : read_excel (pandas/openpyxl) et lecture en flux de /predict
+    if n_rows <= excel_max_rows:
+        path = write_upload(raw, os.path.join(workdir, f"panel_{n_rows}.xlsx"))
+        with open(path, "rb") as f:
+            data = f.read()
+        run("read_excel", lambda: read_excel(io.BytesIO(data)))
+        run("read_upload_xlsx", lambda: read_upload(path, "panel.xlsx"))
+        os.remove(path)
+    else:
+        out.append({"stage": "read_excel", "rows": n_rows, "skipped": f"> {excel_max_rows} lignes"})
+        out.append({"stage": "read_upload_xlsx", "rows": n_rows, "skipped": f"> {excel_max_rows} lignes"})
+
+    schema = compile_schema(raw.columns)
+    run("basic_clean", lambda df: basic_clean(df, schema), lambda: raw.copy())
+    clean = basic_clean(raw.copy(), schema)
+    run("compute_defaillance", lambda: compute_defaillance(clean, schema=schema))
+
+    features = clean.drop(columns=list(schema.id_cols)).select_dtypes(include=["number"])
+    run("predict_pd", lambda: predict_pd(features))
+
+    scored = clean.copy()
+    scored["Proba_defaillance"] = predict_pd(features).values
+    run("apply_full_notation",
+        lambda: apply_full_notation(scored, col_pd="Proba_defaillance",
+                                    col_year=schema.year_col, col_sector=schema.sector_col))
+    run("score_frame", score_frame, lambda: raw.copy())
+
+    result = compact_result(score_frame(raw.copy()))
+    del raw, clean, scored, features
+
+    # Filtre de /status (index des noms construit au premier appel, hors mesure)
+    store = MemoryResultStore(max_items=2, max_bytes=1 << 40)
+    app = create_app(result_store=store)
+    client = app.test_client()
+    ticket = store.put(result)
+    url = f"/status?id={ticket}&company=SONATEL"
+    client.get(url)
+    run("status_filter", lambda: client.get(url).close())
+
+    # Re-notation des PD stockées : un jeu, puis une grille de 16 jeux en un passage
+    run("rerate", lambda: rerate(result, parse_params({})))
+    grid = expand_grid({"grid": {"overlay_caps.max_up_over_abs": [0, 1, 2, 3],
+                                 "target_shares.AAA": [4, 7, 10, 13]}})
+    inputs = rating_inputs(result)
+    run("sweep_16", lambda: sweep(inputs, grid))
+
+    # Explications d'une page de tableau (50 lignes, hors cache)
+    flat, _ = model_explainer()
+    page = result.iloc[:50]
+    run("explain_page", lambda: explain_frame(page, flat))
+
+    # Historique : ajout d'un ticket (index compris, l'historique grandit à chaque mesure), trajectoire
+    history_path = os.path.join(workdir, f"history_{n_rows}.sqlite3")
+    history = HistoryStore(history_path)
+    run("history_append", lambda: history.append(result, str(uuid.uuid4())))
+    run("history_company", lambda: history.company_history("SONATEL SENEGAL"))
+    run("history_migrations", lambda: history.migrations(2020, 2021))
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(history_path + suffix):
+            os.remove(history_path + suffix)
+
+    # Stress test : 10 réplicats perturbés empilés (panel x 10 lignes notées)
+    if n_rows <= HEAVY_ROWS:
+        scenarios, _ = parse_scenarios({"scenarios": [{"name": "mc", "replicates": 10, "sigma": 0.1}]},
+                                       result.iloc[:0])
+        ctx = build_context(result)
+        run("stress_mc_10", lambda: list(run_stress(ctx, scenarios)))
+        del ctx
+    else:
+        out.append({"stage": "stress_mc_10", "rows": n_rows, "skipped": f"> {HEAVY_ROWS} lignes"})
+
+    # Exports de /download (premier téléchargement : fichier construit)
+    exports = ExportCache(os.path.join(workdir, "exports"))
+    ticket = str(uuid.uuid4())
+    for fmt in EXPORT_FORMATS:
+        if fmt == "xlsx" and n_rows > excel_max_rows:
+            out.append({"stage": "download_xlsx", "rows": n_rows, "skipped": f"> {excel_max_rows} lignes"})
+            continue
+        run(f"download_{fmt}", lambda _: exports.build(result, ticket, fmt),
+            lambda: exports.discard(ticket))
+    exports.discard(ticket)
+    return out
+
+
+def main(argv: list[str] | None = None) -> int:
+    ap = argparse.ArgumentParser(description="Benchmarks du scoring BRVM sur données synthétiques.")
+    ap.add_argument("--sizes", default=DEFAULT_SIZES, help="tailles séparées par des virgules (1k, 100k, 1M)")
+    ap.add_argument("--repeat", type=int, default=3, help="mesures par étape (1 au-delà de 100k lignes)")
+    ap.add_argument("--excel-max-rows", type=int, default=EXCEL_MAX_ROWS,
+                    help="taille max pour les étapes .xlsx (lecture et export, plusieurs minutes à 1M)")
+    ap.add_argument("--row-cache", action="store_true",
+                    help="laisser actif le cache de PD par ligne (désactivé pour mesurer le modèle)")
+    ap.add_argument("--no-startup", action="store_true", help="sans mesures de démarrage ni de mémoire gunicorn")
+    ap.add_argument("--workers", type=int, default=2, help="workers gunicorn pour la mesure mémoire")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--out", help="fichier JSON (défaut : benchmarks/results/<commit>.json)")
+    args = ap.parse_args(argv)
+
+    from services.scoring_cache import ROW_CACHE
+    if not args.row_cache:
+        ROW_CACHE.max_rows = 0
+
+    report = {"environment": environment(), "results": []}
+    if not args.no_startup:
+        runs = cold_start(args.repeat)
+        report["results"] += [_record("cold_start_import", 0, [r["import_s"] for r in runs]),
+                              _record("cold_start_first_score", 0, [r["first_score_s"] for r in runs])]
+        report["startup"] = {
+            "cold_start": runs,
+            "gunicorn": [gunicorn_workers(args.workers, preload=p) for p in (True, False)],
+        }
+        print(json.dumps(report["startup"], indent=1), file=sys.stderr)
+    workdir = tempfile.mkdtemp(prefix="brvm-bench-")
+    try:
+        for size in args.sizes.split(","):
+            report["results"] += bench_size(parse_size(size), args.repeat, workdir,
+                                            excel_max_rows=args.excel_max_rows, seed=args.seed,
+                                            log=lambda s: print(s, file=sys.stderr))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    out = args.out or os.path.join(RESULTS_DIR, f"{report['environment']['commit'] or 'local'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(out)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
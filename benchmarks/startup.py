@@ -0,0 +1,111 @@
+# benchmarks/startup.py — démarrage à froid et mémoire par worker gunicorn (préchargement, modèle projeté)
+from __future__ import annotations
+import json, os, signal, socket, subprocess, sys, time, urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ("sklearn", "scipy", "joblib", "openpyxl", "pyarrow")
+
+_COLD_START = r"""
+import json, sys, time
+t0 = time.perf_counter()
+import app
+t1 = time.perf_counter()
+import pandas as pd
+from services.pipeline import score_frame
+score_frame(pd.DataFrame({"Bénéfice net": [1.0], "EBE": [-1.0]}))
+t2 = time.perf_counter()
+rss = next(int(l.split()[1]) for l in open("/proc/self/status") if l.startswith("VmRSS"))
+print(json.dumps({"import_s": t1 - t0, "first_score_s": t2 - t1, "rss_kb": rss,
+                  "modules": [m for m in %r if m in sys.modules]}))
+"""
+
+
+def cold_start(repeat: int = 3) -> list[dict]:
+    """Nouveau processus : import de app (create_app, chargement du modèle) puis premier scoring."""
+    runs = []
+    for _ in range(repeat):
+        out = subprocess.run([sys.executable, "-c", _COLD_START % (HEAVY_MODULES,)], cwd=ROOT,
+                             capture_output=True, text=True, check=True)
+        runs.append(json.loads(out.stdout.strip().splitlines()[-1]))
+    return runs
+
+
+def _smaps(pid: int) -> dict:
+    """Rss / Pss / partagé / privé (Ko) d'après /proc/<pid>/smaps_rollup."""
+    fields = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                fields[parts[0].rstrip(":")] = int(parts[1])
+    return {
+        "rss_kb": fields.get("Rss", 0),
+        "pss_kb": fields.get("Pss", 0),
+        "shared_kb": fields.get("Shared_Clean", 0) + fields.get("Shared_Dirty", 0),
+        "private_kb": fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0),
+    }
+
+
+def _children(pid: int) -> list[int]:
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            return [int(p) for p in f.read().split()]
+    except OSError:
+        return []
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def gunicorn_workers(workers: int = 2, preload: bool = True, requests: int = 8,
+                     timeout_s: float = 60.0) -> dict | None:
+    """
+    Lance `gunicorn app:app` (gunicorn.conf.py), envoie quelques requêtes de scoring puis
+    relève la mémoire du maître et de chaque worker. None si gunicorn ou /proc manquent.
+    """
+    if not os.path.exists("/proc/self/smaps_rollup"):
+        return None
+    port = _free_port()
+    env = {**os.environ, "GUNICORN_PRELOAD": "1" if preload else "0", "WEB_CONCURRENCY": str(workers)}
+    cmd = [sys.executable, "-m", "gunicorn", "-c", os.path.join(ROOT, "gunicorn.conf.py"),
+           "-b", f"127.0.0.1:{port}", "app:app"]
+    t0 = time.perf_counter()
+    try:
+        proc = subprocess.Popen(cmd, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    except OSError:
+        return None
+    try:
+        url = f"http://127.0.0.1:{port}"
+        while True:
+            if proc.poll() is not None:
+                return None
+            try:
+                urllib.request.urlopen(url + "/", timeout=1).close()
+                break
+            except OSError:
+                if time.perf_counter() - t0 > timeout_s:
+                    return None
+                time.sleep(0.05)
+        ready_s = time.perf_counter() - t0
+        body = json.dumps([{"Bénéfice net": 1.0, "EBE": -1.0}]).encode()
+        for _ in range(requests):
+            req = urllib.request.Request(url + "/api/v1/score", data=body,
+                                         headers={"Content-Type": "application/json"})
+            urllib.request.urlopen(req, timeout=30).read()
+        pids = _children(proc.pid)
+        return {
+            "workers": workers,
+            "preload": preload,
+            "ready_s": round(ready_s, 4),
+            "master": _smaps(proc.pid),
+            "worker_memory": [_smaps(p) for p in pids],
+        }
+    finally:
+        proc.send_signal(signal.SIGTERM)
+        try:
+            proc.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            proc.kill()
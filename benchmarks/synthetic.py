@@ -0,0 +1,111 @@
+# benchmarks/synthetic.py — panels synthétiques au format BRVM (feature_list.json / brvm_template.xlsx)
+from __future__ import annotations
+import os
+import numpy as np
+import pandas as pd
+
+from services.exports import _write_xlsx
+from services.schema import TEMPLATE_COLUMNS, load_feature_list
+
+COUNTRIES = ("CI", "SN", "BF", "ML", "NE", "TG", "BJ", "GW")
+SECTORS = (
+    "Banque", "Assurance", "Télécommunications", "Electricité", "Distribution",
+    "Industrie", "Agriculture", "Transport", "Services publics", "Finance",
+)
+# Sociétés réelles reprises pour que le filtre par défaut (SONATEL SENEGAL) trouve des lignes
+KNOWN_COMPANIES = ("SONATEL SENEGAL", "ORANGE COTE D'IVOIRE", "SOCIETE GENERALE COTE D'IVOIRE",
+                   "TOTAL SÉNÉGAL", "ONATEL BF", "ECOBANK TRANSNATIONAL")
+
+# Colonnes des critères de défaillance (services.criteria) : pilotent le taux de défaut
+_CRITERIA_COLUMNS = ("Bénéfice net", "EBE", "capitaux propres", "Rendement des capitaux propres (ROE)",
+                     "Fonds de roulement", "Levier financier", "total dettes")
+
+
+def feature_columns() -> list[str]:
+    """Colonnes numériques de l'upload (feature_list.json, en-têtes tels qu'après strip)."""
+    feats = load_feature_list() or ()
+    return [f.strip() for f in feats if f.strip() != "IDENTIFIANT"]
+
+
+def make_panel(n_rows: int, default_rate: float = 0.15, missing_rate: float = 0.02,
+               comma_rate: float = 0.1, years: tuple[int, int] = (2015, 2024),
+               seed: int = 0) -> pd.DataFrame:
+    """
+    Panel entreprises x années au format d'upload : colonnes d'identification, IDENTIFIANT,
+    puis les features de feature_list.json.
+      - default_rate : part des lignes violant au moins un critère (=> Défaillance = 1)
+      - missing_rate : part de valeurs manquantes dans les features hors critères
+      - comma_rate : part des colonnes numériques exportées en texte à virgule décimale
+    """
+    rng = np.random.default_rng(seed)
+    n_years = years[1] - years[0] + 1
+    n_companies = max(1, -(-n_rows // n_years))
+    names = np.array([*KNOWN_COMPANIES, *(f"SOCIETE {i:06d} SA" for i in range(n_companies))],
+                     dtype=object)[:n_companies]
+    company = np.arange(n_rows) // n_years
+    sector = rng.integers(0, len(SECTORS), n_companies)
+    country = rng.integers(0, len(COUNTRIES), n_companies)
+
+    df = pd.DataFrame({
+        "NOM DE L'ENTREPRISE": names[company],
+        "SECTEUR D'ACTIVITE": np.asarray(SECTORS, dtype=object)[sector[company]],
+        "PAYS": np.asarray(COUNTRIES, dtype=object)[country[company]],
+        "ANNEE": years[0] + np.arange(n_rows) % n_years,
+        "IDENTIFIANT": np.arange(n_rows),
+    })
+
+    # Entreprises saines : montants positifs, levier <= 1, dettes / capitaux propres <= 1.5
+    scale = rng.lognormal(14.0, 1.0, n_companies)[company]
+    cols = {}
+    for c in feature_columns():
+        cols[c] = scale * rng.uniform(0.05, 1.0, n_rows)
+    cols["Levier financier"] = rng.uniform(0.05, 0.95, n_rows)
+    cols["Rendement des capitaux propres (ROE)"] = rng.uniform(0.01, 0.35, n_rows)
+    cols["total dettes"] = cols["capitaux propres"] * rng.uniform(0.1, 1.4, n_rows)
+
+    # Défaillantes : un critère tiré au hasard est violé
+    bad = np.flatnonzero(rng.random(n_rows) < default_rate)
+    which = rng.integers(0, len(_CRITERIA_COLUMNS), len(bad))
+    for k, c in enumerate(_CRITERIA_COLUMNS):
+        rows = bad[which == k]
+        if c == "Levier financier":
+            cols[c][rows] = rng.uniform(1.05, 3.0, len(rows))
+        elif c == "total dettes":
+            cols[c][rows] = cols["capitaux propres"][rows] * rng.uniform(1.6, 5.0, len(rows))
+        else:
+            cols[c][rows] = -cols[c][rows]
+
+    for c, v in cols.items():
+        if c not in _CRITERIA_COLUMNS:
+            v[rng.random(n_rows) < missing_rate] = np.nan
+        df[c] = v
+
+    numeric = list(cols)
+    for c in rng.choice(numeric, size=int(round(comma_rate * len(numeric))), replace=False):
+        df[c] = df[c].map(lambda x: "" if np.isnan(x) else f"{x:.2f}".replace(".", ","))
+    return df
+
+
+def make_template_panel(n_rows: int, seed: int = 0) -> pd.DataFrame:
+    """Mise en page de brvm_template.xlsx : Entreprise | Secteur | Proba_defaillance."""
+    rng = np.random.default_rng(seed)
+    company, sector, pd_col = TEMPLATE_COLUMNS
+    return pd.DataFrame({
+        company: [f"SOCIETE {i:06d} SA" for i in range(n_rows)],
+        sector: np.asarray(SECTORS, dtype=object)[rng.integers(0, len(SECTORS), n_rows)],
+        pd_col: rng.beta(1.2, 8.0, n_rows).round(4),
+    })
+
+
+def write_upload(df: pd.DataFrame, path: str) -> str:
+    """Écrit le panel au format de l'extension (.xlsx, .csv séparateur ';', .parquet)."""
+    ext = os.path.splitext(path.lower())[1]
+    if ext == ".xlsx":
+        _write_xlsx(df, path)   # openpyxl write-only : tient les gros panels
+    elif ext == ".csv":
+        df.to_csv(path, sep=";", index=False, encoding="utf-8-sig")
+    elif ext == ".parquet":
+        df.to_parquet(path, index=False)
+    else:
+        raise ValueError(f"Extension non supportée : {ext}")
+    return path
@@ -1,9 +1,13 @@
 import os
+import tempfile
 
 # Upload config
 MAX_UPLOAD_MB = int(os.getenv("MAX_UPLOAD_MB", "20"))
 MAX_CONTENT_LENGTH = MAX_UPLOAD_MB * 1024 * 1024
-ALLOWED_EXTENSIONS = {'.xlsx', '.xls'}
+ALLOWED_EXTENSIONS = {'.xlsx', '.xls', '.csv', '.parquet'}
+
+# Lecture en flux des .xlsx : nombre de lignes par bloc
+READ_CHUNK_ROWS = int(os.getenv("READ_CHUNK_ROWS", "20000"))
 
 RATING_ORDER = ["AAA","AA","A","BBB","BB","B","CCC","CC","C"]
 
@@ -31,6 +35,87 @@ OVERLAY_CAPS = {
     "max_up_over_abs": 3        # avant 2 -> autorise +3 crans au-dessus de l'absolu
 }
 
+# Cache secteur -> bonus partagé entre requêtes (LRU borné)
+SECTOR_BONUS_CACHE_SIZE = int(os.getenv("SECTOR_BONUS_CACHE_SIZE", "4096"))
+
+# Stockage des résultats : "disk" (partagé entre workers via Parquet) ou "memory"
+RESULT_STORE = os.getenv("RESULT_STORE", "disk")
+RESULT_STORE_DIR = os.getenv("RESULT_STORE_DIR", os.path.join(tempfile.gettempdir(), "brvm-risk-results"))
+RESULT_STORE_MAX_ITEMS = int(os.getenv("RESULT_STORE_MAX_ITEMS", "32"))
+RESULT_STORE_TTL_S = int(os.getenv("RESULT_STORE_TTL_S", str(6 * 3600)))
+RESULT_STORE_MAX_MB = int(os.getenv("RESULT_STORE_MAX_MB", "512"))
+# Fichiers Parquet de RESULT_STORE_DIR : budget disque (les moins récemment consultés partent en premier)
+# et intervalle entre deux balayages déclenchés par put() (expirés + budget)
+RESULT_STORE_DISK_MAX_MB = int(os.getenv("RESULT_STORE_DISK_MAX_MB", "4096"))
+RESULT_STORE_SWEEP_S = float(os.getenv("RESULT_STORE_SWEEP_S", "300"))
+
+# Exports (/download) : lignes écrites par bloc (xlsx write-only, csv en flux)
+EXPORT_CHUNK_ROWS = int(os.getenv("EXPORT_CHUNK_ROWS", "5000"))
+
+# Scoring asynchrone (opt-in) : pool de processus borné
+ASYNC_SCORING = os.getenv("ASYNC_SCORING", "0") == "1"
+ASYNC_WORKERS = int(os.getenv("ASYNC_WORKERS", "2"))
+ASYNC_MAX_PENDING = int(os.getenv("ASYNC_MAX_PENDING", "8"))
+# Durée max d'un flux SSE /jobs/<id>/events (le client EventSource se reconnecte ensuite)
+JOB_EVENTS_MAX_S = float(os.getenv("JOB_EVENTS_MAX_S", "20"))
+
+# Mode par blocs : erreur max (en PD) des seuils dynamiques issus de l'esquisse de quantiles
+SKETCH_EPS = float(os.getenv("SKETCH_EPS", "0.001"))
+
+# Micro-batching des petits appels concurrents à predict_pd (0 = désactivé)
+MICROBATCH_WINDOW_MS = float(os.getenv("MICROBATCH_WINDOW_MS", "0"))
+MICROBATCH_MAX_ROWS = int(os.getenv("MICROBATCH_MAX_ROWS", "256"))
+
+# Moteur d'inférence : "auto" (forêt compilée models/pipeline.flat.npz si à jour, sinon sklearn) ou "sklearn"
+INFERENCE_ENGINE = os.getenv("INFERENCE_ENGINE", "auto")
+FOREST_THREADS = int(os.getenv("FOREST_THREADS", "1"))  # > 1 : arbres répartis sur un pool de threads
+# Forêt compilée dépliée en .npy projetés en lecture seule (mmap) : pages partagées par tous les workers
+MODEL_MMAP = os.getenv("MODEL_MMAP", "1") == "1"
+MODEL_MMAP_DIR = os.getenv("MODEL_MMAP_DIR", os.path.join(tempfile.gettempdir(), "brvm-risk-model"))
+
+# Caches de notation : upload déjà noté -> ticket existant ; PD par ligne déjà vue (0 = désactivé)
+SCORING_CACHE = os.getenv("SCORING_CACHE", "1") == "1"
+UPLOAD_CACHE_MAX_ITEMS = int(os.getenv("UPLOAD_CACHE_MAX_ITEMS", "256"))
+ROW_CACHE_MAX_ROWS = int(os.getenv("ROW_CACHE_MAX_ROWS", "200000")) if SCORING_CACHE else 0
+
+# Instrumentation : /metrics (Prometheus), en-tête Server-Timing ; profil échantillonné via ?profile=1 (opt-in)
+METRICS_ENABLED = os.getenv("METRICS", "1") == "1"
+PROFILE_REQUESTS = os.getenv("PROFILE_REQUESTS", "0") == "1"
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+
+# Tableaux /status et /rating : lignes par page (défaut, maximum)
+TABLE_PAGE_SIZE = int(os.getenv("TABLE_PAGE_SIZE", "50"))
+TABLE_MAX_PAGE_SIZE = int(os.getenv("TABLE_MAX_PAGE_SIZE", "500"))
+
+# Re-notation des PD stockées : jeux de paramètres max par balayage, cellules (jeux x lignes) par bloc
+RERATE_MAX_SETS = int(os.getenv("RERATE_MAX_SETS", "64"))
+RERATE_BLOCK_CELLS = int(os.getenv("RERATE_BLOCK_CELLS", str(1 << 24)))
+
+# Stress tests : lignes (réplicats x panel) par bloc, réplicats max par scénario ;
+# STRESS_WORKERS > 1 : blocs répartis sur un pool de processus au-delà de STRESS_POOL_MIN_ROWS lignes
+STRESS_BLOCK_ROWS = int(os.getenv("STRESS_BLOCK_ROWS", "200000"))
+STRESS_MAX_REPLICATES = int(os.getenv("STRESS_MAX_REPLICATES", "1000"))
+STRESS_MAX_SCENARIOS = int(os.getenv("STRESS_MAX_SCENARIOS", "16"))
+STRESS_WORKERS = int(os.getenv("STRESS_WORKERS", "1"))
+STRESS_POOL_MIN_ROWS = int(os.getenv("STRESS_POOL_MIN_ROWS", "1000000"))
+
+# Historique des lignes notées, tous uploads confondus (SQLite ajout seul ; HISTORY=0 le désactive).
+# À placer sur un volume persistant en production ; HISTORY_MAX_UPLOADS borne ?last= des trajectoires.
+HISTORY_ENABLED = os.getenv("HISTORY", "1") == "1"
+HISTORY_DB = os.getenv("HISTORY_DB", os.path.join(tempfile.gettempdir(), "brvm-risk-history.sqlite3"))
+HISTORY_MAX_UPLOADS = int(os.getenv("HISTORY_MAX_UPLOADS", "100"))
+
+# Explications par ligne (contributions des ratios à la PD + critères), calculées à l'affichage :
+# lignes gardées en cache par worker, lignes par bloc d'un calcul complet (job), facteurs affichés par ligne
+EXPLAIN_DIR = os.getenv("EXPLAIN_DIR", os.path.join(RESULT_STORE_DIR, "explanations"))
+EXPLAIN_CACHE_MAX_ROWS = int(os.getenv("EXPLAIN_CACHE_MAX_ROWS", "50000"))
+EXPLAIN_BLOCK_ROWS = int(os.getenv("EXPLAIN_BLOCK_ROWS", "20000"))
+EXPLAIN_TOP = int(os.getenv("EXPLAIN_TOP", "3"))
+
+# Entraînement (train_model.py) : jeu nettoyé mis en cache (Parquet, clé = sha256 de la source),
+# processus/threads pour les plis et les arbres (-1 = tous les coeurs)
+TRAIN_CACHE_DIR = os.getenv("TRAIN_CACHE_DIR", os.path.join(tempfile.gettempdir(), "brvm-risk-train"))
+TRAIN_N_JOBS = int(os.getenv("TRAIN_N_JOBS", "-1"))
 
 # Required columns if no model is available and we want direct PD mapping
 MIN_COLS_DIRECT = {"Entreprise", "Secteur", "Proba_defaillance"}
@@ -0,0 +1,16 @@
+# gunicorn.conf.py — lu automatiquement par `gunicorn app:app` (Procfile, render.yaml)
+import gc
+import os
+
+# L'application (et le modèle) est chargée une fois dans le maître avant le fork :
+# les workers partagent ses pages en copie sur écriture, la forêt compilée est en plus
+# projetée en lecture seule (MODEL_MMAP) et reste partagée après un redémarrage de worker.
+preload_app = os.getenv("GUNICORN_PRELOAD", "1") == "1"
+
+# nombre de workers : WEB_CONCURRENCY ; adresse : $PORT (lus nativement par gunicorn)
+
+
+def pre_fork(server, worker):
+    # objets du maître exclus du ramasse-miettes : le GC des workers ne réécrit plus
+    # leurs en-têtes, ce qui dupliquerait les pages partagées
+    gc.freeze()
@@ -0,0 +1,95 @@
+# services/criteria.py — critères financiers évalués une seule fois (cible métier, PD par règles, explications)
+from __future__ import annotations
+from dataclasses import dataclass
+import numpy as np
+import pandas as pd
+
+from services.schema import UploadSchema, compile_schema
+
+DEFAULTS = {
+    "levier_excessif": 1.0,   # Levier financier > 1.0 => critère KO
+    "surendettement": 1.5,    # total dettes / capitaux propres > 1.5 => KO
+}
+
+
+@dataclass(frozen=True)
+class Criterion:
+    """
+    Critère KO : `colonnes[0] <op> seuil`, ou `colonnes[0] / colonnes[1] <op> seuil`
+    si deux colonnes (ratio ; dénominateur nul -> critère faux).
+    `seuil` est un nombre ou une clé de DEFAULTS (surchargeable via cfg).
+    """
+    name: str
+    columns: tuple[str, ...]
+    op: str               # "lt", "le" ou "gt"
+    threshold: float | str
+
+
+# Ordre historique des règles (cf. compute_defaillance)
+CRITERIA = (
+    Criterion("benefice_net_negatif", ("bénéfice net",), "lt", 0.0),
+    Criterion("ebe_negatif", ("ebe",), "lt", 0.0),
+    Criterion("capitaux_propres_negatifs", ("capitaux propres",), "le", 0.0),
+    Criterion("roe_negatif", ("rendement des capitaux propres (roe)",), "lt", 0.0),
+    Criterion("surendettement", ("total dettes", "capitaux propres"), "gt", "surendettement"),
+    Criterion("levier_excessif", ("levier financier",), "gt", "levier_excessif"),
+    Criterion("fonds_roulement_negatif", ("fonds de roulement",), "lt", 0.0),
+)
+
+_OPS = {"lt": np.less, "le": np.less_equal, "gt": np.greater}
+
+
+@dataclass(frozen=True)
+class CriteriaMatrix:
+    """Matrice booléenne lignes x critères disponibles (colonnes absentes -> critère ignoré)."""
+    index: pd.Index
+    names: tuple[str, ...]
+    matrix: np.ndarray     # bool, forme (n, len(names))
+
+    def any(self) -> np.ndarray:
+        return self.matrix.any(axis=1)
+
+    def count(self) -> np.ndarray:
+        return self.matrix.sum(axis=1)
+
+    def breakdown(self) -> pd.DataFrame:
+        """Détail par critère (une colonne booléenne par critère évalué)."""
+        return pd.DataFrame(self.matrix, index=self.index, columns=list(self.names))
+
+
+def _values(df: pd.DataFrame, col: str) -> np.ndarray:
+    return df[col].to_numpy(dtype=float, na_value=np.nan)
+
+
+def evaluate_criteria(df: pd.DataFrame, cfg: dict | None = None,
+                      schema: UploadSchema | None = None,
+                      criteria: tuple[Criterion, ...] = CRITERIA) -> CriteriaMatrix:
+    """Un seul passage : chaque colonne est convertie une fois, chaque critère évalué une fois."""
+    cfg = {**DEFAULTS, **(cfg or {})}
+    col = (schema or compile_schema(df.columns)).col
+    cache: dict[str, np.ndarray] = {}
+
+    def values(name: str) -> np.ndarray | None:
+        src = col(name)
+        if src is None or src not in df:
+            return None
+        if src not in cache:
+            cache[src] = _values(df, src)
+        return cache[src]
+
+    names, cols = [], []
+    for crit in criteria:
+        arrays = [values(c) for c in crit.columns]
+        if any(a is None for a in arrays):
+            continue
+        x = arrays[0]
+        if len(arrays) == 2:
+            with np.errstate(divide="ignore", invalid="ignore"):
+                x = x / np.where(arrays[1] == 0, np.nan, arrays[1])
+            x = np.where(np.isinf(x), np.nan, x)
+        thr = cfg[crit.threshold] if isinstance(crit.threshold, str) else crit.threshold
+        names.append(crit.name)
+        cols.append(_OPS[crit.op](x, thr))   # NaN -> False
+
+    matrix = np.column_stack(cols) if cols else np.zeros((len(df), 0), dtype=bool)
+    return CriteriaMatrix(df.index, tuple(names), matrix)
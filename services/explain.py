@@ -0,0 +1,321 @@
+# services/explain.py — explications par ligne : contributions des ratios à la PD et critères KO, à la demande
+"""
+Contributions par chemin (Saabas) sur la forêt compilée (services.flat_forest) : en descendant
+un arbre, chaque split fait passer la valeur du noeud de v(parent) à v(enfant) ; l'écart est
+imputé à la feature du split. Moyennées sur les arbres, les contributions somment exactement
+à p(ligne) - p(racines). Tous les arbres d'un bloc de lignes descendent ensemble, niveau par
+niveau (même parcours que FlatForest._leaf_values sans tables de masques).
+
+Les transformations monotones qui suivent (isotonique de chaque membre calibré, moyenne des
+membres, squash_pd) sont reportées au prorata : les contributions gardent leur signe et
+somment à PD - PD de référence (PD d'une ligne « moyenne » au sens des racines des arbres).
+
+Rien n'est calculé au scoring : seulement les lignes affichées (API par lot, cache LRU par
+ticket, version du modèle et ligne), ou tout le portefeuille dans un job (Parquet par blocs).
+"""
+from __future__ import annotations
+import os, time, threading, uuid
+from collections import OrderedDict
+from typing import Callable, Iterator
+import numpy as np
+import pandas as pd
+
+from config import EXPLAIN_DIR, EXPLAIN_CACHE_MAX_ROWS, EXPLAIN_BLOCK_ROWS, RESULT_STORE_TTL_S
+from services.criteria import CRITERIA, evaluate_criteria
+from services.flat_forest import FlatForest, ROW_BLOCK, compile_model
+from services.inference import REGISTRY, NoModelAvailable, _reorder_features_if_needed
+from services.preprocessing import squash_pd
+from services.schema import compile_schema, load_feature_list
+from services.stress import OUTPUT_COLUMNS
+
+# Colonnes calculées par le scoring (jamais des entrées du modèle)
+SCORED_COLUMNS = OUTPUT_COLUMNS | {"Overlay_bonus", "Reason"}
+CONTRIB, VALUE, KO = "c:", "v:", "ko:"   # préfixes des colonnes du cadre large (Parquet)
+_EPS = 1e-12
+
+_COMPILED: dict[str, FlatForest | None] = {}
+_COMPILED_LOCK = threading.Lock()
+
+
+# ---------- modèle expliqué ----------
+def model_explainer() -> tuple[FlatForest | None, str]:
+    """
+    (forêt compilée, version du modèle). Mode A servi par sklearn (INFERENCE_ENGINE=sklearn) :
+    compilée une fois par version. None si le modèle n'est pas une forêt compilable
+    (modes B/C, calibration sigmoïde, PD par règles) : seuls les critères sont expliqués.
+    """
+    try:
+        bundle = REGISTRY.get()
+    except NoModelAvailable:
+        return None, "regles"
+    if bundle.mode != "A":
+        return None, bundle.version
+    if isinstance(bundle.pipe, FlatForest):
+        return bundle.pipe, bundle.version
+    with _COMPILED_LOCK:
+        if bundle.version not in _COMPILED:
+            try:
+                flat = compile_model(bundle.pipe)
+            except TypeError:
+                flat = None
+            _COMPILED.clear()
+            _COMPILED[bundle.version] = flat
+        return _COMPILED[bundle.version], bundle.version
+
+
+def feature_names(flat: FlatForest) -> list[str]:
+    return flat.feature_names or list(load_feature_list() or ()) or [f"x{j}" for j in range(flat.n_features_in_)]
+
+
+def input_columns(columns, flat: FlatForest | None) -> list[str]:
+    """Colonnes stockées à relire : sources des features du modèle, colonnes des critères, PD."""
+    schema = compile_schema(tuple(columns))
+    out = []
+    if flat is not None:
+        feats = load_feature_list() or flat.feature_names
+        sources = schema.feature_sources(feats) if feats else list(columns)
+        out += [s for s in sources if s is not None and s not in schema.id_cols and s not in SCORED_COLUMNS]
+    for crit in CRITERIA:
+        out += [src for src in map(schema.col, crit.columns) if src is not None]
+    if "Proba_defaillance" in columns:
+        out.append("Proba_defaillance")
+    return [c for c in dict.fromkeys(out) if c in columns]
+
+
+def feature_matrix(df: pd.DataFrame, flat: FlatForest) -> np.ndarray:
+    """Entrées du modèle comme au scoring (cf. pipeline.model_pd), avant imputation."""
+    schema = compile_schema(df.columns)
+    drop = set(schema.id_cols) | SCORED_COLUMNS
+    features = df.drop(columns=[c for c in df.columns if c in drop]).select_dtypes(include=["number"])
+    features = _reorder_features_if_needed(features)
+    if flat.feature_names and list(features.columns) != flat.feature_names:
+        features = features[flat.feature_names]
+    return features.to_numpy(dtype=float, na_value=np.nan)
+
+
+# ---------- attribution ----------
+def _walk_arrays(flat: FlatForest) -> tuple[np.ndarray, ...]:
+    """Enfants, feature et seuil par noeud ; les feuilles bouclent sur elles-mêmes (écart nul)."""
+    leaf = flat.left < 0
+    ids = np.arange(len(flat.left), dtype=np.int32)
+    return (np.where(leaf, ids, flat.left), np.where(leaf, ids, flat.right),
+            np.where(leaf, 0, flat.feature), np.where(leaf, np.inf, flat.threshold))
+
+
+def path_contributions(flat: FlatForest, X32: np.ndarray, t0: int, t1: int) -> tuple[np.ndarray, np.ndarray]:
+    """(p moyen des arbres t0..t1-1, contributions (n, features)) ; p = biais + somme des contributions."""
+    left, right, feature, threshold = _walk_arrays(flat)
+    n, n_feat = X32.shape
+    roots = np.asarray(flat.roots[t0:t1])
+    value = np.asarray(flat.value)
+    raw, contrib = np.empty(n), np.empty((n, n_feat))
+    for start in range(0, n, ROW_BLOCK):
+        xb = X32[start:start + ROW_BLOCK]
+        m = len(xb)
+        rows = np.arange(m)[:, None]
+        idx = np.broadcast_to(roots, (m, len(roots))).copy()
+        acc = np.zeros(m * n_feat)
+        for _ in range(flat.depth):
+            f = feature[idx]
+            child = np.where(xb[rows, f] <= threshold[idx], left[idx], right[idx])
+            acc += np.bincount((rows * n_feat + f).ravel(), weights=(value[child] - value[idx]).ravel(),
+                               minlength=m * n_feat)
+            idx = child
+        raw[start:start + m] = value[idx].mean(axis=1)
+        contrib[start:start + m] = acc.reshape(m, n_feat) / len(roots)
+    return raw, contrib
+
+
+def _rescale(contrib: np.ndarray, before: np.ndarray, base_before, after: np.ndarray, base_after) -> np.ndarray:
+    """Contributions (somme = before - base_before) ramenées au prorata à la somme after - base_after."""
+    d = before - base_before
+    ratio = np.divide(after - base_after, d, out=np.zeros_like(d), where=np.abs(d) > _EPS)
+    return contrib * ratio[:, None]
+
+
+def _squash(p) -> np.ndarray:
+    return squash_pd(pd.Series(np.atleast_1d(p).astype(float))).to_numpy()
+
+
+def attribute(flat: FlatForest, X: np.ndarray) -> tuple[np.ndarray, float, np.ndarray]:
+    """
+    (PD lissée, PD de référence, contributions (n, features)) pour des entrées brutes (NaN =
+    valeur manquante, imputée par la médiane de chaque membre comme FlatForest.predict_pos).
+    """
+    X = np.asarray(X, dtype=float)
+    n_members = len(flat.tree_ptr) - 1
+    p, base, contrib = np.zeros(len(X)), 0.0, np.zeros(X.shape)
+    for m in range(n_members):
+        Xm = np.where(np.isnan(X), flat.medians[m], X).astype(np.float32)
+        t0, t1 = int(flat.tree_ptr[m]), int(flat.tree_ptr[m + 1])
+        raw, c = path_contributions(flat, Xm, t0, t1)
+        bias = float(np.asarray(flat.value)[np.asarray(flat.roots[t0:t1])].mean())
+        i0, i1 = int(flat.iso_ptr[m]), int(flat.iso_ptr[m + 1])
+        if i1 > i0:
+            iso = lambda v: np.clip(np.interp(v, flat.iso_x[i0:i1], flat.iso_y[i0:i1]), 0.0, 1.0)
+            cal, cal_bias = iso(raw), float(iso(bias))
+            c, raw, bias = _rescale(c, raw, bias, cal, cal_bias), cal, cal_bias
+        p += raw
+        base += bias
+        contrib += c
+    p, base, contrib = p / n_members, base / n_members, contrib / n_members
+    pd_out, base_out = _squash(p), float(_squash(base)[0])
+    return pd_out, base_out, _rescale(contrib, p, base, pd_out, base_out)
+
+
+def explain_frame(df: pd.DataFrame, flat: FlatForest | None, positions=None) -> pd.DataFrame:
+    """
+    Cadre large, une ligne par ligne du résultat : row (position dans le ticket), pd, base,
+    puis c:<feature> (contribution), v:<feature> (valeur brute, NaN = imputée) et ko:<critère>.
+    Sans forêt compilable : pd stockée, base NaN, critères seulement.
+    """
+    n = len(df)
+    out = {"row": np.arange(n) if positions is None else np.asarray(positions, dtype=np.int64)}
+    if flat is not None and n:
+        X = feature_matrix(df, flat)
+        pdv, base, contrib = attribute(flat, X)
+        names = feature_names(flat)
+        out.update(pd=pdv, base=np.full(n, base))
+        out.update({CONTRIB + f: contrib[:, j] for j, f in enumerate(names)})
+        out.update({VALUE + f: X[:, j] for j, f in enumerate(names)})
+    else:
+        pdv = df["Proba_defaillance"] if "Proba_defaillance" in df.columns else pd.Series(np.nan, index=df.index)
+        out.update(pd=pdv.to_numpy(dtype=float), base=np.full(n, np.nan))
+    breakdown = evaluate_criteria(df).breakdown()
+    out.update({KO + c: breakdown[c].to_numpy() for c in breakdown.columns})
+    return pd.DataFrame(out)
+
+
+def _num(v) -> float | None:
+    return None if v is None or not np.isfinite(v) else float(v)
+
+
+def to_records(frame: pd.DataFrame) -> dict[int, dict]:
+    """Ligne -> explication : contributions triées par |effet| décroissant, critères et critères KO."""
+    feats = [c[len(CONTRIB):] for c in frame.columns if c.startswith(CONTRIB)]
+    crits = [c[len(KO):] for c in frame.columns if c.startswith(KO)]
+    C = frame[[CONTRIB + f for f in feats]].to_numpy(dtype=float)
+    V = frame[[VALUE + f for f in feats]].to_numpy(dtype=float)
+    K = frame[[KO + c for c in crits]].to_numpy(dtype=bool)
+    order = np.argsort(-np.abs(C), axis=1, kind="stable")
+    out = {}
+    for i, (row, pdv, base) in enumerate(zip(frame["row"].tolist(), frame["pd"].tolist(), frame["base"].tolist())):
+        out[int(row)] = {
+            "row": int(row), "pd": _num(pdv), "base": _num(base),
+            "contributions": [{"feature": feats[j], "value": _num(V[i, j]), "imputed": bool(np.isnan(V[i, j])),
+                               "contribution": float(C[i, j])} for j in order[i]] if feats else None,
+            "criteria": {c: bool(K[i, k]) for k, c in enumerate(crits)},
+            "criteria_ko": [c for k, c in enumerate(crits) if K[i, k]],
+        }
+    return out
+
+
+# ---------- calcul complet (job) ----------
+def iter_explanations(df: pd.DataFrame, flat: FlatForest | None,
+                      block_rows: int = EXPLAIN_BLOCK_ROWS) -> Iterator[pd.DataFrame]:
+    for start in range(0, max(len(df), 1), block_rows):
+        part = df.iloc[start:start + block_rows]
+        yield explain_frame(part, flat, np.arange(start, start + len(part)))
+
+
+def write_explanations(df: pd.DataFrame, flat: FlatForest | None, path: str,
+                       progress: Callable[[float], None] | None = None,
+                       block_rows: int = EXPLAIN_BLOCK_ROWS) -> str:
+    """Tout le portefeuille, bloc par bloc, dans un Parquet (fichier temporaire puis renommage)."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.{uuid.uuid4().hex[:8]}.tmp"
+    writer = None
+    try:
+        for frame in iter_explanations(df, flat, block_rows):
+            table = pa.Table.from_pandas(frame, preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(tmp, table.schema)
+            writer.write_table(table)
+            if progress is not None and len(df):
+                progress(min(1.0, (int(frame["row"].iloc[-1]) + 1) / len(df)) if len(frame) else 1.0)
+        writer.close()
+        writer = None
+        os.replace(tmp, path)
+    finally:
+        if writer is not None:
+            writer.close()
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    return path
+
+
+# ---------- cache ----------
+class ExplanationCache:
+    """
+    Explications déjà calculées : LRU en mémoire par (ticket, version du modèle, ligne), borné
+    à `max_rows` lignes ; le Parquet d'un calcul complet (même version) sert les lignes manquantes,
+    sinon elles sont calculées (un seul lot pour toutes les lignes demandées).
+    """
+
+    def __init__(self, directory: str = EXPLAIN_DIR, max_rows: int = EXPLAIN_CACHE_MAX_ROWS,
+                 ttl_s: float = RESULT_STORE_TTL_S):
+        self.directory = directory
+        self.max_rows = max_rows
+        self.ttl_s = ttl_s
+        self.hits = 0
+        self.misses = 0
+        self._rows: OrderedDict[tuple, dict] = OrderedDict()
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, ticket: str, version: str) -> str:
+        return os.path.join(self.directory, f"{uuid.UUID(ticket)}-{version}.parquet")
+
+    def full(self, ticket: str, version: str) -> str | None:
+        """Parquet du calcul complet s'il existe pour cette version du modèle."""
+        try:
+            path = self.path(ticket, version)
+        except ValueError:
+            return None
+        return path if os.path.exists(path) else None
+
+    def lookup(self, ticket: str, version: str, rows: list[int],
+               compute: Callable[[list[int]], pd.DataFrame]) -> list[dict]:
+        """Explications des lignes `rows` (dans cet ordre) ; compute(lignes manquantes) -> cadre large."""
+        with self._lock:
+            found = {r: self._rows.get((ticket, version, r)) for r in rows}
+            for r, rec in found.items():
+                if rec is not None:
+                    self._rows.move_to_end((ticket, version, r))
+        missing = [r for r, rec in found.items() if rec is None]
+        with self._lock:
+            self.hits += len(rows) - len(missing)
+            self.misses += len(missing)
+        if missing:
+            path = self.full(ticket, version)
+            if path is not None:
+                frame = pd.read_parquet(path, filters=[("row", "in", missing)])
+            else:
+                frame = compute(missing)
+            computed = to_records(frame)
+            found.update(computed)
+            with self._lock:
+                for r, rec in computed.items():
+                    self._rows[(ticket, version, r)] = rec
+                while len(self._rows) > self.max_rows:
+                    self._rows.popitem(last=False)
+        return [found[r] for r in rows if found.get(r) is not None]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"rows": len(self._rows), "max_rows": self.max_rows, "hits": self.hits, "misses": self.misses}
+
+    def sweep(self) -> int:
+        n, now = 0, time.time()
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            try:
+                if now - os.path.getmtime(path) > self.ttl_s:
+                    os.remove(path)
+                    n += 1
+            except OSError:
+                pass
+        return n
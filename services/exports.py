@@ -0,0 +1,142 @@
+# services/exports.py — exports des résultats (xlsx/csv/parquet/arrow) mis en cache sur disque par ticket
+from __future__ import annotations
+import os, time, uuid
+from typing import Iterator
+import pandas as pd
+
+from config import RESULT_STORE_DIR, RESULT_STORE_TTL_S, EXPORT_CHUNK_ROWS
+
+EXPORTS_DIR = os.path.join(RESULT_STORE_DIR, "exports")
+
+# fmt -> (nom de fichier proposé, mimetype)
+EXPORT_FORMATS = {
+    "xlsx": ("notes.xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+    "csv": ("notes.csv", "text/csv"),
+    "parquet": ("notes.parquet", "application/vnd.apache.parquet"),
+    "arrow": ("notes.arrow", "application/vnd.apache.arrow.file"),
+}
+
+
+def _blocks(df: pd.DataFrame, rows: int | None = None) -> Iterator[pd.DataFrame]:
+    rows = rows or EXPORT_CHUNK_ROWS
+    for start in range(0, len(df), rows):
+        yield df.iloc[start:start + rows]
+
+
+def _write_xlsx(df: pd.DataFrame, path: str) -> None:
+    """openpyxl en mode write-only : les lignes partent sur disque au fil de l'eau."""
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Alignment, Border, Font, Side
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Résultats")
+    # même en-tête que DataFrame.to_excel (gras, bordure fine, centré)
+    thin = Side(style="thin")
+    header = []
+    for c in df.columns:
+        cell = WriteOnlyCell(ws, value=str(c))
+        cell.font = Font(bold=True)
+        cell.border = Border(left=thin, right=thin, top=thin, bottom=thin)
+        cell.alignment = Alignment(horizontal="center", vertical="top")
+        header.append(cell)
+    ws.append(header)
+    for block in _blocks(df):
+        block = block.astype(object).where(block.notna(), None)
+        for row in block.itertuples(index=False, name=None):
+            ws.append(row)
+    wb.save(path)
+
+
+def _write_arrow(df: pd.DataFrame, path: str) -> None:
+    import pyarrow as pa
+
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    with pa.OSFile(path, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+
+
+def _csv_chunks(df: pd.DataFrame) -> Iterator[bytes]:
+    # découpage identique à df.to_csv(index=False) d'un seul tenant
+    yield df.iloc[:0].to_csv(index=False).encode("utf-8")
+    for block in _blocks(df):
+        yield block.to_csv(index=False, header=False).encode("utf-8")
+
+
+class ExportCache:
+    """
+    Premier export d'un ticket dans un format donné écrit à côté des résultats ;
+    les téléchargements suivants servent directement le fichier (ETag / GET conditionnel).
+    """
+
+    def __init__(self, directory: str = EXPORTS_DIR, ttl_s: float = RESULT_STORE_TTL_S):
+        self.directory = directory
+        self.ttl_s = ttl_s
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, ticket: str, fmt: str) -> str:
+        return os.path.join(self.directory, f"{uuid.UUID(ticket)}.{fmt}")
+
+    def get(self, ticket: str, fmt: str) -> str | None:
+        try:
+            path = self.path(ticket, fmt)
+        except ValueError:
+            return None
+        return path if os.path.exists(path) else None
+
+    def build(self, df: pd.DataFrame, ticket: str, fmt: str) -> str:
+        path = self.path(ticket, fmt)
+        tmp = f"{path}.{os.getpid()}.{uuid.uuid4().hex[:8]}.tmp"
+        try:
+            if fmt == "xlsx":
+                _write_xlsx(df, tmp)
+            elif fmt == "parquet":
+                df.to_parquet(tmp, index=False)
+            elif fmt == "arrow":
+                _write_arrow(df, tmp)
+            elif fmt == "csv":
+                with open(tmp, "wb") as f:
+                    for chunk in _csv_chunks(df):
+                        f.write(chunk)
+            else:
+                raise ValueError(f"Format d'export inconnu : {fmt!r}")
+            os.replace(tmp, path)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+        return path
+
+    def stream_csv(self, df: pd.DataFrame, ticket: str) -> Iterator[bytes]:
+        """CSV en flux vers le client, recopié au passage dans le cache (abandonné si coupure)."""
+        path = self.path(ticket, "csv")
+        tmp = f"{path}.{os.getpid()}.{uuid.uuid4().hex[:8]}.tmp"
+        done = False
+        try:
+            with open(tmp, "wb") as f:
+                for chunk in _csv_chunks(df):
+                    f.write(chunk)
+                    yield chunk
+            os.replace(tmp, path)
+            done = True
+        finally:
+            if not done and os.path.exists(tmp):
+                os.remove(tmp)
+
+    def discard(self, ticket: str) -> None:
+        for fmt in EXPORT_FORMATS:
+            try:
+                os.remove(self.path(ticket, fmt))
+            except (OSError, ValueError):
+                pass
+
+    def sweep(self) -> int:
+        n, now = 0, time.time()
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            try:
+                if now - os.path.getmtime(path) > self.ttl_s:
+                    os.remove(path)
+                    n += 1
+            except OSError:
+                pass
+        return n
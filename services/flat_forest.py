@@ -0,0 +1,420 @@
+# services/flat_forest.py — forêt compilée en tableaux plats (imputation + arbres + isotonique), évaluée en NumPy
+from __future__ import annotations
+import os, json, shutil, hashlib, tempfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any
+import numpy as np
+import pandas as pd
+
+from config import FOREST_THREADS
+
+_ARRAYS = ("medians", "tree_ptr", "iso_ptr", "iso_x", "iso_y", "roots", "feature",
+           "threshold", "left", "right", "value")
+MMAP_FORMAT = 1           # version de la disposition .npy (load_mmap)
+ROW_BLOCK = 1024          # lignes évaluées ensemble (mémoire ~ ROW_BLOCK x nb d'arbres)
+PARITY_ATOL = 1e-9
+
+
+def flat_path_for(pipe_path: str) -> str:
+    """Artefact compilé rangé à côté de pipeline.joblib (pipeline.flat.npz)."""
+    return os.path.splitext(pipe_path)[0] + ".flat.npz"
+
+
+# ---------- compilation depuis les objets sklearn ----------
+def _unwrap(model: Any) -> tuple[Any, Any]:
+    """(imputer ou None, forêt) pour Pipeline[SimpleImputer?, forêt] ou une forêt seule."""
+    steps = [s for _, s in model.steps] if hasattr(model, "steps") else [model]
+    if len(steps) == 2 and hasattr(steps[0], "statistics_"):
+        imputer, forest = steps
+    elif len(steps) == 1:
+        imputer, forest = None, steps[0]
+    else:
+        raise TypeError("Seuls Pipeline[SimpleImputer, forêt] ou une forêt seule sont compilables.")
+    if not hasattr(forest, "estimators_") or not all(hasattr(e, "tree_") for e in forest.estimators_):
+        raise TypeError(f"{type(forest).__name__} n'est pas une forêt d'arbres sklearn.")
+    if len(forest.classes_) != 2:
+        raise TypeError("Seule la classification binaire est prise en charge.")
+    if imputer is not None and not (isinstance(imputer.missing_values, float) and np.isnan(imputer.missing_values)):
+        raise TypeError("Imputation compilable seulement pour missing_values=NaN.")
+    return imputer, forest
+
+
+def _members(model: Any) -> list[tuple[Any, Any]]:
+    """(estimateur de base, calibrateur isotonique ou None) ; plusieurs si CalibratedClassifierCV."""
+    if hasattr(model, "calibrated_classifiers_"):
+        out = []
+        for cc in model.calibrated_classifiers_:
+            base = getattr(cc, "estimator", None) or getattr(cc, "base_estimator", None)
+            cal = cc.calibrators[0]
+            if not hasattr(cal, "X_thresholds_"):
+                raise TypeError("Seule la calibration isotonique est compilable.")
+            out.append((base, cal))
+        return out
+    return [(model, None)]
+
+
+def compile_model(model: Any, source_hash: str = "") -> "FlatForest":
+    """Tableaux plats : un noeud par case, tous arbres (et membres calibrés) bout à bout."""
+    n_in = int(model.n_features_in_)
+    names = [str(c) for c in getattr(model, "feature_names_in_", [])]
+    medians, tree_ptr, iso_ptr, iso_x, iso_y = [], [0], [0], [], []
+    roots, feature, threshold, left, right, value = [], [], [], [], [], []
+    offset = 0
+
+    for base, cal in _members(model):
+        imputer, forest = _unwrap(base)
+        if imputer is not None:
+            med = np.asarray(imputer.statistics_, dtype=float)
+            keep = np.flatnonzero(~np.isnan(med))   # colonnes gardées par l'imputer
+        else:
+            med, keep = np.full(n_in, np.nan), np.arange(n_in)
+        pos = 1  # classes_ triées : la seconde est la classe "défaillante"
+
+        for est in forest.estimators_:
+            t = est.tree_
+            leaf = t.children_left == -1
+            roots.append(offset)
+            left.append(np.where(leaf, -1, t.children_left + offset))
+            right.append(np.where(leaf, -1, t.children_right + offset))
+            feature.append(np.where(leaf, -1, keep[np.maximum(t.feature, 0)]))
+            threshold.append(np.where(leaf, np.nan, t.threshold))
+            v = t.value[:, 0, :]
+            norm = v.sum(axis=1)
+            norm[norm == 0] = 1.0
+            value.append(v[:, pos] / norm)
+            offset += t.node_count
+
+        medians.append(med)
+        tree_ptr.append(len(roots))
+        if cal is not None:
+            iso_x.append(np.asarray(cal.X_thresholds_, dtype=float))
+            iso_y.append(np.asarray(cal.y_thresholds_, dtype=float))
+        iso_ptr.append(iso_ptr[-1] + (len(iso_x[-1]) if cal is not None else 0))
+
+    return FlatForest(
+        medians=np.vstack(medians),
+        tree_ptr=np.asarray(tree_ptr, dtype=np.int64),
+        iso_ptr=np.asarray(iso_ptr, dtype=np.int64),
+        iso_x=np.concatenate(iso_x) if iso_x else np.empty(0),
+        iso_y=np.concatenate(iso_y) if iso_y else np.empty(0),
+        roots=np.asarray(roots, dtype=np.int32),
+        feature=np.concatenate(feature).astype(np.int32),
+        threshold=np.concatenate(threshold).astype(np.float64),
+        left=np.concatenate(left).astype(np.int32),
+        right=np.concatenate(right).astype(np.int32),
+        value=np.concatenate(value).astype(np.float64),
+        feature_names=names,
+        source_hash=source_hash,
+    )
+
+
+def _floor32(thr: np.ndarray) -> np.ndarray:
+    """Plus grand float32 <= seuil : pour x float32, x <= seuil  <=>  x <= _floor32(seuil)."""
+    t32 = thr.astype(np.float32)
+    up = t32.astype(np.float64) > thr
+    t32[up] = np.nextafter(t32[up], np.float32(-np.inf))
+    return t32
+
+
+class FlatForest:
+    """
+    Forêt (ou CalibratedClassifierCV de forêts) sous forme de tableaux plats, même
+    interface que le pipeline (predict_proba) et mêmes résultats : seuils comparés en
+    float32 comme sklearn, probabilités des arbres sommées dans le même ordre.
+
+    Évaluation (arbres d'au plus 64 feuilles) : pour chaque feature, les seuils de
+    tous les arbres sont triés et un masque de feuilles encore atteignables est
+    précalculé par rang ; une ligne n'a qu'un searchsorted et un ET binaire par
+    feature, la feuille de sortie est le bit le plus bas. Au-delà de 64 feuilles,
+    parcours niveau par niveau de tous les arbres à la fois.
+    """
+
+    def __init__(self, *, medians, tree_ptr, iso_ptr, iso_x, iso_y, roots, feature,
+                 threshold, left, right, value, feature_names=(), source_hash="",
+                 threads: int = FOREST_THREADS):
+        self.medians, self.tree_ptr, self.iso_ptr = medians, tree_ptr, iso_ptr
+        self.iso_x, self.iso_y = iso_x, iso_y
+        self.roots, self.feature, self.threshold = roots, feature, threshold
+        self.left, self.right, self.value = left, right, value
+        self.feature_names = list(feature_names)
+        self.source_hash = source_hash
+        self.threads = max(1, int(threads))
+        self.classes_ = np.array([0, 1])
+        self.n_features_in_ = medians.shape[1]
+        self._prepare()
+
+    # -- structures d'évaluation (dérivées des tableaux, non sauvegardées) --
+    def _prepare(self) -> None:
+        n_nodes, n_trees = len(self.feature), len(self.roots)
+        tree_of = np.empty(n_nodes, dtype=np.int64)
+        rank = np.zeros(n_nodes, dtype=np.int64)       # feuilles numérotées de gauche à droite
+        lo = np.zeros(n_nodes, dtype=np.int64)
+        hi = np.zeros(n_nodes, dtype=np.int64)         # feuilles [lo, hi) sous chaque noeud
+        leaf_off = np.zeros(n_trees + 1, dtype=np.int64)
+        depth = 0
+        for t, root in enumerate(self.roots.tolist()):
+            count, stack = 0, [(root, 0, False)]
+            while stack:
+                node, d, done = stack.pop()
+                tree_of[node] = t
+                l = self.left[node]
+                if l < 0:
+                    lo[node], hi[node], rank[node] = count, count + 1, count
+                    count += 1
+                    depth = max(depth, d)
+                elif done:
+                    lo[node], hi[node] = lo[l], hi[self.right[node]]
+                else:
+                    stack += [(node, d, True), (self.right[node], d + 1, False), (l, d + 1, False)]
+            leaf_off[t + 1] = leaf_off[t] + count
+        self.depth = depth
+        is_leaf = self.left < 0
+        self._leaf_off = leaf_off[:-1]
+        self._leaf_value = np.empty(leaf_off[-1])
+        self._leaf_value[leaf_off[tree_of[is_leaf]] + rank[is_leaf]] = self.value[is_leaf]
+
+        max_leaves = int(np.diff(leaf_off).max()) if n_trees else 0
+        self._tables = None
+        if max_leaves <= 64:
+            dtype = np.uint32 if max_leaves <= 32 else np.uint64
+            all_bits = int(np.iinfo(dtype).max)
+            inner = np.flatnonzero(~is_leaf)
+            l = self.left[inner]
+            # noeud faux (x > seuil) : les feuilles du sous-arbre gauche deviennent inatteignables
+            masks = np.array([all_bits & ~(((1 << int(b - a)) - 1) << int(a))
+                              for a, b in zip(lo[l], hi[l])], dtype=dtype)
+            thr32 = _floor32(self.threshold[inner])
+            self._tables = {}
+            for f in np.unique(self.feature[inner]).tolist():
+                sel = np.flatnonzero(self.feature[inner] == f)
+                sel = sel[np.argsort(thr32[sel], kind="stable")]
+                table = np.full((len(sel) + 1, n_trees), all_bits, dtype=dtype)
+                table[np.arange(1, len(sel) + 1), tree_of[inner[sel]]] = masks[sel]
+                np.bitwise_and.accumulate(table, axis=0, out=table)
+                # une ligne par seuil distinct (la dernière de chaque groupe d'ex-aequo)
+                uniq, first = np.unique(thr32[sel], return_index=True)
+                self._tables[f] = (uniq, table[np.concatenate([[0], first[1:], [len(sel)]])])
+        else:
+            # parcours par niveaux : les feuilles bouclent sur elles-mêmes
+            ids = np.arange(n_nodes, dtype=np.int32)
+            self._lv_left = np.where(is_leaf, ids, self.left)
+            self._lv_right = np.where(is_leaf, ids, self.right)
+            self._lv_feature = np.where(is_leaf, 0, self.feature)
+            self._lv_threshold = np.where(is_leaf, np.inf, self.threshold)
+
+    # -- disposition projetable en mémoire (partagée entre workers) --
+    def _prepared(self) -> dict[str, np.ndarray]:
+        out = {"_leaf_off": self._leaf_off, "_leaf_value": self._leaf_value}
+        if self._tables is not None:
+            for f, (thr, table) in self._tables.items():
+                out[f"table_{f}_thr"], out[f"table_{f}_mask"] = thr, table
+        else:
+            out.update(_lv_left=self._lv_left, _lv_right=self._lv_right,
+                       _lv_feature=self._lv_feature, _lv_threshold=self._lv_threshold)
+        return out
+
+    def save_mmap(self, directory: str) -> str:
+        """
+        Un .npy non compressé par tableau, structures d'évaluation comprises : load_mmap
+        les projette en lecture seule, les pages sont partagées par tous les processus.
+        Écriture dans un répertoire temporaire puis renommage (atomique).
+        """
+        parent = os.path.dirname(os.path.abspath(directory))
+        os.makedirs(parent, exist_ok=True)
+        tmp = tempfile.mkdtemp(prefix=".flat-", dir=parent)
+        try:
+            arrays = {k: getattr(self, k) for k in _ARRAYS} | self._prepared()
+            for name, a in arrays.items():
+                np.save(os.path.join(tmp, f"{name}.npy"), np.ascontiguousarray(a))
+            meta = {"format": MMAP_FORMAT, "source_hash": self.source_hash, "depth": self.depth,
+                    "feature_names": self.feature_names,
+                    "tables": sorted(self._tables) if self._tables is not None else None}
+            with open(os.path.join(tmp, "meta.json"), "w", encoding="utf-8") as f:
+                json.dump(meta, f, ensure_ascii=False)
+            try:
+                os.rename(tmp, directory)
+            except OSError:
+                if not os.path.exists(os.path.join(directory, "meta.json")):
+                    raise
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)   # autre processus arrivé avant : sa copie est gardée
+        return directory
+
+    @classmethod
+    def load_mmap(cls, directory: str, threads: int = FOREST_THREADS) -> "FlatForest":
+        """Tableaux projetés (mmap_mode="r") ; rien n'est recalculé ni copié."""
+        with open(os.path.join(directory, "meta.json"), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("format") != MMAP_FORMAT:
+            raise ValueError(f"Format de forêt projetée inattendu : {meta.get('format')!r}")
+        load = lambda name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r")
+
+        self = cls.__new__(cls)
+        for k in _ARRAYS:
+            setattr(self, k, load(k))
+        self.feature_names = list(meta["feature_names"])
+        self.source_hash = meta["source_hash"]
+        self.threads = max(1, int(threads))
+        self.classes_ = np.array([0, 1])
+        self.n_features_in_ = self.medians.shape[1]
+        self.depth = meta["depth"]
+        self._leaf_off, self._leaf_value = load("_leaf_off"), load("_leaf_value")
+        if meta["tables"] is not None:
+            self._tables = {f: (load(f"table_{f}_thr"), load(f"table_{f}_mask")) for f in meta["tables"]}
+        else:
+            self._tables = None
+            for k in ("_lv_left", "_lv_right", "_lv_feature", "_lv_threshold"):
+                setattr(self, k, load(k))
+        return self
+
+    # -- artefact --
+    def save(self, path: str) -> None:
+        tmp = f"{path}.{os.getpid()}.tmp.npz"
+        np.savez_compressed(
+            tmp, medians=self.medians, tree_ptr=self.tree_ptr, iso_ptr=self.iso_ptr,
+            iso_x=self.iso_x, iso_y=self.iso_y, roots=self.roots, feature=self.feature,
+            threshold=self.threshold, left=self.left, right=self.right, value=self.value,
+            feature_names=np.asarray(self.feature_names, dtype=str),
+            source_hash=np.asarray(self.source_hash),
+        )
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str, **kw) -> "FlatForest":
+        with np.load(path, allow_pickle=False) as z:
+            arrays = {k: z[k] for k in z.files}
+        arrays["feature_names"] = arrays["feature_names"].tolist()
+        arrays["source_hash"] = str(arrays["source_hash"])
+        return cls(**arrays, **kw)
+
+    @property
+    def nbytes(self) -> int:
+        arrays = [self.medians, self.iso_x, self.iso_y, self.roots, self.feature, self.threshold,
+                  self.left, self.right, self.value, self._leaf_value, self._leaf_off]
+        if self._tables is not None:
+            arrays += [a for pair in self._tables.values() for a in pair]
+        return sum(a.nbytes for a in arrays)
+
+    # -- évaluation --
+    def _leaf_values(self, X32: np.ndarray, t0: int, t1: int) -> np.ndarray:
+        """Proba de chaque arbre t0..t1-1 pour chaque ligne : (n, t1 - t0)."""
+        if self._tables is not None:
+            bits = None
+            for f, (thr, table) in self._tables.items():
+                k = np.searchsorted(thr, X32[:, f], side="left")   # nb de seuils < x
+                part = table[k, t0:t1]
+                bits = part if bits is None else np.bitwise_and(bits, part, out=bits)
+            if bits is None:
+                leaf = np.zeros((len(X32), t1 - t0), dtype=np.int64)
+            else:
+                low = bits & (~bits + bits.dtype.type(1))           # bit le plus bas
+                leaf = np.frexp(low.astype(np.float64))[1] - 1
+            return self._leaf_value[self._leaf_off[t0:t1] + leaf]
+
+        rows = np.arange(len(X32))[:, None]
+        idx = np.broadcast_to(self.roots[t0:t1], (len(X32), t1 - t0)).copy()
+        for _ in range(self.depth):
+            go_left = X32[rows, self._lv_feature[idx]] <= self._lv_threshold[idx]
+            idx = np.where(go_left, self._lv_left[idx], self._lv_right[idx])
+        return self.value[idx]
+
+    def _forest(self, X32: np.ndarray, t0: int, t1: int, pool: ThreadPoolExecutor | None) -> np.ndarray:
+        acc = np.zeros(len(X32))
+        for start in range(0, len(X32), ROW_BLOCK):
+            xb = X32[start:start + ROW_BLOCK]
+            if pool is None:
+                vals = self._leaf_values(xb, t0, t1)
+            else:
+                # blocs d'arbres en parallèle ; la somme reste faite dans l'ordre des arbres
+                bounds = np.linspace(t0, t1, self.threads + 1).astype(int)
+                vals = np.hstack(list(pool.map(lambda b: self._leaf_values(xb, b[0], b[1]),
+                                               zip(bounds[:-1], bounds[1:]))))
+            part = acc[start:start + len(xb)]
+            for col in np.ascontiguousarray(vals.T):
+                part += col
+        return acc / (t1 - t0)
+
+    def predict_pos(self, X) -> np.ndarray:
+        if isinstance(X, pd.DataFrame):
+            if self.feature_names and list(X.columns) != self.feature_names:
+                X = X[self.feature_names]
+            X = X.to_numpy(dtype=float, na_value=np.nan)
+        X = np.asarray(X, dtype=float)
+        if X.ndim != 2 or X.shape[1] != self.n_features_in_:
+            raise ValueError(f"{self.n_features_in_} features attendues, {X.shape} reçu.")
+        if np.isinf(X).any():
+            raise ValueError("Input contains infinity or a value too large for dtype('float32').")
+
+        pool = ThreadPoolExecutor(self.threads) if self.threads > 1 and len(X) > 1 else None
+        try:
+            out = np.zeros(len(X))
+            n_members = len(self.tree_ptr) - 1
+            for m in range(n_members):
+                Xm = np.where(np.isnan(X), self.medians[m], X).astype(np.float32)
+                p = self._forest(Xm, int(self.tree_ptr[m]), int(self.tree_ptr[m + 1]), pool)
+                i0, i1 = int(self.iso_ptr[m]), int(self.iso_ptr[m + 1])
+                if i1 > i0:
+                    p = np.clip(np.interp(p, self.iso_x[i0:i1], self.iso_y[i0:i1]), 0.0, 1.0)
+                out += p
+            return out / n_members if n_members > 1 else out
+        finally:
+            if pool is not None:
+                pool.shutdown()
+
+    def predict_proba(self, X) -> np.ndarray:
+        p = self.predict_pos(X)
+        return np.column_stack([1.0 - p, p])
+
+# ---------- contrôle de parité ----------
+def parity_sample(flat: FlatForest, n: int = 2000, seed: int = 0) -> np.ndarray:
+    """Lignes synthétiques autour des seuils réels des arbres (+ ~10 % de valeurs manquantes)."""
+    rng = np.random.default_rng(seed)
+    n_in = flat.n_features_in_
+    X = rng.normal(0, 1, (n, n_in)) * np.nan_to_num(np.abs(flat.medians[0]), nan=1.0) + np.nan_to_num(flat.medians[0])
+    inner = flat.left >= 0
+    for j in range(n_in):
+        thr = flat.threshold[inner & (flat.feature == j)]
+        if thr.size:
+            pick = rng.random(n) < 0.7
+            X[pick, j] = rng.choice(thr, pick.sum()) + rng.choice([-1e-6, 0.0, 1e-6], pick.sum())
+    X[rng.random(X.shape) < 0.1] = np.nan
+    return X
+
+
+def check_parity(model: Any, flat: FlatForest, X: np.ndarray | None = None) -> float:
+    """Écart max |predict_proba sklearn - forêt compilée| ; ValueError au-delà de PARITY_ATOL."""
+    X = parity_sample(flat) if X is None else X
+    if flat.feature_names:
+        X = pd.DataFrame(X, columns=flat.feature_names)
+    ref = model.predict_proba(X)[:, 1]
+    got = flat.predict_pos(X)
+    err = float(np.max(np.abs(ref - got))) if len(ref) else 0.0
+    if err > PARITY_ATOL:
+        raise ValueError(f"Forêt compilée non conforme : écart max {err:.3g} > {PARITY_ATOL:g}")
+    return err
+
+
+def compile_file(pipe_path: str, out_path: str | None = None) -> tuple[str, float]:
+    """Compile pipeline.joblib -> pipeline.flat.npz après contrôle de parité ; renvoie (chemin, écart)."""
+    import joblib
+
+    with open(pipe_path, "rb") as f:
+        source_hash = hashlib.sha256(f.read()).hexdigest()
+    model = joblib.load(pipe_path)
+    flat = compile_model(model, source_hash)
+    err = check_parity(model, flat)
+    out_path = out_path or flat_path_for(pipe_path)
+    flat.save(out_path)
+    return out_path, err
+
+
+if __name__ == "__main__":
+    import argparse
+    from services.model_registry import PIPE_PATH
+
+    ap = argparse.ArgumentParser(description="Compile pipeline.joblib en forêt à tableaux plats (pipeline.flat.npz).")
+    ap.add_argument("pipeline", nargs="?", default=PIPE_PATH)
+    ap.add_argument("-o", "--output")
+    args = ap.parse_args()
+    path, err = compile_file(args.pipeline, args.output)
+    print(f"{path} écrit (écart max vs predict_proba : {err:.2e})")
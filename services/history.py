@@ -0,0 +1,225 @@
+# services/history.py — historique persistant des lignes notées, tous uploads confondus (SQLite indexé)
+"""
+Une table `uploads` (un enregistrement par ticket : date, version modèle/config, fichier)
+et une table `scores` (une ligne par entreprise-année notée) en ajout seul.
+Les notes sont stockées en rang dans RATING_ORDER (AAA = 0), l'entreprise sous son nom
+normalisé (services.search.normalize_name). Deux index couvrants :
+  - (company_key, upload, year) : trajectoire d'une entreprise sur les derniers uploads ;
+  - (year, company_key, upload, n_final) : migrations d'une année à l'autre.
+Chaque processus ouvre ses propres connexions (mode WAL : lectures concurrentes des workers
+gunicorn et des jobs asynchrones pendant une écriture). Côté web, submit() écrit sur un fil
+dédié : /predict n'attend pas la mise à jour des index.
+"""
+from __future__ import annotations
+import os, sqlite3, threading, time
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import closing
+import numpy as np
+import pandas as pd
+
+from config import RATING_ORDER, HISTORY_ENABLED, HISTORY_DB, HISTORY_MAX_UPLOADS
+from services.rerating import rating_codes, summarize, distribution
+from services.schema import compile_schema
+from services.metrics import METRICS
+from services.search import find_company_column, normalize_name
+
+RATING_COLUMNS = {  # colonne du résultat -> colonne SQLite
+    "Notation_absolue": "n_abs",
+    "Notation_quantiles": "n_quantiles",
+    "Notation_prudente": "n_prudente",
+    "Notation_overlay": "n_overlay",
+    "Notation_finale": "n_final",
+}
+_CODES = tuple(RATING_COLUMNS.values())
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS uploads (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    upload_id TEXT NOT NULL UNIQUE,
+    created_at REAL NOT NULL,
+    model_version TEXT,
+    source TEXT,
+    rows INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS scores (
+    upload INTEGER NOT NULL REFERENCES uploads(seq),
+    company_key TEXT NOT NULL,
+    company TEXT NOT NULL,
+    year INTEGER,
+    sector TEXT,
+    pd REAL,
+    {", ".join(f"{c} INTEGER" for c in _CODES)}
+);
+CREATE INDEX IF NOT EXISTS scores_company ON scores(company_key, upload, year);
+CREATE INDEX IF NOT EXISTS scores_year ON scores(year, company_key, upload, n_final);
+"""
+
+
+def _nullable(values: np.ndarray, missing: np.ndarray) -> np.ndarray:
+    """Tableau objet (valeurs Python natives) avec None aux positions manquantes : liaison SQLite directe."""
+    out = values.astype(object)
+    out[missing] = None
+    return out
+
+
+def _count_failure(fut: Future) -> None:
+    if not fut.cancelled() and fut.exception() is not None:
+        METRICS.inc("brvm_history_errors_total")
+
+
+class HistoryStore:
+    """Historique SQLite en ajout seul ; append() est idempotent par upload_id (ticket)."""
+
+    def __init__(self, path: str = HISTORY_DB):
+        self.path = path
+        self._ready = False
+        self._lock = threading.Lock()
+        self._writer: ThreadPoolExecutor | None = None
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("PRAGMA synchronous=NORMAL")
+        if not self._ready:
+            with self._lock:
+                if not self._ready:
+                    conn.execute("PRAGMA journal_mode=WAL")
+                    conn.executescript(SCHEMA)
+                    self._ready = True
+        return conn
+
+    # -- écriture --
+    def rows(self, result: pd.DataFrame) -> pd.DataFrame:
+        """Colonnes historisées d'un résultat noté (lignes sans entreprise ignorées)."""
+        schema = compile_schema(result.columns)
+        company = result[find_company_column(result)]
+        keep = company.notna().to_numpy()
+        company = company[keep].astype(str)
+        inv, uniq = pd.factorize(company)
+        keys = np.asarray([normalize_name(u) for u in uniq], dtype=object)[inv]
+
+        out = {"company_key": keys, "company": company.to_numpy(dtype=object)}
+        n = int(keep.sum())
+        year = (pd.to_numeric(result[schema.year_col], errors="coerce")[keep].to_numpy(dtype=float)
+                if schema.year_col else np.full(n, np.nan))
+        out["year"] = _nullable(np.nan_to_num(year).astype(np.int64), np.isnan(year))
+        sector = result[schema.sector_col][keep] if schema.sector_col else pd.Series([None] * n)
+        out["sector"] = _nullable(sector.astype(str).to_numpy(dtype=object), sector.isna().to_numpy())
+        pdv = (result["Proba_defaillance"][keep].to_numpy(dtype=float)
+               if "Proba_defaillance" in result.columns else np.full(n, np.nan))
+        out["pd"] = _nullable(pdv, np.isnan(pdv))
+        for col, name in RATING_COLUMNS.items():
+            codes = rating_codes(result[col][keep]) if col in result.columns else np.full(n, -1, np.int8)
+            out[name] = _nullable(codes.astype(np.int64), codes < 0)
+        return pd.DataFrame(out)
+
+    def append(self, result: pd.DataFrame, upload_id: str, model_version: str | None = None,
+               source: str | None = None) -> int:
+        """Ajoute les lignes d'un ticket (une transaction) ; 0 si ce ticket est déjà historisé."""
+        rows = self.rows(result)
+        cols = ["upload", *rows.columns]
+        sql = f"INSERT INTO scores ({', '.join(cols)}) VALUES ({', '.join('?' * len(cols))})"
+        with closing(self._connect()) as conn, conn:
+            cur = conn.execute(
+                "INSERT OR IGNORE INTO uploads (upload_id, created_at, model_version, source, rows) "
+                "VALUES (?, ?, ?, ?, ?)", (upload_id, time.time(), model_version, source, len(rows)))
+            if cur.rowcount == 0:
+                return 0
+            seq = cur.lastrowid
+            arrays = [rows[c].to_numpy(dtype=object) for c in rows.columns]
+            conn.executemany(sql, zip([seq] * len(rows), *arrays))
+        METRICS.inc("brvm_history_rows_total", len(rows))
+        return len(rows)
+
+    def submit(self, result: pd.DataFrame, upload_id: str, model_version: str | None = None,
+               source: str | None = None) -> Future:
+        """append() sur le fil d'écriture du processus (un seul : les écritures restent ordonnées)."""
+        with self._lock:
+            if self._writer is None:
+                self._writer = ThreadPoolExecutor(1, thread_name_prefix="history")
+        fut = self._writer.submit(self.append, result, upload_id, model_version, source)
+        fut.add_done_callback(_count_failure)
+        return fut
+
+    def flush(self) -> None:
+        """Attend la fin des écritures soumises (arrêt propre, tests)."""
+        with self._lock:
+            writer, self._writer = self._writer, None
+        if writer is not None:
+            writer.shutdown(wait=True)
+
+    # -- lecture --
+    def uploads(self, limit: int = 20) -> list[dict]:
+        """Derniers uploads historisés, du plus récent au plus ancien."""
+        with closing(self._connect()) as conn:
+            cur = conn.execute("SELECT upload_id, created_at, model_version, source, rows FROM uploads "
+                               "ORDER BY seq DESC LIMIT ?", (limit,))
+            return [dict(zip(("upload_id", "created_at", "model_version", "source", "rows"), r)) for r in cur]
+
+    def companies(self, prefix: str = "", limit: int = 20) -> list[dict]:
+        """Entreprises dont le nom normalisé commence par `prefix` (parcours d'index par intervalle)."""
+        key = normalize_name(prefix)
+        with closing(self._connect()) as conn:
+            cur = conn.execute(
+                "SELECT company_key, COUNT(*), COUNT(DISTINCT upload) FROM scores "
+                "WHERE company_key >= ? AND company_key < ? GROUP BY company_key ORDER BY company_key LIMIT ?",
+                (key, key + "\U0010ffff", limit))
+            return [{"company": k, "rows": n, "uploads": u} for k, n, u in cur]
+
+    def company_history(self, company: str, last: int = 8, year: int | None = None) -> dict | None:
+        """Lignes de l'entreprise dans ses `last` derniers uploads (ordre chronologique) ; None si inconnue."""
+        key = normalize_name(company)
+        last = max(1, min(int(last), HISTORY_MAX_UPLOADS))
+        with closing(self._connect()) as conn:
+            seqs = [s for (s,) in conn.execute(
+                "SELECT DISTINCT upload FROM scores WHERE company_key = ? ORDER BY upload DESC LIMIT ?",
+                (key, last))]
+            if not seqs:
+                return None
+            where, args = "s.company_key = ? AND s.upload >= ?", [key, min(seqs)]
+            if year is not None:
+                where, args = where + " AND s.year = ?", args + [year]
+            cur = conn.execute(
+                "SELECT u.upload_id, u.created_at, u.model_version, u.source, s.company, s.year, s.sector, s.pd, "
+                f"{', '.join('s.' + c for c in _CODES)} FROM scores s JOIN uploads u ON u.seq = s.upload "
+                f"WHERE {where} ORDER BY s.upload, s.year", args)
+            uploads: dict[str, dict] = {}
+            for upload_id, created, version, source, name, yr, sector, pdv, *codes in cur:
+                up = uploads.setdefault(upload_id, {"upload_id": upload_id, "created_at": created,
+                                                    "model_version": version, "source": source, "rows": []})
+                up["rows"].append({
+                    "company": name, "year": yr, "sector": sector, "pd": pdv,
+                    **{col: (RATING_ORDER[c] if c is not None else None) for col, c in zip(RATING_COLUMNS, codes)},
+                })
+        return {"company": key, "uploads": list(uploads.values())}
+
+    def migrations(self, year_from: int, year_to: int, upload_id: str | None = None,
+                   sector: str | None = None) -> dict | None:
+        """
+        Migration de la note finale de `year_from` à `year_to`, entreprise par entreprise.
+        Par défaut, chaque entreprise-année prend sa note la plus récente (dernier upload qui la contient) ;
+        `upload_id` restreint à un seul upload. None si l'upload est inconnu.
+        """
+        with closing(self._connect()) as conn:
+            filters, args = "n_final IS NOT NULL", []
+            if upload_id is not None:
+                row = conn.execute("SELECT seq FROM uploads WHERE upload_id = ?", (upload_id,)).fetchone()
+                if row is None:
+                    return None
+                filters, args = filters + " AND upload = ?", [row[0]]
+            if sector is not None:
+                filters, args = filters + " AND sector = ?", args + [sector]
+            # colonne nue + MAX() : SQLite renvoie n_final de la ligne du dernier upload
+            sub = f"SELECT company_key, n_final, MAX(upload) FROM scores WHERE year = ? AND {filters} GROUP BY company_key"
+            pairs = np.asarray(conn.execute(
+                f"SELECT a.n_final, b.n_final FROM ({sub}) a JOIN ({sub}) b USING (company_key)",
+                [year_from, *args, year_to, *args]).fetchall(), dtype=np.int8).reshape(-1, 2)
+        before, after = pairs[:, 0], pairs[:, 1]
+        return {"from": year_from, "to": year_to, "companies": len(pairs),
+                "from_distribution": distribution(before), **summarize(before, after)}
+
+
+def make_history_store() -> HistoryStore | None:
+    if not HISTORY_ENABLED:
+        return None
+    os.makedirs(os.path.dirname(HISTORY_DB) or ".", exist_ok=True)
+    return HistoryStore(HISTORY_DB)
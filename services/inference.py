@@ -1,75 +1,218 @@
 # services/inference.py — robuste à tous les formats (pipeline complet, pipeline transform, ou pas de pipeline)
 from __future__ import annotations
-import os, json, joblib, pandas as pd
+import bisect, queue, threading, time
+from concurrent.futures import Future
+import numpy as np
+import pandas as pd
 
-MODEL_DIR = os.path.join(os.path.dirname(__file__), "..", "models")
-CLF_PATH = os.path.join(MODEL_DIR, "classifier.joblib")
-PIPE_PATH = os.path.join(MODEL_DIR, "pipeline.joblib")
-FEATURE_LIST_PATH = os.path.join(MODEL_DIR, "feature_list.json")
-
-class NoModelAvailable(Exception):
-    pass
+from config import MICROBATCH_WINDOW_MS, MICROBATCH_MAX_ROWS
+from services.model_registry import (  # noqa: F401 (ré-exports)
+    REGISTRY, NoModelAvailable, MODEL_DIR, CLF_PATH, PIPE_PATH,
+)
+from services.schema import FEATURE_LIST_PATH, compile_schema, load_feature_list  # noqa: F401
+from services.scoring_cache import ROW_CACHE
+from services.metrics import METRICS, MODE_LABELS
 
 def _reorder_features_if_needed(df_features: pd.DataFrame) -> pd.DataFrame:
-    """Optionnel : si feature_list.json présent, impose l'ordre/ajoute colonnes manquantes (=0)."""
-    if os.path.exists(FEATURE_LIST_PATH):
-        with open(FEATURE_LIST_PATH, "r", encoding="utf-8") as f:
-            feat_list = json.load(f)
-        for c in feat_list:
-            if c not in df_features.columns:
-                df_features[c] = 0.0
-        df_features = df_features[feat_list]
-    return df_features
-
-def predict_pd(df_features: pd.DataFrame) -> pd.Series:
+    """
+    Optionnel : si feature_list.json présent, impose l'ordre/ajoute colonnes manquantes (=0).
+    Les colonnes sont rapprochées par nom exact (services.schema), la liste est mise en cache.
+    """
+    feat_list = load_feature_list()
+    if feat_list is None:
+        return df_features
+    sources = compile_schema(df_features.columns).feature_sources(feat_list)
+    return pd.DataFrame({f: (df_features[src] if src is not None else 0.0)
+                         for f, src in zip(feat_list, sources)}, index=df_features.index)
+
+def predict_pd(df_features: pd.DataFrame, use_cache: bool = True) -> pd.Series:
     """
     Prédit la probabilité de défaillance (classe 1) avec la logique suivante :
       A) pipeline.joblib existe et possède predict_proba -> on l'utilise directement (end-to-end)
       B) pipeline.joblib existe et possède transform -> on transforme, puis classifier.joblib fait predict_proba
       C) pas de pipeline -> classifier.joblib fait predict_proba sur les features numériques
+    Les artefacts et le mode sont résolus une fois par processus (voir services.model_registry).
+    Si MICROBATCH_WINDOW_MS > 0, les petits appels concurrents passent par BATCHER (un seul
+    predict_proba par lot). Les lignes déjà notées par la même version du modèle sont servies
+    par ROW_CACHE (services.scoring_cache) : seules les autres partent au modèle
+    (use_cache=False pour des lignes synthétiques, ex. stress tests, qui l'évinceraient).
     """
     # 0) features : imposer l'ordre si présent
     df_features = _reorder_features_if_needed(df_features)
+    bundle = REGISTRY.get()
+    METRICS.inc("brvm_predicted_rows_total", len(df_features), mode=MODE_LABELS[bundle.mode])
 
-    pipe = None
-    clf = None
+    def predict(frame: pd.DataFrame) -> np.ndarray:
+        if BATCHER.enabled and len(frame) < BATCHER.max_rows:
+            return BATCHER.predict(frame)
+        return _predict_matrix(bundle, frame)
 
-    has_pipe = os.path.exists(PIPE_PATH)
-    has_clf  = os.path.exists(CLF_PATH)
+    X = _cacheable_matrix(df_features) if use_cache and ROW_CACHE.enabled else None
+    if X is None:
+        pd_pred = predict(df_features)
+    else:
+        version = f"{bundle.version}|{'|'.join(map(str, df_features.columns))}"
+        pd_pred = ROW_CACHE.predict(X, version, lambda rows: predict(df_features.iloc[rows]))
+    return pd.Series(pd_pred, index=df_features.index, name="Proba_defaillance")
+
+
+def model_info() -> dict:
+    """
+    Modèle servi : mode A/B/C, version des artefacts et, si models/manifest.json décrit
+    ce pipeline (train_model.py), le manifest d'entraînement (features, métriques, temps, hash source).
+    """
+    try:
+        bundle = REGISTRY.get()
+    except NoModelAvailable:
+        return {"mode": "regles", "version": None, "manifest": None}
+    return {"mode": MODE_LABELS[bundle.mode], "version": bundle.version, "manifest": bundle.manifest}
 
-    if not has_pipe and not has_clf:
-        raise NoModelAvailable("Aucun modèle n'est disponible dans /models (ni pipeline.joblib ni classifier.joblib).")
 
-    if has_pipe:
-        pipe = joblib.load(PIPE_PATH)
-        # Cas A : pipeline a predict_proba (pipeline complet)
-        if hasattr(pipe, "predict_proba"):
-            pd_pred = pipe.predict_proba(df_features)[:, 1]
-            return pd.Series(pd_pred, index=df_features.index, name="Proba_defaillance")
+def _cacheable_matrix(df_features: pd.DataFrame) -> np.ndarray | None:
+    """Features en float64 (clé du cache par ligne) ; None si une colonne n'est pas numérique."""
+    if len(df_features) == 0 or not all(pd.api.types.is_numeric_dtype(t) for t in df_features.dtypes):
+        return None
+    return df_features.to_numpy(dtype=np.float64, na_value=np.nan)
 
-    # Si on arrive ici, soit pas de pipe, soit pipe sans predict_proba.
-    # On tente B : pipe.transform + clf.predict_proba
-    if has_clf:
-        clf = joblib.load(CLF_PATH)
 
-    X = df_features
-    if pipe is not None and hasattr(pipe, "transform"):
-        X = pipe.transform(df_features)
+def _predict_matrix(bundle, df_features: pd.DataFrame) -> np.ndarray:
+    # Cas A : pipeline a predict_proba (pipeline complet)
+    if bundle.mode == "A":
+        return bundle.pipe.predict_proba(df_features)[:, 1]
 
-    if clf is None:
-        # On a un pipeline sans predict_proba et pas de classifier séparé -> pas possible
-        raise NoModelAvailable("pipeline.joblib sans predict_proba et sans classifier.joblib.")
+    # Cas B : pipe.transform + clf ; Cas C : clf seul
+    X = bundle.pipe.transform(df_features) if bundle.mode == "B" else df_features
+    clf = bundle.clf
 
-    # Cas B / C : classifier sur X
     if hasattr(clf, "predict_proba"):
-        pd_pred = clf.predict_proba(X)[:, 1]
-        return pd.Series(pd_pred, index=df_features.index, name="Proba_defaillance")
+        return clf.predict_proba(X)[:, 1]
 
     # Dernier recours (peu probable) : pas de predict_proba -> on fabrique une proba à partir de la prédiction
-    if hasattr(clf, "predict"):
-        y_hat = clf.predict(X)
-        # 0/1 -> 0.05 / 0.95 pour simuler une "proba"
-        pd_pred = (y_hat.astype(float) * 0.9) + 0.05
-        return pd.Series(pd_pred, index=df_features.index, name="Proba_defaillance")
+    y_hat = clf.predict(X)
+    # 0/1 -> 0.05 / 0.95 pour simuler une "proba"
+    return (y_hat.astype(float) * 0.9) + 0.05
+
+
+# ---------- micro-batching des petites requêtes concurrentes ----------
+BATCH_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024)
+
+
+def _histogram() -> dict:
+    return {str(b): 0 for b in BATCH_BUCKETS} | {"+Inf": 0}
+
+
+def _observe(hist: dict, value: int) -> None:
+    i = bisect.bisect_left(BATCH_BUCKETS, value)
+    hist[str(BATCH_BUCKETS[i]) if i < len(BATCH_BUCKETS) else "+Inf"] += 1
+
+
+class MicroBatcher:
+    """
+    Regroupe les appels concurrents de predict_pd : un thread répartiteur attend
+    `window_ms` après la première demande (ou `max_rows` lignes), fait un seul
+    predict_proba sur les lignes concaténées puis rend à chaque appelant ses PD.
+    Les forêts notent chaque ligne indépendamment : résultats identiques à l'appel direct.
+    """
+
+    def __init__(self, window_ms: float = MICROBATCH_WINDOW_MS, max_rows: int = MICROBATCH_MAX_ROWS,
+                 registry=REGISTRY):
+        self.window_s = window_ms / 1000.0
+        self.max_rows = max_rows
+        self.registry = registry
+        self._queue: queue.Queue = queue.Queue()
+        self._thread: threading.Thread | None = None
+        self._lock = threading.Lock()
+        self._batches = 0
+        self._requests = 0
+        self._rows = 0
+        self._queued = 0                     # somme des profondeurs de file au départ des lots
+        self._batch_requests = _histogram()  # appelants par lot
+        self._batch_rows = _histogram()      # lignes par lot
+        self._queue_depth = _histogram()     # file d'attente vue au départ d'un lot
+
+    @property
+    def enabled(self) -> bool:
+        return self.window_s > 0 and self.max_rows > 1
+
+    def predict(self, df_features: pd.DataFrame) -> np.ndarray:
+        """Bloque jusqu'au traitement du lot contenant ces lignes."""
+        self._ensure_thread()
+        fut: Future = Future()
+        self._queue.put((df_features, fut))
+        return fut.result()
+
+    def _ensure_thread(self) -> None:
+        if self._thread is None or not self._thread.is_alive():
+            with self._lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(target=self._loop, name="pd-microbatch", daemon=True)
+                    self._thread.start()
+
+    def _gather(self) -> list:
+        batch = [self._queue.get()]
+        rows = len(batch[0][0])
+        deadline = time.monotonic() + self.window_s
+        while rows < self.max_rows:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            batch.append(item)
+            rows += len(item[0])
+        return batch
+
+    def _loop(self) -> None:
+        while True:
+            batch = self._gather()
+            rows, depth = sum(len(df) for df, _ in batch), self._queue.qsize()
+            with self._lock:
+                self._batches += 1
+                self._requests += len(batch)
+                self._rows += rows
+                self._queued += depth
+                _observe(self._batch_requests, len(batch))
+                _observe(self._batch_rows, rows)
+                _observe(self._queue_depth, depth)
+            # sans feature_list.json, les colonnes peuvent différer : un appel par schéma
+            groups: dict = {}
+            for item in batch:
+                groups.setdefault(tuple(item[0].columns), []).append(item)
+            for items in groups.values():
+                self._run(items)
+
+    def _run(self, items: list) -> None:
+        try:
+            bundle = self.registry.get()
+            frames = [df for df, _ in items]
+            X = frames[0] if len(frames) == 1 else pd.concat(frames, ignore_index=True)
+            pd_pred = _predict_matrix(bundle, X)
+        except Exception as e:  # NoModelAvailable, ... : relayée à chaque appelant
+            for _, fut in items:
+                fut.set_exception(e)
+            return
+        start = 0
+        for df, fut in items:
+            fut.set_result(pd_pred[start:start + len(df)])
+            start += len(df)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "window_ms": self.window_s * 1000.0,
+                "max_rows": self.max_rows,
+                "queue_depth": self._queue.qsize(),
+                "batches": self._batches,
+                "requests": self._requests,
+                "rows": self._rows,
+                "queued_at_dispatch": self._queued,
+                "batch_requests": dict(self._batch_requests),
+                "batch_rows": dict(self._batch_rows),
+                "queue_depth_at_dispatch": dict(self._queue_depth),
+            }
+
 
-    raise NoModelAvailable("Impossible de prédire : ni predict_proba ni predict disponible sur le modèle.")
+BATCHER = MicroBatcher()
@@ -1,16 +1,143 @@
 from __future__ import annotations
-import io
+import io, os, json, shutil, tempfile
+from itertools import islice
+from typing import Iterator, Tuple, List
 import pandas as pd
-from typing import Tuple, List
+from pandas.io.parsers import TextParser
+
+from config import READ_CHUNK_ROWS
 
 EXPECTED_SHEET = 0  # first sheet by default
 
-def read_excel(file_stream: io.BytesIO) -> pd.DataFrame:
-    df = pd.read_excel(file_stream, sheet_name=EXPECTED_SHEET, engine="openpyxl")
+def _strip_columns(df: pd.DataFrame) -> pd.DataFrame:
     # Strip columns, unify spaces
     df.columns = [str(c).strip() for c in df.columns]
     return df
 
+def read_excel(file_stream: io.BytesIO) -> pd.DataFrame:
+    df = pd.read_excel(file_stream, sheet_name=EXPECTED_SHEET, engine="openpyxl")
+    return _strip_columns(df)
+
+# ---------- lecture en flux ----------
+def spool_upload(file, directory: str | None = None, suffix: str = "") -> str:
+    """Copie l'upload (werkzeug FileStorage ou flux binaire) par blocs dans un fichier temporaire."""
+    stream = getattr(file, "stream", file)
+    fd, path = tempfile.mkstemp(suffix=suffix, dir=directory)
+    with os.fdopen(fd, "wb") as out:
+        shutil.copyfileobj(stream, out, length=1 << 20)
+    return path
+
+def _convert_cell(v):
+    # mêmes conversions que le lecteur openpyxl de pandas
+    if v is None:
+        return ""
+    if isinstance(v, float) and v.is_integer():
+        return int(v)
+    return v
+
+def _iter_sheet_rows(path: str, sheet: int | str = EXPECTED_SHEET) -> Iterator[list]:
+    """Lignes de la feuille via l'itérateur read-only d'openpyxl (sans arbre DOM)."""
+    from openpyxl import load_workbook
+
+    wb = load_workbook(path, read_only=True, data_only=True, keep_links=False)
+    try:
+        ws = wb.worksheets[sheet] if isinstance(sheet, int) else wb[sheet]
+        width = 1
+        blanks: list[list] = []  # lignes vides en attente : ignorées si en fin de feuille
+        for values in ws.iter_rows(values_only=True):
+            row = [_convert_cell(v) for v in values]
+            while row and row[-1] == "":
+                row.pop()
+            width = max(width, len(row))
+            if not row:
+                blanks.append(row)
+                continue
+            for _ in blanks:
+                yield [""] * width
+            blanks.clear()
+            yield row + [""] * (width - len(row))
+    finally:
+        wb.close()
+
+def iter_excel_chunks(path: str, chunk_rows: int = READ_CHUNK_ROWS,
+                      sheet: int | str = EXPECTED_SHEET) -> Iterator[pd.DataFrame]:
+    """Blocs DataFrame typés de `chunk_rows` lignes, l'en-tête étant la première ligne."""
+    rows = _iter_sheet_rows(path, sheet)
+    header = next(rows, None)
+    if header is None:
+        return
+    while True:
+        block = list(islice(rows, chunk_rows))
+        if not block:
+            break
+        width = len(header)
+        if any(len(r) > width for r in block):
+            header = header + [""] * (max(len(r) for r in block) - width)
+        yield _strip_columns(TextParser([header] + block, header=0, skip_blank_lines=False).read())
+
+def read_excel_streaming(path: str, chunk_rows: int = READ_CHUNK_ROWS) -> pd.DataFrame:
+    chunks = list(iter_excel_chunks(path, chunk_rows))
+    if not chunks:
+        return _strip_columns(pd.read_excel(path, sheet_name=EXPECTED_SHEET, engine="openpyxl"))
+    return pd.concat(chunks, ignore_index=True) if len(chunks) > 1 else chunks[0]
+
+def _csv_separator(path: str) -> str:
+    with open(path, "r", encoding="utf-8-sig", errors="replace") as f:
+        first = f.readline()
+    return ";" if first.count(";") > first.count(",") else ","
+
+def read_upload(path: str, filename: str) -> pd.DataFrame:
+    """Lecture d'un upload déjà déposé sur disque, selon son extension."""
+    ext = os.path.splitext(filename.lower())[1]
+    if ext == ".csv":
+        return _strip_columns(pd.read_csv(path, sep=_csv_separator(path), encoding="utf-8-sig",
+                                          float_precision="round_trip"))
+    if ext == ".parquet":
+        return _strip_columns(pd.read_parquet(path))
+    if ext == ".xlsx":
+        return read_excel_streaming(path)
+    with open(path, "rb") as f:
+        return read_excel(f)
+
+def iter_upload_chunks(path: str, filename: str, chunk_rows: int = READ_CHUNK_ROWS) -> Iterator[pd.DataFrame]:
+    """Comme read_upload, mais par blocs de `chunk_rows` lignes (mémoire bornée)."""
+    ext = os.path.splitext(filename.lower())[1]
+    if ext == ".csv":
+        for chunk in pd.read_csv(path, sep=_csv_separator(path), encoding="utf-8-sig",
+                                 float_precision="round_trip", chunksize=chunk_rows):
+            yield _strip_columns(chunk)
+    elif ext == ".parquet":
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_rows):
+            yield _strip_columns(batch.to_pandas())
+    elif ext == ".xlsx":
+        yield from iter_excel_chunks(path, chunk_rows)
+    else:
+        yield read_upload(path, filename)
+
+def read_records(data: bytes, content_type: str | None) -> pd.DataFrame:
+    """
+    Corps d'une requête API -> DataFrame : JSON (liste d'objets ou {"records": [...]}),
+    NDJSON (un objet par ligne) ou CSV. ValueError si le corps est illisible.
+    """
+    ctype = (content_type or "application/json").split(";")[0].strip().lower()
+    if ctype in ("application/x-ndjson", "application/ndjson", "application/jsonl"):
+        df = pd.read_json(io.BytesIO(data), lines=True, orient="records", dtype=False)
+    elif ctype in ("application/json", "text/json"):
+        payload = json.loads(data or b"null")
+        if isinstance(payload, dict):
+            payload = payload.get("records")
+        if not isinstance(payload, list):
+            raise ValueError("JSON attendu : une liste d'objets ou {\"records\": [...]}.")
+        df = pd.DataFrame.from_records(payload)
+    elif ctype in ("text/csv", "application/csv"):
+        first = data[:4096].decode("utf-8-sig", errors="replace").split("\n", 1)[0]
+        sep = ";" if first.count(";") > first.count(",") else ","
+        df = pd.read_csv(io.BytesIO(data), sep=sep, encoding="utf-8-sig", float_precision="round_trip")
+    else:
+        raise TypeError(f"Content-Type non supporté : {ctype}")
+    return _strip_columns(df)
+
 def validate_columns(df: pd.DataFrame, required: set) -> Tuple[bool, List[str], List[str]]:
     found = set(df.columns)
     missing = sorted(list(required - found))
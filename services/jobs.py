@@ -0,0 +1,212 @@
+# services/jobs.py — scoring asynchrone des gros fichiers dans un pool de processus borné
+from __future__ import annotations
+import os, json, sqlite3, time, uuid, threading
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing as mp
+import pandas as pd
+
+from config import RESULT_STORE_DIR, RESULT_STORE_TTL_S, ASYNC_WORKERS, ASYNC_MAX_PENDING
+from services.io_excel import read_upload, spool_upload
+from services.pipeline import STAGES, score_frame, compact_result
+
+JOBS_DIR = os.path.join(RESULT_STORE_DIR, "jobs")
+TERMINAL_STATES = {"done", "error"}
+
+
+class JobQueueFull(Exception):
+    pass
+
+
+# -- état des jobs : un petit JSON par job, lisible par tous les workers --
+def _status_path(directory: str, job_id: str) -> str:
+    return os.path.join(directory, f"{uuid.UUID(job_id)}.json")
+
+
+def write_status(directory: str, job_id: str, **fields) -> None:
+    path = _status_path(directory, job_id)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"id": job_id, "updated": time.time(), **fields}, f, ensure_ascii=False)
+    os.replace(tmp, path)
+
+
+def read_status(directory: str, job_id: str) -> dict | None:
+    try:
+        with open(_status_path(directory, job_id), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _progress_writer(directory: str, job_id: str):
+    def progress(stage: str) -> None:
+        write_status(directory, job_id, state="running", stage=stage,
+                     progress=round(STAGES.index(stage) / len(STAGES), 2))
+    return progress
+
+
+def _record_history(history_path: str, result: pd.DataFrame, job_id: str, filename: str) -> None:
+    """Ajout à l'historique depuis le pool ; un échec n'invalide pas le job (le résultat est stocké)."""
+    from services.history import HistoryStore
+    from services.scoring_cache import scoring_version
+    try:
+        HistoryStore(history_path).append(result, job_id, scoring_version(), filename)
+    except sqlite3.Error:
+        pass
+
+
+def _run_job(directory: str, job_id: str, upload_path: str, filename: str,
+             store_dir: str | None, history_path: str | None = None) -> pd.DataFrame | None:
+    """
+    Exécuté dans le pool. Avec un store disque, le résultat y est écrit directement
+    (ticket = id du job) ; sinon il est renvoyé au processus web qui le stocke.
+    L'historique (services.history) est alimenté ici, hors du processus web.
+    """
+    progress = _progress_writer(directory, job_id)
+    try:
+        progress("lecture")
+        df = read_upload(upload_path, filename)
+        result = compact_result(score_frame(df, progress))
+        progress("stockage")
+        if history_path:
+            _record_history(history_path, result, job_id, filename)
+        if store_dir is None:
+            return result
+        from services.result_store import SpillingResultStore
+        SpillingResultStore(store_dir).put(result, ticket=job_id)
+        write_status(directory, job_id, state="done", stage="stockage", progress=1.0, ticket=job_id)
+        return None
+    except Exception as e:
+        write_status(directory, job_id, state="error", error=str(e))
+        return None
+    finally:
+        try:
+            os.remove(upload_path)
+        except OSError:
+            pass
+
+
+def _run_explain(directory: str, job_id: str, ticket: str, columns: list[str], out_path: str,
+                 store_dir: str | None, frame: pd.DataFrame | None = None) -> None:
+    """
+    Explications de tout un résultat (services.explain), exécuté dans le pool : colonnes relues
+    depuis le store disque (ou reçues du processus web), Parquet écrit par blocs dans `out_path`.
+    """
+    from services.explain import model_explainer, write_explanations
+    fields = dict(kind="explications", ticket=ticket)
+    try:
+        if frame is None:
+            from services.result_store import SpillingResultStore
+            frame = SpillingResultStore(store_dir).get(ticket, columns=columns)
+            if frame is None:
+                raise ValueError("Résultat introuvable.")
+        flat, _ = model_explainer()
+        write_explanations(frame, flat, out_path, lambda p: write_status(
+            directory, job_id, state="running", stage="explications", progress=round(p, 2), **fields))
+        write_status(directory, job_id, state="done", stage="explications", progress=1.0, **fields)
+    except Exception as e:
+        write_status(directory, job_id, state="error", error=str(e), **fields)
+
+
+class JobManager:
+    """
+    Reçoit les fichiers, les dépose sur disque et lance le pipeline dans un
+    ProcessPoolExecutor (processus 'spawn', créé à la première demande).
+    Au-delà de ASYNC_MAX_PENDING jobs en cours, submit() lève JobQueueFull.
+    """
+
+    def __init__(self, store, directory: str = JOBS_DIR,
+                 max_workers: int = ASYNC_WORKERS, max_pending: int = ASYNC_MAX_PENDING,
+                 history=None):
+        self.store = store
+        self.history = history
+        self.directory = directory
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self._pool: ProcessPoolExecutor | None = None
+        self._pending = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(self.max_workers, mp_context=mp.get_context("spawn"))
+        return self._pool
+
+    def submit(self, file, filename: str) -> str:
+        with self._lock:
+            if self._pending >= self.max_pending:
+                raise JobQueueFull(f"{self._pending} traitements déjà en cours.")
+            self._pending += 1
+        job_id = str(uuid.uuid4())
+        try:
+            # l'extension d'origine reste en fin de nom (openpyxl la vérifie)
+            ext = os.path.splitext(filename.lower())[1]
+            upload_path = spool_upload(file, self.directory, suffix=f".upload{ext}")
+            write_status(self.directory, job_id, state="queued", stage=None, progress=0.0)
+
+            store_dir = getattr(self.store, "directory", None)
+            history_path = self.history.path if self.history is not None else None
+            future = self._get_pool().submit(_run_job, self.directory, job_id, upload_path, filename,
+                                             store_dir, history_path)
+        except BaseException:
+            self._release()   # dépôt ou lancement échoué : la place est rendue
+            raise
+        future.add_done_callback(lambda fut: self._finish(job_id, fut))
+        return job_id
+
+    def _release(self) -> None:
+        with self._lock:
+            self._pending -= 1
+
+    def submit_explain(self, ticket: str, columns: list[str], out_path: str) -> str:
+        """Explications de tout le ticket dans le pool (même borne ASYNC_MAX_PENDING que le scoring)."""
+        with self._lock:
+            if self._pending >= self.max_pending:
+                raise JobQueueFull(f"{self._pending} traitements déjà en cours.")
+            self._pending += 1
+        job_id = str(uuid.uuid4())
+        try:
+            write_status(self.directory, job_id, state="queued", stage=None, progress=0.0,
+                         kind="explications", ticket=ticket)
+            store_dir = getattr(self.store, "directory", None)
+            frame = None if store_dir is not None else self.store.get(ticket, columns=columns)
+            future = self._get_pool().submit(_run_explain, self.directory, job_id, ticket, columns, out_path,
+                                             store_dir, frame)
+        except BaseException:
+            self._release()
+            raise
+        future.add_done_callback(lambda fut: self._finish(job_id, fut))
+        return job_id
+
+    def _finish(self, job_id: str, fut) -> None:
+        self._release()
+        try:
+            result = fut.result()
+        except Exception as e:  # processus du pool tué, résultat non picklable, ...
+            write_status(self.directory, job_id, state="error", error=str(e))
+            return
+        if result is not None:
+            self.store.put(result, ticket=job_id)
+            write_status(self.directory, job_id, state="done", stage="stockage", progress=1.0, ticket=job_id)
+
+    def status(self, job_id: str) -> dict | None:
+        return read_status(self.directory, job_id)
+
+    def sweep(self, ttl_s: float = RESULT_STORE_TTL_S) -> int:
+        """Supprime les états (et dépôts orphelins) plus vieux que le TTL des résultats."""
+        n, now = 0, time.time()
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            try:
+                if now - os.path.getmtime(path) > ttl_s:
+                    os.remove(path)
+                    n += 1
+            except OSError:
+                pass
+        return n
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
@@ -0,0 +1,255 @@
+# services/metrics.py — instrumentation légère : temps par étape, compteurs, export Prometheus, profil échantillonné
+from __future__ import annotations
+import os, sys, threading, time, uuid
+from bisect import bisect_left
+from collections import Counter
+from typing import Callable
+
+from config import METRICS_ENABLED, PROFILE_INTERVAL_MS, RESULT_STORE_DIR
+
+PROFILES_DIR = os.path.join(RESULT_STORE_DIR, "profiles")
+PROFILES_MAX_ITEMS = 32
+
+SECONDS_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+BYTES_BUCKETS = tuple(float(1 << k) for k in range(10, 31, 2))   # 1 Ko .. 1 Go
+
+HELP = {
+    "brvm_stage_seconds": ("histogram", "Durée de chaque étape (lecture, nettoyage, inference, notation, rendu, ...)."),
+    "brvm_request_seconds": ("histogram", "Durée totale des requêtes HTTP par vue."),
+    "brvm_upload_bytes": ("histogram", "Taille des uploads et corps d'API reçus."),
+    "brvm_rows_processed_total": ("counter", "Lignes notées."),
+    "brvm_predicted_rows_total": ("counter", "Lignes dont la PD a été calculée, par mode (pipeline, classifier, regles)."),
+    "brvm_history_rows_total": ("counter", "Lignes ajoutées à l'historique (services.history)."),
+    "brvm_history_errors_total": ("counter", "Ajouts à l'historique en échec."),
+}
+
+# Modes A/B/C de services.model_registry -> libellés exportés
+MODE_LABELS = {"A": "pipeline", "B": "pipeline_classifier", "C": "classifier"}
+
+
+def _labels(labels: tuple) -> str:
+    if not labels:
+        return ""
+    esc = lambda v: str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return "{" + ",".join(f'{k}="{esc(v)}"' for k, v in labels) + "}"
+
+
+class Histogram:
+    def __init__(self, buckets: tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    def lines(self, name: str, labels: tuple) -> list[str]:
+        return _histogram_lines(name, labels, zip((*map(repr, self.buckets), "+Inf"), self.counts), self.sum)
+
+
+def _histogram_lines(name: str, labels: tuple, counts, total: float) -> list[str]:
+    """Seaux cumulés (le=...), _sum et _count ; `counts` : paires (borne, effectif du seau) dans l'ordre."""
+    out, acc = [], 0
+    for le, n in counts:
+        acc += n
+        out.append(f"{name}_bucket{_labels(labels + (('le', le),))} {acc}")
+    out.append(f"{name}_sum{_labels(labels)} {total:.6f}")
+    out.append(f"{name}_count{_labels(labels)} {acc}")
+    return out
+
+
+class StageTimer:
+    """
+    Chronomètre d'une requête : `stage(nom)` clôt l'étape en cours et ouvre la suivante
+    (même signature que le rappel `progress` de services.pipeline.score_frame).
+    """
+
+    def __init__(self, metrics: "Metrics"):
+        self.metrics = metrics
+        self.t0 = time.perf_counter()
+        self.durations: dict[str, float] = {}
+        self._stage: str | None = None
+        self._start = self.t0
+
+    def stage(self, name: str) -> None:
+        now = time.perf_counter()
+        self._close(now)
+        self._stage, self._start = name, now
+
+    def stop(self) -> float:
+        now = time.perf_counter()
+        self._close(now)
+        return now - self.t0
+
+    def _close(self, now: float) -> None:
+        if self._stage is not None:
+            d = now - self._start
+            self.durations[self._stage] = self.durations.get(self._stage, 0.0) + d
+            self.metrics.observe("brvm_stage_seconds", d, stage=self._stage)
+            self._stage = None
+
+    def server_timing(self, total: float) -> str:
+        parts = [f"{name};dur={d * 1000:.1f}" for name, d in self.durations.items()]
+        return ", ".join(parts + [f"total;dur={total * 1000:.1f}"])
+
+
+class _NullTimer:
+    """Chronomètre inactif (métriques désactivées) : aucun coût."""
+    durations: dict = {}
+
+    def stage(self, name: str) -> None:
+        pass
+
+    def stop(self) -> float:
+        return 0.0
+
+
+NULL_TIMER = _NullTimer()
+
+
+class Metrics:
+    """
+    Registre du processus (chaque worker gunicorn a le sien). Désactivé (METRICS=0),
+    observe/inc retournent immédiatement et timer() renvoie NULL_TIMER.
+    """
+
+    def __init__(self, enabled: bool = METRICS_ENABLED):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._hists: dict[tuple[str, tuple], Histogram] = {}
+        self._counters: dict[tuple[str, tuple], float] = {}
+        self._collectors: dict[str, tuple[str, str, Callable[[], dict]]] = {}
+
+    def observe(self, name: str, value: float, buckets: tuple = SECONDS_BUCKETS, **labels) -> None:
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            hist = self._hists.get(key)
+            if hist is None:
+                hist = self._hists[key] = Histogram(buckets)
+            hist.observe(value)
+
+    def inc(self, name: str, value: float = 1, **labels) -> None:
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def collector(self, name: str, kind: str, help_text: str, fn: Callable[[], dict]) -> None:
+        """
+        Valeurs lues à chaque export : fn() -> {tuple de labels (clé, valeur): nombre}.
+        Histogramme (kind="histogram") : fn() -> {labels: ({borne: effectif du seau, ..., "+Inf": n}, somme)}.
+        """
+        self._collectors[name] = (kind, help_text, fn)
+
+    def timer(self) -> StageTimer | _NullTimer:
+        return StageTimer(self) if self.enabled else NULL_TIMER
+
+    def render(self) -> str:
+        """
+        Format texte Prometheus (exposition 0.0.4). Chaque série porte le label `worker` (pid) :
+        les registres sont propres à chaque processus, à agréger côté Prometheus (sum by ...).
+        """
+        worker = (("worker", str(os.getpid())),)
+        with self._lock:
+            hists = sorted(self._hists.items())
+            counters = sorted(self._counters.items())
+        lines: list[str] = []
+        seen: set[str] = set()
+
+        def header(name: str, kind: str, help_text: str) -> None:
+            if name not in seen:
+                seen.add(name)
+                lines.extend([f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"])
+
+        for (name, labels), hist in hists:
+            header(name, *HELP.get(name, ("histogram", name)))
+            lines.extend(hist.lines(name, labels + worker))
+        for (name, labels), value in counters:
+            header(name, *HELP.get(name, ("counter", name)))
+            lines.append(f"{name}{_labels(labels + worker)} {value:g}")
+        for name, (kind, help_text, fn) in sorted(self._collectors.items()):
+            header(name, kind, help_text)
+            for labels, value in fn().items():
+                if kind == "histogram":
+                    lines.extend(_histogram_lines(name, labels + worker, value[0].items(), value[1]))
+                else:
+                    lines.append(f"{name}{_labels(labels + worker)} {float(value):g}")
+        return "\n".join(lines) + "\n"
+
+
+METRICS = Metrics()
+
+
+# ---------- profil échantillonné d'une requête (?profile=1) ----------
+class SamplingProfiler:
+    """
+    Relève la pile d'un thread toutes les `interval_ms` (sys._current_frames), sans
+    instrumenter le code ; sortie en piles repliées (flamegraph.pl, speedscope).
+    """
+
+    def __init__(self, thread_id: int | None = None, interval_ms: float = PROFILE_INTERVAL_MS):
+        self.thread_id = thread_id or threading.get_ident()
+        self.interval_s = interval_ms / 1000.0
+        self.samples: Counter[str] = Counter()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(self) -> "SamplingProfiler":
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval_s):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if stack:
+                self.samples[";".join(reversed(stack))] += 1
+
+    def stop(self) -> "SamplingProfiler":
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        return self
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {n}\n" for stack, n in self.samples.most_common())
+
+
+def save_profile(profiler: SamplingProfiler, directory: str = PROFILES_DIR,
+                 max_items: int = PROFILES_MAX_ITEMS) -> str:
+    """Écrit le profil sur disque (lisible par tous les workers) ; renvoie son identifiant."""
+    os.makedirs(directory, exist_ok=True)
+    pid = uuid.uuid4().hex
+    with open(os.path.join(directory, f"{pid}.txt"), "w", encoding="utf-8") as f:
+        f.write(profiler.collapsed())
+    entries = []
+    for name in os.listdir(directory):
+        try:
+            entries.append((os.path.getmtime(os.path.join(directory, name)), name))
+        except OSError:
+            pass
+    for _, name in sorted(entries)[:max(0, len(entries) - max_items)]:
+        try:
+            os.remove(os.path.join(directory, name))
+        except OSError:
+            pass
+    return pid
+
+
+def load_profile(pid: str, directory: str = PROFILES_DIR) -> str | None:
+    if not pid.isalnum():
+        return None
+    try:
+        with open(os.path.join(directory, f"{pid}.txt"), "r", encoding="utf-8") as f:
+            return f.read()
+    except OSError:
+        return None
@@ -0,0 +1,182 @@
+# services/model_registry.py — chargement unique des artefacts modèle par processus (+ rechargement à chaud)
+from __future__ import annotations
+import os, json, hashlib, threading
+from dataclasses import dataclass
+from typing import Any
+
+from config import INFERENCE_ENGINE, MODEL_MMAP, MODEL_MMAP_DIR
+from services.flat_forest import FlatForest, flat_path_for
+
+MODEL_DIR = os.path.join(os.path.dirname(__file__), "..", "models")
+CLF_PATH = os.path.join(MODEL_DIR, "classifier.joblib")
+PIPE_PATH = os.path.join(MODEL_DIR, "pipeline.joblib")
+MANIFEST_NAME = "manifest.json"   # écrit par train_model.py (services.training)
+
+
+class NoModelAvailable(Exception):
+    pass
+
+
+def _stat_sig(path: str) -> tuple | None:
+    """Signature bon marché (mtime_ns, taille) ; None si le fichier est absent."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+def _file_hash(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _read_manifest(path: str, pipe_hash: str | None) -> dict | None:
+    """manifest.json d'entraînement, seulement s'il décrit bien le pipeline chargé (même sha256)."""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    ok = pipe_hash is not None and manifest.get("artifacts", {}).get("pipeline.joblib") == pipe_hash
+    return manifest if ok else None
+
+
+@dataclass(frozen=True)
+class ModelBundle:
+    """
+    Instantané immuable des artefacts chargés.
+      mode "A" : pipeline.predict_proba (end-to-end)
+      mode "B" : pipeline.transform puis classifier
+      mode "C" : classifier seul sur les features numériques
+    """
+    mode: str
+    pipe: Any             # pipeline sklearn, ou FlatForest compilée à partir de lui
+    clf: Any
+    stats: tuple          # (stat pipeline, stat classifier, stat forêt compilée) pour la détection de changement
+    hashes: tuple         # (sha256 pipeline, sha256 classifier)
+    manifest: dict | None = None   # manifest.json d'entraînement s'il correspond au pipeline
+
+    @property
+    def version(self) -> str:
+        """Identifiant court des artefacts (hash des contenus)."""
+        return hashlib.sha256("|".join(h or "" for h in self.hashes).encode()).hexdigest()[:12]
+
+
+def _detect_mode(pipe: Any, clf: Any) -> str:
+    """Reprend la logique A/B/C de predict_pd, évaluée une seule fois au chargement."""
+    if pipe is not None and hasattr(pipe, "predict_proba"):
+        return "A"
+    if clf is None:
+        if pipe is not None:
+            raise NoModelAvailable("pipeline.joblib sans predict_proba et sans classifier.joblib.")
+        raise NoModelAvailable("Aucun modèle n'est disponible dans /models (ni pipeline.joblib ni classifier.joblib).")
+    if not (hasattr(clf, "predict_proba") or hasattr(clf, "predict")):
+        raise NoModelAvailable("Impossible de prédire : ni predict_proba ni predict disponible sur le modèle.")
+    if pipe is not None and hasattr(pipe, "transform"):
+        return "B"
+    return "C"
+
+
+class ModelRegistry:
+    """
+    Garde les artefacts en mémoire pour la durée du processus.
+    À chaque get(), un simple os.stat vérifie si les fichiers ont changé ; si oui
+    (et que le contenu diffère réellement), on recharge puis on remplace le bundle
+    d'un seul coup : les requêtes en cours gardent l'ancien instantané.
+    """
+
+    def __init__(self, pipe_path: str = PIPE_PATH, clf_path: str = CLF_PATH,
+                 engine: str = INFERENCE_ENGINE, mmap_dir: str | None = MODEL_MMAP_DIR if MODEL_MMAP else None):
+        self.pipe_path = pipe_path
+        self.clf_path = clf_path
+        self.flat_path = flat_path_for(pipe_path)
+        self.manifest_path = os.path.join(os.path.dirname(pipe_path), MANIFEST_NAME)
+        self.engine = engine
+        self.mmap_dir = mmap_dir
+        self._bundle: ModelBundle | None = None
+        self._error: NoModelAvailable | None = None
+        self._stats: tuple | None = None
+        self._lock = threading.Lock()
+
+    def _current_stats(self) -> tuple:
+        flat_stat = _stat_sig(self.flat_path) if self.engine != "sklearn" else None
+        return (_stat_sig(self.pipe_path), _stat_sig(self.clf_path), flat_stat)
+
+    def _load_flat(self, pipe_hash: str):
+        """Forêt compilée à la place de pipeline.joblib si elle en provient (même sha256)."""
+        shared = os.path.join(self.mmap_dir, _file_hash(self.flat_path)[:16]) if self.mmap_dir else None
+        if shared and os.path.exists(os.path.join(shared, "meta.json")):
+            try:
+                flat = FlatForest.load_mmap(shared)
+                return flat if flat.source_hash == pipe_hash else None
+            except (OSError, ValueError, KeyError):
+                pass
+        try:
+            flat = FlatForest.load(self.flat_path)
+        except (OSError, ValueError, KeyError):
+            return None
+        if flat.source_hash != pipe_hash:
+            return None
+        if shared:
+            # premier processus : dépliage en .npy, puis projection (pages partagées entre workers)
+            try:
+                return FlatForest.load_mmap(flat.save_mmap(shared))
+            except (OSError, ValueError):
+                pass
+        return flat
+
+    def _load(self, stats: tuple) -> None:
+        pipe_stat, clf_stat, flat_stat = stats
+        hashes = (
+            _file_hash(self.pipe_path) if pipe_stat else None,
+            _file_hash(self.clf_path) if clf_stat else None,
+        )
+        manifest = _read_manifest(self.manifest_path, hashes[0])
+        cur = self._bundle
+        if cur is not None and cur.hashes == hashes and cur.stats[2] == flat_stat:
+            # fichiers touchés mais contenu identique : pas de désérialisation
+            self._bundle = ModelBundle(cur.mode, cur.pipe, cur.clf, stats, hashes, manifest)
+            self._stats = stats
+            return
+
+        pipe = self._load_flat(hashes[0]) if pipe_stat and flat_stat else None
+        if pipe is None and pipe_stat:
+            import joblib   # import différé : inutile quand la forêt compilée suffit
+            pipe = joblib.load(self.pipe_path)
+        # le classifier n'est utile qu'en mode B/C
+        need_clf = clf_stat and not (pipe is not None and hasattr(pipe, "predict_proba"))
+        if need_clf:
+            import joblib
+        clf = joblib.load(self.clf_path) if need_clf else None
+        try:
+            mode = _detect_mode(pipe, clf)
+        except NoModelAvailable as e:
+            self._bundle, self._error = None, e
+        else:
+            self._bundle, self._error = ModelBundle(mode, pipe, clf, stats, hashes, manifest), None
+        self._stats = stats
+
+    def get(self) -> ModelBundle:
+        stats = self._current_stats()
+        if stats != self._stats:
+            with self._lock:
+                if stats != self._stats:
+                    self._load(stats)
+        bundle = self._bundle
+        if bundle is None:
+            raise self._error or NoModelAvailable("Aucun modèle chargé.")
+        return bundle
+
+    def warm(self) -> ModelBundle | None:
+        """Chargement anticipé (create_app) ; silencieux si aucun modèle."""
+        try:
+            return self.get()
+        except NoModelAvailable:
+            return None
+
+
+REGISTRY = ModelRegistry()
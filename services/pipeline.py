@@ -0,0 +1,205 @@
+# services/pipeline.py — chaîne de scoring complète (partagée par /predict, les jobs asynchrones, ...)
+from __future__ import annotations
+import os, tempfile
+from typing import Callable, Iterable, Iterator
+import numpy as np
+import pandas as pd
+
+from config import SKETCH_EPS, READ_CHUNK_ROWS, RATING_ORDER
+from services.io_excel import iter_upload_chunks
+from services.sketch import PDSketch
+from services.schema import compile_schema
+
+from services.preprocessing import basic_clean, squash_pd
+from services.inference import predict_pd, NoModelAvailable
+from services.criteria import evaluate_criteria
+from services.labeling import compute_defaillance
+from services.pd_rules import pd_from_rules
+from services.metrics import METRICS
+from services.rating import apply_full_notation, rate_with, edges_from_sketch  # seuils dynamiques, overlay, cap
+
+# Étapes rapportées aux callbacks de progression (dans l'ordre)
+STAGES = ("lecture", "nettoyage", "defaillance", "inference", "notation", "stockage")
+
+
+def _noop(stage: str) -> None:
+    pass
+
+
+def model_pd(df: pd.DataFrame, schema, criteria, use_cache: bool = True) -> pd.Series:
+    """PD lissée : modèle sur les colonnes numériques hors identifiants et cible, sinon règles."""
+    try:
+        drop_cols = set(schema.id_cols) | {"Défaillance"}
+        features = (
+            df.drop(columns=[c for c in drop_cols if c in df.columns], errors="ignore")
+              .select_dtypes(include=["number"])
+        )
+        raw_pd = predict_pd(features, use_cache=use_cache)
+    except NoModelAvailable:
+        raw_pd = pd_from_rules(df, criteria=criteria)
+        METRICS.inc("brvm_predicted_rows_total", len(df), mode="regles")
+
+    return squash_pd(raw_pd)  # lissage leger
+
+
+def _score_pd(df: pd.DataFrame, progress: Callable[[str], None]) -> tuple[pd.DataFrame, str, str]:
+    """Nettoyage, cible métier et PD ; renvoie (résultat, colonne année, colonne secteur)."""
+    progress("nettoyage")
+    schema = compile_schema(df.columns)  # rôles des colonnes, partagés par toutes les étapes
+    # copie superficielle : colonnes ajoutées/converties sur un cadre propre, l'entrée (tranche
+    # ou bloc de l'appelant) n'est jamais modifiée ; les données ne sont pas recopiées
+    df = basic_clean(df.copy(deep=False), schema)
+
+    # Cible metier (critères évalués une fois, réutilisés par la PD par règles)
+    progress("defaillance")
+    criteria = evaluate_criteria(df, schema=schema)
+    df["Défaillance"] = compute_defaillance(df, criteria=criteria)
+
+    # PD modele si dispo, sinon regles
+    progress("inference")
+    pd_adj = model_pd(df, schema, criteria)
+
+    result = df  # copie propre à l'appel (cf. plus haut)
+    result["Proba_defaillance"] = pd_adj.values
+
+    # Colonnes robustes ANNEE / SECTEUR
+    col_year = schema.year_col
+    if col_year is None:
+        col_year = "__ANNEE__"
+        result[col_year] = ""
+
+    col_sector = schema.sector_col
+    if col_sector is None:
+        col_sector = "__SECTEUR__"
+        result[col_sector] = "Inconnu"
+
+    return result, col_year, col_sector
+
+
+def _with_statut(result: pd.DataFrame) -> pd.DataFrame:
+    if "Défaillance" in result.columns:
+        result["Statut"] = result["Défaillance"].map({1: "Défaillante", 0: "Saine"}).fillna("Inconnu")
+    else:
+        result["Statut"] = (result["Proba_defaillance"] >= 0.5).map({True: "Défaillante", False: "Saine"})
+    return result
+
+
+def score_frame(df: pd.DataFrame, progress: Callable[[str], None] | None = None) -> pd.DataFrame:
+    """
+    basic_clean -> compute_defaillance -> predict_pd (ou pd_from_rules) -> squash_pd
+    -> apply_full_notation -> Statut. `progress(stage)` est appelé au début de chaque étape.
+    """
+    progress = progress or _noop
+    result, col_year, col_sector = _score_pd(df, progress)
+
+    # Notation complete
+    progress("notation")
+    result = apply_full_notation(result, col_pd="Proba_defaillance", col_year=col_year, col_sector=col_sector)
+
+    # Statut simple
+    return _with_statut(result)
+
+
+def compact_result(result: pd.DataFrame) -> pd.DataFrame:
+    """
+    Représentation stockée d'un résultat : notes, statut et identifiants répétés en
+    Categorical, bonus et cible en int8, PD en float32 (la notation est faite avant,
+    en float64).
+    """
+    out = result.copy(deep=False)
+    for c in out.columns:
+        if c.startswith("Notation_"):
+            out[c] = pd.Categorical(out[c], categories=RATING_ORDER, ordered=True)
+    for c in ("Statut", "Reason"):
+        if c in out.columns:
+            out[c] = out[c].astype("category")
+    # identifiants texte très répétés (entreprise, secteur, pays, ...)
+    for c in compile_schema(out.columns).id_cols:
+        if (out[c].dtype == object
+                and pd.api.types.infer_dtype(out[c], skipna=True) == "string"
+                and out[c].nunique() * 2 <= len(out)):
+            out[c] = out[c].astype("category")
+    for c in ("Overlay_bonus", "Défaillance"):
+        if c in out.columns and out[c].notna().all():
+            out[c] = out[c].astype(np.int8)
+    if "Proba_defaillance" in out.columns:
+        out["Proba_defaillance"] = out["Proba_defaillance"].astype(np.float32)
+    return out
+
+
+# ---------- mode par blocs (panels trop gros pour la mémoire) ----------
+def score_chunked(chunks: Iterable[pd.DataFrame], eps: float = SKETCH_EPS,
+                  workdir: str | None = None) -> Iterator[pd.DataFrame]:
+    """
+    Passe 1 : chaque bloc est nettoyé, étiqueté et scoré ; les PD alimentent une
+    esquisse globale et une par année, le bloc scoré est déposé en Parquet.
+    Passe 2 (légère) : chaque bloc est relu et noté à partir des esquisses.
+    La mémoire est bornée par la taille d'un bloc ; les seuils et rangs centiles
+    sont approchés à `eps` près (en PD) au lieu d'être exacts.
+    """
+    col_pd = "Proba_defaillance"
+    global_sk = PDSketch(eps)
+    by_year: dict = {}
+    with tempfile.TemporaryDirectory(dir=workdir) as tmp:
+        parts = []
+        for i, chunk in enumerate(chunks):
+            scored, col_year, col_sector = _score_pd(chunk, _noop)
+            scored[col_pd] = pd.to_numeric(scored[col_pd], errors="coerce").clip(0, 1)
+            scored = scored.dropna(subset=[col_pd])
+            if scored.empty:
+                continue
+            global_sk.update(scored[col_pd].to_numpy())
+            for year, grp in scored.groupby(col_year)[col_pd]:
+                by_year.setdefault(year, PDSketch(eps)).update(grp.to_numpy())
+            path = os.path.join(tmp, f"part-{i:06d}.parquet")
+            scored.to_parquet(path, index=False)
+            parts.append((path, col_year, col_sector))
+
+        if not parts:
+            return
+        dyn_edges = edges_from_sketch(global_sk)
+        for path, col_year, col_sector in parts:
+            out = pd.read_parquet(path)
+            u = np.full(len(out), np.nan)
+            years = out[col_year].to_numpy()
+            pdv = out[col_pd].to_numpy(dtype=float)
+            for year, sk in by_year.items():
+                m = years == year
+                if m.any():
+                    u[m] = sk.pct_rank(pdv[m])
+            yield _with_statut(rate_with(out, col_pd, col_sector, dyn_edges, u))
+            os.remove(path)
+
+
+def score_file_chunked(path: str, filename: str, out_path: str,
+                       eps: float = SKETCH_EPS, chunk_rows: int = READ_CHUNK_ROWS) -> int:
+    """Note un fichier (xlsx/csv/parquet) par blocs vers un Parquet ; renvoie le nombre de lignes."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    writer, n = None, 0
+    try:
+        for out in score_chunked(iter_upload_chunks(path, filename, chunk_rows), eps,
+                                 workdir=os.path.dirname(os.path.abspath(out_path))):
+            table = pa.Table.from_pandas(out, preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(out_path, table.schema)
+            writer.write_table(table.cast(writer.schema))
+            n += len(out)
+    finally:
+        if writer is not None:
+            writer.close()
+    return n
+
+
+if __name__ == "__main__":
+    import argparse
+
+    ap = argparse.ArgumentParser(description="Notation par blocs d'un gros fichier (xlsx/csv/parquet) vers Parquet.")
+    ap.add_argument("source")
+    ap.add_argument("destination")
+    ap.add_argument("--eps", type=float, default=SKETCH_EPS, help="erreur max des seuils dynamiques (en PD)")
+    ap.add_argument("--chunk-rows", type=int, default=READ_CHUNK_ROWS)
+    args = ap.parse_args()
+    rows = score_file_chunked(args.source, args.source, args.destination, args.eps, args.chunk_rows)
+    print(f"{rows} lignes notées -> {args.destination}")
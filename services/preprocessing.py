@@ -2,14 +2,11 @@ from __future__ import annotations
 import pandas as pd
 import numpy as np
 
-def basic_clean(df: pd.DataFrame) -> pd.DataFrame:
-    """Nettoyage de base : convertir les colonnes texte avec virgule en float."""
-    for col in df.select_dtypes(include=['object']).columns:
-        try:
-            df[col] = df[col].str.replace(",", ".").astype(float)
-        except Exception:
-            pass
-    return df
+from services.schema import UploadSchema, coerce_numeric
+
+def basic_clean(df: pd.DataFrame, schema: UploadSchema | None = None) -> pd.DataFrame:
+    """Nettoyage de base : convertir les colonnes texte avec virgule en float (cf. services.schema)."""
+    return coerce_numeric(df, schema)
 
 
 def squash_pd(pd_series: pd.Series) -> pd.Series:
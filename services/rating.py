@@ -1,7 +1,9 @@
 from __future__ import annotations
+import re
+from functools import lru_cache
 import numpy as np
 import pandas as pd
-from config import RATING_ORDER, TARGET_SHARES, OVERLAY_CAPS
+from config import RATING_ORDER, TARGET_SHARES, OVERLAY_CAPS, SECTOR_BONUS_CACHE_SIZE
 
 # ---------- utilitaires ----------
 def _normtxt(s: str) -> str:
@@ -27,14 +29,25 @@ def shares_to_quantiles(shares: dict[str, float]) -> dict[str, float]:
 
 Q_TARGET = shares_to_quantiles(TARGET_SHARES)
 
+def q_array(shares: dict[str, float] = TARGET_SHARES) -> np.ndarray:
+    """Quantiles cumulés par note (ordre RATING_ORDER)."""
+    q = shares_to_quantiles(shares)
+    return np.array([q[r] for r in RATING_ORDER], dtype=float)
+
 # ---------- absolu dynamique ----------
-def _quantile_edges_from_pd(pd_values: pd.Series) -> dict:
-    q_targets = [Q_TARGET[r] for r in RATING_ORDER]
-    quantiles = pd_values.quantile(q_targets).values
+def _edges_from_quantiles(quantiles) -> dict:
     edges = {r: float(q) for r, q in zip(RATING_ORDER, quantiles)}
     edges[RATING_ORDER[-1]] = 1.0
     return edges
 
+def _quantile_edges_from_pd(pd_values: pd.Series, q_arr: np.ndarray | None = None) -> dict:
+    q_targets = [Q_TARGET[r] for r in RATING_ORDER] if q_arr is None else list(q_arr)
+    return _edges_from_quantiles(pd_values.quantile(q_targets).values)
+
+def edges_from_sketch(sketch) -> dict:
+    """Seuils dynamiques à partir d'une esquisse (services.sketch.PDSketch)."""
+    return _edges_from_quantiles(sketch.quantile([Q_TARGET[r] for r in RATING_ORDER]))
+
 def prob_to_abs_rating_dynamic(p: float, edges: dict) -> str:
     for i, r in enumerate(RATING_ORDER):
         lo = -np.inf if i == 0 else edges[RATING_ORDER[i - 1]]
@@ -44,19 +57,34 @@ def prob_to_abs_rating_dynamic(p: float, edges: dict) -> str:
     return "C"
 
 # ---------- overlay secteur + cap ----------
+# (mots-clés, bonus) évalués dans l'ordre : le premier groupe trouvé l'emporte
+SECTOR_KEYWORDS = (
+    (("eau", "electric", "energie", "utility", "electricite", "électricité"), 2),
+    (("telecom", "télécom"), 2),
+    (("banque", "bank", "finance", "assur"), 1),
+    (("industrie", "manufact", "services", "transport", "logist", "agro", "mines"), 1),
+)
+_SECTOR_RX = [(re.compile("|".join(map(re.escape, kws))), b) for kws, b in SECTOR_KEYWORDS]
+
+@lru_cache(maxsize=SECTOR_BONUS_CACHE_SIZE)
+def _sector_bonus_text(sector: str) -> int:
+    s = _normtxt(sector)
+    for rx, bonus in _SECTOR_RX:
+        if rx.search(s):
+            return bonus
+    return 0
+
 def sector_bonus_value(sector: str | None) -> int:
     if sector is None or (isinstance(sector, float) and np.isnan(sector)):
         return 0
-    s = _normtxt(sector)
-    if any(k in s for k in ["eau", "electric", "energie", "utility", "electricite", "électricité"]):
-        return 2
-    if any(k in s for k in ["telecom", "télécom"]):
-        return 2
-    if any(k in s for k in ["banque", "bank", "finance", "assur"]):
-        return 1
-    if any(k in s for k in ["industrie", "manufact", "services", "transport", "logist", "agro", "mines"]):
-        return 1
-    return 0
+    return _sector_bonus_text(str(sector))
+
+def sector_bonus_codes(sectors: pd.Series) -> np.ndarray:
+    """Bonus secteur par ligne : calcul une fois par valeur distincte, diffusé via les codes."""
+    codes, uniques = pd.factorize(sectors, use_na_sentinel=True)
+    per_value = np.fromiter((sector_bonus_value(v) for v in uniques), dtype=np.int8, count=len(uniques))
+    # sentinelle -1 (valeurs manquantes) -> bonus 0
+    return np.append(per_value, np.int8(0))[codes]
 
 def apply_sector_overlay(note_base: str, pdv: float, sector: str | None) -> tuple[str, int]:
     max_b = sector_bonus_value(sector)
@@ -81,48 +109,118 @@ def _blend_notes(a: str, b: str) -> str:
     im = max(0, min(im, len(RATING_ORDER) - 1))
     return RATING_ORDER[im]
 
+# ---------- moteur vectorisé (codes entiers = index dans RATING_ORDER) ----------
+RATING_ARR = np.array(RATING_ORDER, dtype=object)
+_LAST = len(RATING_ORDER) - 1
+_Q_ARR = np.array([Q_TARGET[r] for r in RATING_ORDER], dtype=float)
+
+def codes_to_ratings(codes: np.ndarray) -> np.ndarray:
+    return RATING_ARR[codes]
+
+def abs_codes(pdv: np.ndarray, edges: dict) -> np.ndarray:
+    """Équivalent vectorisé de prob_to_abs_rating_dynamic (bornes croissantes, intervalle ]lo, hi])."""
+    e = np.array([edges[r] for r in RATING_ORDER], dtype=float)
+    return np.minimum(np.searchsorted(e, pdv, side="left"), _LAST).astype(np.int8)
+
+def quantile_codes(u: np.ndarray, q_arr: np.ndarray = _Q_ARR) -> np.ndarray:
+    """Première note r telle que u <= Q_TARGET[r], sinon C (NaN compris)."""
+    return np.minimum(np.searchsorted(q_arr, u, side="left"), _LAST).astype(np.int8)
+
+def blend_codes(ia: np.ndarray, ib: np.ndarray) -> np.ndarray:
+    # np.rint arrondit au pair le plus proche, comme round()
+    im = np.rint((ia.astype(np.int16) + ib) / 2)
+    return np.clip(im, 0, _LAST).astype(np.int8)
+
+def overlay_codes(base: np.ndarray, pdv: np.ndarray, max_bonus: np.ndarray,
+                  caps: dict = OVERLAY_CAPS) -> tuple[np.ndarray, np.ndarray]:
+    """Équivalent vectorisé d'apply_sector_overlay : (codes après bonus, bonus accordé)."""
+    max_bonus = np.asarray(max_bonus, dtype=np.int8)
+    allowed = np.where(
+        pdv >= caps["no_bonus_if_pd_ge"], 0,
+        np.where(pdv >= caps["max_bonus_if_pd_ge"],
+                 np.minimum(max_bonus, caps["max_bonus_mid"]), max_bonus),
+    ).astype(np.int8)
+    return np.maximum(base - allowed, 0).astype(np.int8), allowed
+
+def cap_codes(ov: np.ndarray, ab: np.ndarray, caps: dict = OVERLAY_CAPS) -> np.ndarray:
+    """Équivalent vectorisé de cap_vs_absolute."""
+    i_allow = np.maximum(ab - caps["max_up_over_abs"], 0)
+    return np.maximum(ov, i_allow).astype(np.int8)
+
+def reason_strings(ab: np.ndarray, q: np.ndarray, bonus: np.ndarray) -> np.ndarray:
+    """Chaînes 'ABS=.. | Q=.. | B+..' construites une fois par combinaison distincte."""
+    key = (ab.astype(np.int64) * len(RATING_ORDER) + q) * 256 + bonus
+    uniq, inv = np.unique(key, return_inverse=True)
+    labels = np.array([
+        f"ABS={RATING_ORDER[k // 256 // len(RATING_ORDER)]} | "
+        f"Q={RATING_ORDER[k // 256 % len(RATING_ORDER)]} | B+{k % 256}"
+        for k in uniq.tolist()
+    ], dtype=object)
+    return labels[inv]
+
 # ---------- pipeline de notation ----------
 def apply_full_notation(df: pd.DataFrame,
                         col_pd: str,
                         col_year: str,
-                        col_sector: str) -> pd.DataFrame:
-    out = df.copy()
-    out[col_pd] = pd.to_numeric(out[col_pd], errors="coerce").clip(0, 1)
-    out = out.dropna(subset=[col_pd]).copy()
+                        col_sector: str,
+                        target_shares: dict | None = None,
+                        overlay_caps: dict | None = None,
+                        abs_edges: dict | None = None) -> pd.DataFrame:
+    """
+    Notation complète. Paramètres de config.py surchargeables (re-notation, balayages) :
+    `target_shares` (parts cibles), `overlay_caps`, `abs_edges` (seuils absolus fixes à la
+    place des seuils dynamiques tirés des quantiles de PD).
+    """
+    q_arr = _Q_ARR if target_shares is None else q_array(target_shares)
+    pdv = pd.to_numeric(df[col_pd], errors="coerce").clip(0, 1)
+    keep = pdv.notna()
+    # copie superficielle : les colonnes ajoutées ne touchent pas `df`, sans dupliquer ses données
+    out = (df if keep.all() else df.loc[keep]).copy(deep=False)
+    out[col_pd] = pdv[keep]
     if out.empty:
         return out
 
-    # seuils dynamiques globaux
-    dyn_edges = _quantile_edges_from_pd(out[col_pd])
+    # seuils dynamiques globaux (ou fixes)
+    dyn_edges = dict(abs_edges) if abs_edges is not None else _quantile_edges_from_pd(out[col_pd], q_arr)
 
     # quantiles par annee pour prudence
-    out["__u__"] = out.groupby(col_year)[col_pd].rank(pct=True, method="average")
+    u = out.groupby(col_year)[col_pd].rank(pct=True, method="average").to_numpy(dtype=float)
+
+    return rate_with(out, col_pd, col_sector, dyn_edges, u, q_arr, overlay_caps or OVERLAY_CAPS)
 
+def notation_codes(pdv: np.ndarray, u: np.ndarray, max_b: np.ndarray, dyn_edges: dict,
+                   q_arr: np.ndarray = _Q_ARR, caps: dict = OVERLAY_CAPS) -> tuple[np.ndarray, ...]:
+    """Chaîne de notation en codes int8 : (absolue, quantiles, prudente, overlay plafonné, bonus)."""
     # notes intermediaires
-    out["Notation_absolue"] = out[col_pd].apply(lambda x: prob_to_abs_rating_dynamic(x, dyn_edges))
-    out["Notation_quantiles"] = out["__u__"].apply(
-        lambda u: next((r for r in RATING_ORDER if u <= Q_TARGET[r]), "C")
-    )
+    ab = abs_codes(pdv, dyn_edges)
+    q = quantile_codes(u, q_arr)
 
     # blend
-    out["Notation_prudente"] = [
-        _blend_notes(a, b) for a, b in zip(out["Notation_quantiles"], out["Notation_absolue"])
-    ]
+    prud = blend_codes(q, ab)
 
     # overlay + cap
-    notes_ov, bonuses = [], []
-    for nb, pdv, sect, na in zip(out["Notation_prudente"], out[col_pd], out[col_sector], out["Notation_absolue"]):
-        no, b = apply_sector_overlay(nb, pdv, sect)
-        no = cap_vs_absolute(no, na)
-        notes_ov.append(no)
-        bonuses.append(b)
-
-    out["Notation_overlay"] = notes_ov
-    out["Overlay_bonus"] = bonuses
+    ov, bonus = overlay_codes(prud, pdv, max_b, caps)
+    ov = cap_codes(ov, ab, caps)
+    return ab, q, prud, ov, bonus
+
+def rate_with(out: pd.DataFrame, col_pd: str, col_sector: str,
+              dyn_edges: dict, u: np.ndarray,
+              q_arr: np.ndarray = _Q_ARR, caps: dict = OVERLAY_CAPS) -> pd.DataFrame:
+    """
+    Ajoute les colonnes de notation à `out` (PD déjà nettoyées) à partir de seuils
+    absolus et de rangs centiles par année fournis (exacts ou issus d'une esquisse).
+    """
+    pdv = out[col_pd].to_numpy(dtype=float)
+    max_b = sector_bonus_codes(out[col_sector])
+    ab, q, prud, ov, bonus = notation_codes(pdv, u, max_b, dyn_edges, q_arr, caps)
+
+    # chaînes produites une seule fois, en fin de chaîne
+    out["Notation_absolue"] = codes_to_ratings(ab)
+    out["Notation_quantiles"] = codes_to_ratings(q)
+    out["Notation_prudente"] = codes_to_ratings(prud)
+    out["Notation_overlay"] = codes_to_ratings(ov)
+    out["Overlay_bonus"] = bonus.astype(np.int64)
     out["Notation_finale"] = out["Notation_overlay"]
-    out["Reason"] = [
-        f"ABS={na} | Q={nq} | B+{b}"
-        for na, nq, b in zip(out["Notation_absolue"], out["Notation_quantiles"], out["Overlay_bonus"])
-    ]
+    out["Reason"] = reason_strings(ab, q, bonus)
 
-    return out.drop(columns=["__u__"])
+    return out
@@ -0,0 +1,284 @@
+# services/rerating.py — re-notation des PD stockées (paramètres surchargés) et balayages de grilles
+from __future__ import annotations
+import itertools
+from dataclasses import dataclass, field
+import numpy as np
+import pandas as pd
+
+from config import (
+    RATING_ORDER, ABS_EDGES, TARGET_SHARES, OVERLAY_CAPS, RERATE_MAX_SETS, RERATE_BLOCK_CELLS,
+)
+from services.rating import (
+    apply_full_notation, q_array, sector_bonus_codes, blend_codes, overlay_codes, cap_codes,
+)
+from services.schema import compile_schema
+
+# Colonnes produites par la notation (remplacées à la re-notation)
+NOTATION_COLUMNS = ("Notation_absolue", "Notation_quantiles", "Notation_prudente", "Notation_overlay",
+                    "Overlay_bonus", "Notation_finale", "Reason")
+_N = len(RATING_ORDER)
+_LAST = _N - 1
+_INT_CAPS = ("max_bonus_mid", "max_up_over_abs")
+
+
+# ---------- paramètres ----------
+@dataclass(frozen=True)
+class RatingParams:
+    """Jeu de paramètres de notation ; abs_edges None = seuils dynamiques (comportement par défaut)."""
+    target_shares: dict = field(default_factory=lambda: dict(TARGET_SHARES))
+    overlay_caps: dict = field(default_factory=lambda: dict(OVERLAY_CAPS))
+    abs_edges: dict | None = None
+
+    def kwargs(self) -> dict:
+        """Surcharges pour apply_full_notation."""
+        return {"target_shares": self.target_shares, "overlay_caps": self.overlay_caps,
+                "abs_edges": self.abs_edges}
+
+    def as_dict(self) -> dict:
+        return {"target_shares": self.target_shares, "overlay_caps": self.overlay_caps,
+                "abs_edges": self.abs_edges}
+
+
+def _number(value, name: str) -> float:
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or not np.isfinite(value):
+        raise ValueError(f"{name} : nombre attendu, reçu {value!r}")
+    return float(value)
+
+
+def _merge(base: dict, override, name: str) -> dict:
+    if not isinstance(override, dict):
+        raise ValueError(f"{name} : objet attendu")
+    unknown = set(override) - set(base)
+    if unknown:
+        raise ValueError(f"{name} : clés inconnues {sorted(unknown)}")
+    return {**base, **override}
+
+
+def parse_params(spec: dict | None) -> RatingParams:
+    """
+    Surcharges partielles de config.py : {"target_shares": {...}, "overlay_caps": {...},
+    "abs_edges": {...}}. `abs_edges` (même vide) remplace les seuils dynamiques par des
+    seuils fixes (ABS_EDGES complété par les valeurs fournies). ValueError si invalide.
+    """
+    spec = spec or {}
+    if not isinstance(spec, dict):
+        raise ValueError("jeu de paramètres : objet attendu")
+    unknown = set(spec) - {"target_shares", "overlay_caps", "abs_edges"}
+    if unknown:
+        raise ValueError(f"paramètres inconnus : {sorted(unknown)}")
+
+    shares = _merge(TARGET_SHARES, spec.get("target_shares", {}), "target_shares")
+    shares = {r: _number(v, f"target_shares.{r}") for r, v in shares.items()}
+    if any(v < 0 for v in shares.values()) or sum(shares.values()) <= 0:
+        raise ValueError("target_shares : parts positives attendues")
+
+    caps = _merge(OVERLAY_CAPS, spec.get("overlay_caps", {}), "overlay_caps")
+    for k, v in caps.items():
+        v = _number(v, f"overlay_caps.{k}")
+        if k in _INT_CAPS:
+            if v < 0 or v != int(v):
+                raise ValueError(f"overlay_caps.{k} : entier positif attendu")
+            caps[k] = int(v)
+        elif not 0 <= v <= 1:
+            raise ValueError(f"overlay_caps.{k} : PD dans [0, 1] attendue")
+        else:
+            caps[k] = v
+
+    edges = None
+    if spec.get("abs_edges") is not None:
+        edges = _merge(ABS_EDGES, spec["abs_edges"], "abs_edges")
+        edges = {r: _number(edges[r], f"abs_edges.{r}") for r in RATING_ORDER}
+        if np.any(np.diff(list(edges.values())) < 0):
+            raise ValueError("abs_edges : seuils croissants attendus (AAA -> C)")
+    return RatingParams(shares, caps, edges)
+
+
+def expand_grid(body: dict) -> list[RatingParams]:
+    """
+    Jeux à évaluer : {"sets": [spec, ...]} et/ou {"grid": {"overlay_caps.max_up_over_abs": [1, 2, 3],
+    "target_shares.AAA": [5, 7]}, "base": spec} (produit cartésien appliqué à `base`).
+    """
+    if not isinstance(body, dict):
+        raise ValueError("corps JSON : objet attendu")
+    specs = list(body.get("sets") or [])
+    grid = body.get("grid") or {}
+    if not isinstance(grid, dict):
+        raise ValueError("grid : objet attendu")
+    if grid:
+        keys = list(grid)
+        for k in keys:
+            if k.count(".") != 1 or not isinstance(grid[k], list) or not grid[k]:
+                raise ValueError(f"grid.{k} : 'groupe.clé' et liste de valeurs attendus")
+        n = int(np.prod([len(grid[k]) for k in keys]))
+        if n + len(specs) > RERATE_MAX_SETS:
+            raise ValueError(f"au plus {RERATE_MAX_SETS} jeux de paramètres par balayage")
+        base = body.get("base") or {}
+        for values in itertools.product(*(grid[k] for k in keys)):
+            spec = {g: dict(v) if isinstance(v, dict) else v for g, v in base.items()}
+            for k, v in zip(keys, values):
+                group, name = k.split(".")
+                spec.setdefault(group, {})[name] = v
+            specs.append(spec)
+    if not specs:
+        raise ValueError("aucun jeu de paramètres (sets ou grid)")
+    if len(specs) > RERATE_MAX_SETS:
+        raise ValueError(f"au plus {RERATE_MAX_SETS} jeux de paramètres par balayage")
+    return [parse_params(s) for s in specs]
+
+
+# ---------- entrées d'un résultat stocké ----------
+def rating_columns(columns) -> tuple[str | None, str | None]:
+    """Colonnes année / secteur d'un résultat (y compris les colonnes de repli du pipeline)."""
+    schema = compile_schema(columns)
+    year = schema.year_col or ("__ANNEE__" if "__ANNEE__" in columns else None)
+    sector = schema.sector_col or ("__SECTEUR__" if "__SECTEUR__" in columns else None)
+    return year, sector
+
+
+def _with_rating_columns(df: pd.DataFrame) -> tuple[pd.DataFrame, str, str]:
+    col_year, col_sector = rating_columns(df.columns)
+    if col_year is None or col_sector is None:
+        df = df.copy(deep=False)
+        if col_year is None:
+            col_year = "__ANNEE__"
+            df[col_year] = ""
+        if col_sector is None:
+            col_sector = "__SECTEUR__"
+            df[col_sector] = "Inconnu"
+    return df, col_year, col_sector
+
+
+def rating_codes(s: pd.Series) -> np.ndarray:
+    """Rang de la note dans RATING_ORDER (AAA = 0), -1 si absente ou inconnue."""
+    return pd.Categorical(s, categories=RATING_ORDER).codes.astype(np.int8)
+
+
+@dataclass
+class RatingInputs:
+    """
+    Ce dont dépend la notation, calculé une fois par résultat : PD, rang centile par année,
+    bonus secteur maximal, note stockée ; les deux tris servent à tous les jeux d'un balayage.
+    """
+    pdv: np.ndarray
+    u: np.ndarray
+    max_bonus: np.ndarray
+    baseline: np.ndarray     # codes de la note stockée (-1 : absente)
+    pd_order: np.ndarray
+    u_order: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.pdv)
+
+
+def rating_inputs(df: pd.DataFrame) -> RatingInputs:
+    """À partir des colonnes Proba_defaillance, année, secteur et Notation_finale d'un résultat."""
+    df, col_year, col_sector = _with_rating_columns(df)
+    pdv = pd.to_numeric(df["Proba_defaillance"], errors="coerce").astype(float).clip(0, 1)
+    keep = pdv.notna().to_numpy()
+    if not keep.all():
+        df, pdv = df.loc[keep], pdv[keep]
+    # mêmes rangs que apply_full_notation
+    u = pdv.groupby(df[col_year], observed=True).rank(pct=True, method="average").to_numpy(dtype=float)
+    pdv = pdv.to_numpy()
+    baseline = (rating_codes(df["Notation_finale"]) if "Notation_finale" in df.columns
+                else np.full(len(pdv), -1, dtype=np.int8))
+    return RatingInputs(pdv, u, sector_bonus_codes(df[col_sector]), baseline,
+                        np.argsort(pdv, kind="stable"), np.argsort(u, kind="stable"))
+
+
+# ---------- re-notation ----------
+def rerate(df: pd.DataFrame, params: RatingParams) -> pd.DataFrame:
+    """Rejoue apply_full_notation sur un résultat stocké (PD déjà calculées), colonnes dans le même ordre."""
+    base = df.drop(columns=[c for c in NOTATION_COLUMNS if c in df.columns])
+    base["Proba_defaillance"] = base["Proba_defaillance"].astype(float)
+    base, col_year, col_sector = _with_rating_columns(base)
+    out = apply_full_notation(base, "Proba_defaillance", col_year, col_sector, **params.kwargs())
+    return out[[c for c in df.columns if c in out.columns] + [c for c in out.columns if c not in df.columns]]
+
+
+def distribution(codes: np.ndarray) -> dict:
+    """Effectif par note (codes -1 ignorés)."""
+    counts = np.bincount(codes[codes >= 0], minlength=_N)
+    return {r: int(c) for r, c in zip(RATING_ORDER, counts)}
+
+
+def rerate_summary(before: pd.DataFrame, after: pd.DataFrame) -> dict:
+    """summarize de rerate(before) : note stockée des lignes re-notées (PD connue) vs nouvelle note."""
+    stored = (before["Notation_finale"][before["Proba_defaillance"].notna().to_numpy()]
+              if "Notation_finale" in before.columns else pd.Series(None, index=after.index, dtype=object))
+    return summarize(rating_codes(stored), rating_codes(after["Notation_finale"]))
+
+
+def summarize(baseline: np.ndarray, codes: np.ndarray) -> dict:
+    """Distribution des nouvelles notes et matrice de migration (lignes : note stockée, colonnes : nouvelle)."""
+    return _summaries(baseline, codes[None, :])[0]
+
+
+def _summaries(baseline: np.ndarray, codes: np.ndarray) -> list[dict]:
+    n_sets = codes.shape[0]
+    offset = np.arange(n_sets, dtype=np.int64)[:, None]
+    dist = np.bincount((offset * _N + codes).ravel(), minlength=n_sets * _N).reshape(n_sets, _N)
+    known = baseline >= 0
+    flat = (offset * _N + baseline[known]) * _N + codes[:, known]
+    mig = np.bincount(flat.ravel(), minlength=n_sets * _N * _N).reshape(n_sets, _N, _N)
+    total = max(1, codes.shape[1])
+    out = []
+    for d, m in zip(dist, mig):
+        out.append({
+            "distribution": {r: int(c) for r, c in zip(RATING_ORDER, d)},
+            "shares": {r: round(100.0 * int(c) / total, 2) for r, c in zip(RATING_ORDER, d)},
+            "migration": m.tolist(),
+            "changed": int(m.sum() - np.trace(m)),
+            "upgrades": int(np.tril(m, -1).sum()),     # vers une meilleure note (indice plus petit)
+            "downgrades": int(np.triu(m, 1).sum()),
+        })
+    return out
+
+
+# ---------- balayage vectorisé ----------
+def _counts_below(values: np.ndarray, order: np.ndarray, thresholds: np.ndarray) -> np.ndarray:
+    """
+    codes[s, i] = min(#{k : thresholds[s, k] < values[i]}, C), soit searchsorted(thresholds[s],
+    values, "left") pour chaque jeu : un repère par seuil sur les valeurs triées, puis cumul.
+    """
+    n_sets, n = thresholds.shape[0], len(values)
+    pos = np.searchsorted(values[order], thresholds, side="right")       # (jeux, seuils)
+    flat = (np.arange(n_sets, dtype=np.int64)[:, None] * (n + 1) + pos).ravel()
+    marks = np.bincount(flat, minlength=n_sets * (n + 1)).reshape(n_sets, n + 1)[:, :n]
+    codes = np.empty((n_sets, n), dtype=np.int8)
+    codes[:, order] = np.minimum(np.cumsum(marks, axis=1), _LAST)
+    return codes
+
+
+def sweep(inputs: RatingInputs, params: list[RatingParams]) -> list[dict]:
+    """
+    Notes finales de chaque jeu de paramètres en un passage vectorisé (tableaux jeux x lignes,
+    par blocs de RERATE_BLOCK_CELLS cellules) : résultats identiques à rerate jeu par jeu.
+    """
+    n = len(inputs)
+    if n == 0:
+        return [{"params": p.as_dict(), **_summaries(inputs.baseline, np.zeros((1, 0), np.int8))[0]}
+                for p in params]
+    q = np.array([q_array(p.target_shares) for p in params])                  # (jeux, notes)
+    # seuils dynamiques : un seul appel quantile (même fonction que _quantile_edges_from_pd)
+    edges = pd.Series(inputs.pdv).quantile(q.ravel()).to_numpy().reshape(q.shape)
+    edges[:, _LAST] = 1.0
+    for i, p in enumerate(params):
+        if p.abs_edges is not None:
+            edges[i] = [p.abs_edges[r] for r in RATING_ORDER]
+            edges[i, _LAST] = 1.0
+    caps = {k: np.array([p.overlay_caps[k] for p in params])[:, None] for k in OVERLAY_CAPS}
+
+    block = max(1, RERATE_BLOCK_CELLS // n)
+    out = []
+    for start in range(0, len(params), block):
+        sl = slice(start, start + block)
+        ab = _counts_below(inputs.pdv, inputs.pd_order, edges[sl])
+        qc = _counts_below(inputs.u, inputs.u_order, q[sl])
+        prud = blend_codes(qc, ab)
+        block_caps = {k: v[sl] for k, v in caps.items()}
+        ov, _ = overlay_codes(prud, inputs.pdv, inputs.max_bonus, block_caps)
+        final = cap_codes(ov, ab, block_caps)
+        for p, summary in zip(params[sl], _summaries(inputs.baseline, final)):
+            out.append({"params": p.as_dict(), **summary})
+    return out
@@ -0,0 +1,290 @@
+# services/result_store.py — stockage borné des résultats notés (mémoire LRU/TTL + débordement Parquet)
+from __future__ import annotations
+import os, time, threading, uuid
+from collections import OrderedDict
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from config import (
+    RESULT_STORE, RESULT_STORE_DIR, RESULT_STORE_MAX_ITEMS,
+    RESULT_STORE_TTL_S, RESULT_STORE_MAX_MB, RESULT_STORE_DISK_MAX_MB, RESULT_STORE_SWEEP_S,
+)
+
+
+def _frame_bytes(df: pd.DataFrame) -> int:
+    return int(df.memory_usage(index=True, deep=True).sum())
+
+
+def memory_report(df: pd.DataFrame) -> dict:
+    """Empreinte mémoire d'un résultat, totale et par colonne (dtype, octets)."""
+    usage = df.memory_usage(index=True, deep=True)
+    return {
+        "rows": int(len(df)),
+        "bytes": int(usage.sum()),
+        "index_bytes": int(usage["Index"]),
+        "columns": {str(c): {"dtype": str(df[c].dtype), "bytes": int(usage[c])} for c in df.columns},
+    }
+
+
+def _project(df: pd.DataFrame, columns: list[str] | None) -> pd.DataFrame:
+    if columns is None:
+        return df
+    return df[[c for c in columns if c in df.columns]]
+
+
+class MemoryResultStore:
+    """
+    Résultats en mémoire du processus, politique LRU + TTL + budget mémoire.
+    Interface commune : put / get / head / __contains__ / discard.
+    """
+
+    def __init__(self, max_items: int = RESULT_STORE_MAX_ITEMS,
+                 ttl_s: float = RESULT_STORE_TTL_S,
+                 max_bytes: int = RESULT_STORE_MAX_MB * 1024 * 1024):
+        self.max_items = max_items
+        self.ttl_s = ttl_s
+        self.max_bytes = max_bytes
+        self._items: OrderedDict[str, tuple[pd.DataFrame, int, float]] = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    # -- mémoire --
+    def _evict(self, ticket: str) -> pd.DataFrame:
+        df, nbytes, _ = self._items.pop(ticket)
+        self._bytes -= nbytes
+        return df
+
+    def _enforce(self) -> None:
+        now = time.time()
+        for t in [t for t, (_, _, ts) in self._items.items() if now - ts > self.ttl_s]:
+            self._on_evict(t, self._evict(t), expired=True)
+        # on garde toujours au moins le plus récent, même s'il dépasse le budget
+        while len(self._items) > 1 and (len(self._items) > self.max_items or self._bytes > self.max_bytes):
+            t = next(iter(self._items))
+            self._on_evict(t, self._evict(t), expired=False)
+
+    def _on_evict(self, ticket: str, df: pd.DataFrame, expired: bool) -> None:
+        pass
+
+    def _mem_get(self, ticket: str) -> pd.DataFrame | None:
+        with self._lock:
+            item = self._items.get(ticket)
+            if item is None:
+                return None
+            df, nbytes, ts = item
+            if time.time() - ts > self.ttl_s:
+                self._evict(ticket)
+                return None
+            self._items[ticket] = (df, nbytes, time.time())
+            self._items.move_to_end(ticket)
+            return df
+
+    def _mem_put(self, ticket: str, df: pd.DataFrame) -> None:
+        with self._lock:
+            if ticket in self._items:
+                self._evict(ticket)
+            nbytes = _frame_bytes(df)
+            self._items[ticket] = (df, nbytes, time.time())
+            self._bytes += nbytes
+            self._enforce()
+
+    # -- interface --
+    def put(self, df: pd.DataFrame, ticket: str | None = None) -> str:
+        ticket = ticket or str(uuid.uuid4())
+        self._mem_put(ticket, df)
+        return ticket
+
+    def get(self, ticket: str, columns: list[str] | None = None) -> pd.DataFrame | None:
+        df = self._mem_get(ticket)
+        return None if df is None else _project(df, columns)
+
+    def head(self, ticket: str) -> pd.DataFrame | None:
+        """Cadre vide portant les colonnes et dtypes du résultat (détection de colonnes)."""
+        df = self._mem_get(ticket)
+        return None if df is None else df.iloc[:0]
+
+    def __contains__(self, ticket: str) -> bool:
+        return self.head(ticket) is not None
+
+    def discard(self, ticket: str) -> None:
+        with self._lock:
+            if ticket in self._items:
+                self._evict(ticket)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"items": len(self._items), "bytes": self._bytes}
+
+    def memory_report(self, ticket: str) -> dict | None:
+        df = self.get(ticket)
+        return None if df is None else {"ticket": ticket, **memory_report(df)}
+
+
+class SpillingResultStore(MemoryResultStore):
+    """
+    Variante partagée entre workers d'un même hôte : chaque résultat est écrit en
+    Parquet dans RESULT_STORE_DIR (écriture atomique). La mémoire n'est qu'un cache
+    chaud ; un worker qui ne connaît pas le ticket le relit depuis le disque en
+    ne lisant que les colonnes demandées (lecture memory-mappée).
+    Le répertoire est borné : put() relance sweep() toutes les `sweep_interval_s` secondes,
+    ou dès que les fichiers écrits depuis dépassent `max_disk_bytes`.
+    """
+
+    def __init__(self, directory: str = RESULT_STORE_DIR,
+                 max_disk_bytes: int = RESULT_STORE_DISK_MAX_MB * 1024 * 1024,
+                 sweep_interval_s: float = RESULT_STORE_SWEEP_S, **kw):
+        super().__init__(**kw)
+        self.directory = directory
+        self.max_disk_bytes = max_disk_bytes
+        self.sweep_interval_s = sweep_interval_s
+        self._disk_bytes = 0          # taille du répertoire au dernier balayage + écritures de ce worker
+        self._next_sweep = 0.0
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, ticket: str) -> str:
+        # le ticket vient de l'URL : on refuse tout ce qui n'est pas un uuid
+        return os.path.join(self.directory, f"{uuid.UUID(ticket)}.parquet")
+
+    def _write(self, ticket: str, df: pd.DataFrame) -> None:
+        path = self._path(ticket)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        try:
+            table = pa.Table.from_pandas(df)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            # colonnes texte hétérogènes (nombres + libellés) : stockées en texte
+            fixed = df.copy()
+            for c in fixed.select_dtypes(include=["object"]).columns:
+                fixed[c] = fixed[c].map(lambda v: v if v is None or isinstance(v, (str, float)) else str(v))
+            table = pa.Table.from_pandas(fixed)
+        pq.write_table(table, tmp)
+        os.replace(tmp, path)
+
+    def _live_path(self, ticket: str) -> str | None:
+        """Fichier du ticket s'il existe et n'a pas expiré (supprimé sinon) ; date d'accès rafraîchie."""
+        try:
+            path = self._path(ticket)
+            expired = time.time() - os.path.getmtime(path) > self.ttl_s
+        except (OSError, ValueError):
+            return None
+        if expired:
+            self._remove(ticket)
+            return None
+        return path if self._touch(path) else None
+
+    def _read(self, ticket: str, columns: list[str] | None) -> pd.DataFrame | None:
+        path = self._live_path(ticket)
+        if path is None:
+            return None
+        if columns is not None:
+            names = set(pq.read_schema(path).names)
+            columns = [c for c in columns if c in names]
+        return pq.read_table(path, columns=columns, memory_map=True).to_pandas()
+
+    @staticmethod
+    def _touch(path: str) -> bool:
+        """
+        Rafraîchit la date du fichier à chaque accès : le TTL disque compte, comme en mémoire,
+        depuis le dernier accès (sweep d'un autre worker ne supprime pas un ticket actif).
+        """
+        try:
+            os.utime(path)
+            return True
+        except OSError:
+            return False
+
+    def _remove(self, ticket: str) -> None:
+        try:
+            os.remove(self._path(ticket))
+        except (OSError, ValueError):
+            pass
+
+    def _on_evict(self, ticket: str, df: pd.DataFrame, expired: bool) -> None:
+        if expired:
+            self._remove(ticket)
+
+    def _mem_get(self, ticket: str) -> pd.DataFrame | None:
+        df = super()._mem_get(ticket)
+        if df is not None and not self._touch(self._path(ticket)):
+            # supprimé par un autre worker (discard / sweep)
+            super().discard(ticket)
+            return None
+        return df
+
+    def put(self, df: pd.DataFrame, ticket: str | None = None) -> str:
+        ticket = ticket or str(uuid.uuid4())
+        self._write(ticket, df)
+        self._mem_put(ticket, df)
+        with self._lock:
+            try:
+                self._disk_bytes += os.path.getsize(self._path(ticket))
+            except OSError:
+                pass
+            due = time.monotonic() >= self._next_sweep or self._disk_bytes > self.max_disk_bytes
+        if due:
+            self.sweep(keep=ticket)
+        return ticket
+
+    def get(self, ticket: str, columns: list[str] | None = None) -> pd.DataFrame | None:
+        df = self._mem_get(ticket)
+        if df is not None:
+            return _project(df, columns)
+        if columns is not None:
+            # lecture partielle : on ne réchauffe pas le cache avec une projection
+            return self._read(ticket, columns)
+        df = self._read(ticket, None)
+        if df is not None:
+            self._mem_put(ticket, df)
+        return df
+
+    def head(self, ticket: str) -> pd.DataFrame | None:
+        df = self._mem_get(ticket)
+        if df is not None:
+            return df.iloc[:0]
+        path = self._live_path(ticket)
+        if path is None:
+            return None
+        return pq.read_schema(path).empty_table().to_pandas()
+
+    def discard(self, ticket: str) -> None:
+        super().discard(ticket)
+        self._remove(ticket)
+
+    def sweep(self, keep: str | None = None) -> int:
+        """
+        Supprime les fichiers expirés (tous workers confondus), puis les moins récemment
+        consultés tant que le répertoire dépasse `max_disk_bytes` (`keep` est épargné).
+        """
+        now, files = time.time(), []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".parquet"):
+                try:
+                    st = entry.stat()
+                except OSError:
+                    continue
+                files.append((st.st_mtime, st.st_size, entry.path, entry.name))
+        files.sort()
+        total = sum(size for _, size, _, _ in files)
+        n = 0
+        for mtime, size, path, name in files:
+            expired = now - mtime > self.ttl_s
+            if not expired and (total <= self.max_disk_bytes or name == f"{keep}.parquet"):
+                continue
+            try:
+                os.remove(path)
+                n += 1
+                total -= size
+            except OSError:
+                pass
+        with self._lock:
+            self._disk_bytes = total
+            self._next_sweep = time.monotonic() + self.sweep_interval_s
+        return n
+
+
+def make_result_store(kind: str = RESULT_STORE) -> MemoryResultStore:
+    if kind == "memory":
+        return MemoryResultStore()
+    if kind == "disk":
+        return SpillingResultStore()
+    raise ValueError(f"RESULT_STORE inconnu : {kind!r} (attendu : memory | disk)")
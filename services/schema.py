@@ -0,0 +1,183 @@
+# services/schema.py — schéma compilé d'un upload : résolution des colonnes une fois par en-tête
+from __future__ import annotations
+import json, os, threading, unicodedata
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Iterable
+import pandas as pd
+
+from services.model_registry import MODEL_DIR
+
+FEATURE_LIST_PATH = os.path.join(MODEL_DIR, "feature_list.json")
+
+# Colonnes canoniques -> alias acceptés (comparés après normalisation, cf. norm_key)
+ALIASES = {
+    "entreprise": ["NOM DE L'ENTREPRISE", "Entreprise", "NOM ENTREPRISE", "NOM"],
+    "secteur": ["SECTEUR D'ACTIVITE", "SECTEUR"],
+    "annee": ["ANNEE", "Année"],
+    "pays": ["PAYS"],
+    "identifiant": ["IDENTIFIANT"],
+    "bénéfice net": ["Bénéfice net"],
+    "ebe": ["EBE"],
+    "capitaux propres": ["capitaux propres"],
+    "fonds de roulement": ["Fonds de roulement"],
+    "total dettes": ["total dettes"],
+    "rendement des capitaux propres (roe)": ["Rendement des capitaux propres (ROE)", "ROE"],
+    "levier financier": ["Levier financier"],
+    "proba_defaillance": ["Proba_defaillance"],
+}
+
+# Colonnes d'identification (exclues des features du modèle) : nom en minuscules, sans autre normalisation
+ID_KEYS = {"nom de l'entreprise", "secteur d'activite", "secteur", "identifiant", "annee", "pays"}
+
+# Montants / ratios connus (dont la PD de brvm_template.xlsx) : conversion tentée sans sondage préalable
+NUMERIC_CANONICAL = {
+    "bénéfice net", "ebe", "capitaux propres", "fonds de roulement", "total dettes",
+    "rendement des capitaux propres (roe)", "levier financier", "proba_defaillance",
+}
+
+# Mise en page de brvm_template.xlsx (PD déjà fournie)
+TEMPLATE_COLUMNS = ("Entreprise", "Secteur", "Proba_defaillance")
+
+# Types (pd.api.types.infer_dtype) acceptés par l'accesseur .str ; graphies que float() lit comme NaN
+_STR_KINDS = {"string", "empty", "mixed", "mixed-integer"}
+_NAN_TEXT = {"nan", "+nan", "-nan"}
+
+
+def norm_key(name) -> str:
+    """Clé de comparaison des en-têtes : sans accents, minuscules, espaces compactés."""
+    s = unicodedata.normalize("NFKD", str(name))
+    s = "".join(ch for ch in s if not unicodedata.combining(ch))
+    return " ".join(s.lower().split())
+
+
+_ALIAS_TO_CANON = {norm_key(a): canon for canon, names in ALIASES.items() for a in [canon, *names]}
+
+
+# ---------- feature_list.json (relu seulement s'il change) ----------
+_features_lock = threading.Lock()
+_features_cache: tuple = (None, None)  # (signature fichier, liste)
+
+
+def load_feature_list(path: str = FEATURE_LIST_PATH) -> tuple[str, ...] | None:
+    global _features_cache
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    sig = (path, st.st_mtime_ns, st.st_size)
+    with _features_lock:
+        if _features_cache[0] != sig:
+            with open(path, "r", encoding="utf-8") as f:
+                _features_cache = (sig, tuple(json.load(f)))
+        return _features_cache[1]
+
+
+@dataclass(frozen=True)
+class UploadSchema:
+    """
+    Rôle de chaque colonne d'un en-tête, résolu une seule fois :
+      - `lookup` : clé canonique (ou clé normalisée) -> nom de colonne d'origine
+      - `id_cols` : identifiants retirés des features (nom exact en minuscules, comme avant)
+      - `numeric` : montants / ratios connus, convertis sans sondage préalable (même règle sinon)
+    Les features du modèle sont rapprochées par nom exact (feature_sources) : les entrées
+    du modèle ne dépendent pas de la normalisation des en-têtes.
+    """
+    columns: tuple[str, ...]
+    lookup: dict
+    id_cols: tuple[str, ...]
+    numeric: frozenset
+    company_col: str | None
+    sector_col: str | None
+    year_col: str | None
+
+    def col(self, name: str) -> str | None:
+        key = norm_key(name)
+        return self.lookup.get(_ALIAS_TO_CANON.get(key, key))
+
+    def feature_sources(self, features: Iterable[str]) -> list[str | None]:
+        """Colonne d'origine de chaque feature du modèle : même nom exact, None si absente (=> 0)."""
+        present = set(self.columns)
+        return [f if f in present else None for f in features]
+
+
+@lru_cache(maxsize=256)
+def _compile(columns: tuple[str, ...]) -> UploadSchema:
+    lookup: dict[str, str] = {}
+    for c in columns:
+        key = norm_key(c)
+        lookup.setdefault(_ALIAS_TO_CANON.get(key, key), c)   # première occurrence gagnante
+
+    return UploadSchema(
+        columns=columns,
+        lookup=lookup,
+        id_cols=tuple(c for c in columns if c.lower() in ID_KEYS),
+        numeric=frozenset(c for c in columns if _ALIAS_TO_CANON.get(norm_key(c)) in NUMERIC_CANONICAL),
+        company_col=lookup.get("entreprise"),
+        sector_col=lookup.get("secteur"),
+        year_col=lookup.get("annee"),
+    )
+
+
+def compile_schema(columns: Iterable) -> UploadSchema:
+    """Schéma de l'en-tête `columns` (mis en cache par signature d'en-tête)."""
+    return _compile(tuple(str(c) for c in columns))
+
+
+def _first_text(s: pd.Series):
+    for v in s.to_numpy():
+        if isinstance(v, str):
+            return v
+    return None
+
+
+def _to_float(s: pd.Series, probe: bool) -> pd.Series | None:
+    """
+    Colonne objet -> float64 si toutes ses valeurs se convertissent (virgule décimale), sinon None.
+    Même résultat que l'ancienne boucle `s.str.replace(",", ".").astype(float)` : les valeurs
+    non textuelles d'une colonne mixte deviennent NaN, une cellule illisible laisse la colonne en texte.
+    """
+    kind = pd.api.types.infer_dtype(s, skipna=True)
+    if kind not in _STR_KINDS:          # pas d'accesseur .str (nombres seuls, octets...) : colonne inchangée
+        return None
+    if probe:
+        # sondage O(1) : un libellé (entreprise, secteur...) échoue dès sa première valeur
+        first = _first_text(s)
+        try:
+            if first is not None:
+                float(first.replace(",", "."))
+        except ValueError:
+            return None
+    txt = s.str.replace(",", ".", regex=False)
+    num = pd.to_numeric(txt, errors="coerce")
+    lost = txt[num.isna() & txt.notna()]
+    lost = lost[~lost.str.strip().str.lower().isin(_NAN_TEXT)]
+    if len(lost):
+        try:
+            float(lost.iloc[0])         # to_numeric refuse quelques graphies lues par float() ("1_000", "1e500")
+        except ValueError:
+            return None
+    # valeurs relues par float() : to_numeric n'arrondit pas toujours au plus près (1 à 2 ulp sur
+    # 15-17 chiffres significatifs), les entrées du modèle restent identiques à l'historique
+    try:
+        return txt.astype(float)
+    except (TypeError, ValueError):
+        return None
+
+
+def coerce_numeric(df: pd.DataFrame, schema: UploadSchema | None = None) -> pd.DataFrame:
+    """
+    Conversion en place des colonnes objet à virgule décimale, colonne par colonne et
+    seulement si toutes ses valeurs se convertissent (règle historique de basic_clean :
+    une cellule illisible laisse la colonne en texte). Le texte est normalisé une fois et
+    validé par pd.to_numeric ; les montants connus du schéma ne sont pas sondés.
+    """
+    schema = schema or compile_schema(df.columns)
+    for c in df.columns[(df.dtypes == object).to_numpy()]:
+        v = _to_float(df[c], probe=c not in schema.numeric)
+        if v is not None:
+            df[c] = v
+    return df
+
+
+compile_schema(TEMPLATE_COLUMNS)  # mise en page du modèle Excel : déjà compilée
@@ -0,0 +1,227 @@
+# services/scoring_cache.py — caches adressés par contenu : uploads déjà notés, PD des lignes déjà vues
+from __future__ import annotations
+import os, json, time, hashlib, threading, uuid
+from typing import Callable
+import numpy as np
+
+from config import (
+    ABS_EDGES, TARGET_SHARES, OVERLAY_CAPS, RESULT_STORE_DIR, RESULT_STORE_TTL_S,
+    UPLOAD_CACHE_MAX_ITEMS, ROW_CACHE_MAX_ROWS,
+)
+
+UPLOADS_DIR = os.path.join(RESULT_STORE_DIR, "uploads")
+
+
+def config_version() -> str:
+    """Empreinte des paramètres de notation : la changer invalide les uploads déjà notés."""
+    from services.rating import SECTOR_KEYWORDS
+
+    payload = json.dumps([ABS_EDGES, TARGET_SHARES, OVERLAY_CAPS, SECTOR_KEYWORDS],
+                         sort_keys=True, ensure_ascii=False, default=list)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:12]
+
+
+def scoring_version() -> str:
+    """Version modèle (hash des artefacts, ou 'regles') + version de la configuration."""
+    from services.model_registry import REGISTRY, NoModelAvailable
+
+    try:
+        model = REGISTRY.get().version
+    except NoModelAvailable:
+        model = "regles"
+    return f"{model}-{config_version()}"
+
+
+def hash_stream(stream, block: int = 1 << 20) -> str:
+    """sha256 d'un flux binaire relu depuis le début puis rembobiné (upload werkzeug)."""
+    h = hashlib.sha256()
+    stream.seek(0)
+    for chunk in iter(lambda: stream.read(block), b""):
+        h.update(chunk)
+    stream.seek(0)
+    return h.hexdigest()
+
+
+class UploadCache:
+    """
+    Upload déjà noté -> ticket existant. Clé = sha256 des octets + extension + version
+    de notation ; un petit fichier par clé dans RESULT_STORE_DIR (partagé entre workers),
+    au plus `max_items` (les plus anciens partent en premier).
+    """
+
+    def __init__(self, directory: str = UPLOADS_DIR, max_items: int = UPLOAD_CACHE_MAX_ITEMS,
+                 ttl_s: float = RESULT_STORE_TTL_S):
+        self.directory = directory
+        self.max_items = max_items
+        self.ttl_s = ttl_s
+        self._lock = threading.Lock()   # compteurs mis à jour par les threads du worker
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key(content_hash: str, filename: str, version: str) -> str:
+        ext = os.path.splitext(filename.lower())[1]
+        return hashlib.sha256(f"{content_hash}|{ext}|{version}".encode()).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.ticket")
+
+    def get(self, key: str, exists: Callable[[str], bool]) -> str | None:
+        """Ticket associé si le résultat existe encore (`exists(ticket)`), sinon None."""
+        try:
+            with open(self._path(key), "r", encoding="utf-8") as f:
+                ticket = f.read().strip()
+        except OSError:
+            ticket = None
+        hit = bool(ticket) and exists(ticket)
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return ticket if hit else None
+
+    def put(self, key: str, ticket: str) -> None:
+        path = self._path(key)
+        tmp = f"{path}.{os.getpid()}.{uuid.uuid4().hex[:8]}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(ticket)
+        os.replace(tmp, path)
+        self._trim()
+
+    def _entries(self) -> list[tuple[float, str]]:
+        out = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".ticket"):
+                try:
+                    out.append((os.path.getmtime(os.path.join(self.directory, name)), name))
+                except OSError:
+                    pass
+        return sorted(out)
+
+    def _trim(self) -> None:
+        entries = self._entries()
+        for _, name in entries[:max(0, len(entries) - self.max_items)]:
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                pass
+
+    def sweep(self) -> int:
+        n, now = 0, time.time()
+        for mtime, name in self._entries():
+            if now - mtime > self.ttl_s:
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                    n += 1
+                except OSError:
+                    pass
+        return n
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {"hits": self.hits, "misses": self.misses,
+                    "hit_rate": round(self.hits / total, 4) if total else None}
+
+
+# ---------- PD par ligne ----------
+_P1 = np.uint64(0x9E3779B97F4A7C15)
+_P2 = np.uint64(0xC2B2AE3D27D4EB4F)
+
+
+def row_hashes(X: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Deux empreintes 64 bits indépendantes par ligne (vecteur de features normalisé)."""
+    X = np.where(np.isnan(X), np.nan, X) + 0.0     # NaN canonique, -0.0 -> 0.0
+    words = np.ascontiguousarray(X, dtype=np.float64).view(np.uint64)
+    h1 = np.full(len(X), 0x243F6A8885A308D3, dtype=np.uint64)
+    h2 = np.full(len(X), 0x13198A2E03707344, dtype=np.uint64)
+    for j in range(words.shape[1]):
+        w = words[:, j]
+        h1 = (h1 ^ w) * _P1
+        h1 ^= h1 >> np.uint64(31)
+        h2 = (h2 + w) * _P2
+        h2 ^= h2 >> np.uint64(29)
+    return h1, h2
+
+
+class RowPDCache:
+    """
+    PD déjà calculées, par empreinte du vecteur de features (pour une version de modèle
+    et un jeu de colonnes) : seules les lignes jamais vues partent au modèle.
+    Tableaux triés + searchsorted (recherche vectorisée) ; au-delà de `max_rows`,
+    les lignes les moins récemment servies sont évincées.
+    """
+
+    def __init__(self, max_rows: int = ROW_CACHE_MAX_ROWS):
+        self.max_rows = max_rows
+        self._lock = threading.Lock()
+        self._reset(None)
+        self.hits = 0
+        self.misses = 0
+
+    def _reset(self, version: str | None) -> None:
+        self._version = version
+        self._keys = np.empty(0, dtype=np.uint64)     # h1, trié
+        self._check = np.empty(0, dtype=np.uint64)    # h2 (vérification)
+        self._values = np.empty(0, dtype=np.float64)
+        self._stamp = np.empty(0, dtype=np.int64)
+        self._clock = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_rows > 0
+
+    def _lookup(self, h1: np.ndarray, h2: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        pos = np.searchsorted(self._keys, h1)
+        pos_c = np.minimum(pos, max(len(self._keys) - 1, 0))
+        hit = np.zeros(len(h1), dtype=bool)
+        if len(self._keys):
+            hit = (self._keys[pos_c] == h1) & (self._check[pos_c] == h2)
+        self._clock += 1
+        self._stamp[pos_c[hit]] = self._clock
+        return np.where(hit, self._values[pos_c] if len(self._keys) else np.nan, np.nan), hit
+
+    def _store(self, h1: np.ndarray, h2: np.ndarray, values: np.ndarray) -> None:
+        h1, first = np.unique(h1, return_index=True)
+        keys = np.concatenate([self._keys, h1])
+        order = np.argsort(keys, kind="stable")
+        self._keys = keys[order]
+        self._check = np.concatenate([self._check, h2[first]])[order]
+        self._values = np.concatenate([self._values, values[first]])[order]
+        self._stamp = np.concatenate([self._stamp, np.full(len(h1), self._clock)])[order]
+        if len(self._keys) > self.max_rows:
+            keep = np.sort(np.argpartition(-self._stamp, self.max_rows - 1)[:self.max_rows])
+            self._keys, self._check = self._keys[keep], self._check[keep]
+            self._values, self._stamp = self._values[keep], self._stamp[keep]
+
+    def predict(self, X: np.ndarray, version: str, fn: Callable[[np.ndarray], np.ndarray]) -> np.ndarray:
+        """PD de chaque ligne de X ; `fn(positions)` ne reçoit que les lignes absentes du cache."""
+        h1, h2 = row_hashes(X)
+        with self._lock:
+            if version != self._version:
+                self._reset(version)
+            out, hit = self._lookup(h1, h2)
+        miss = np.flatnonzero(~hit)
+        if len(miss):
+            out[miss] = fn(miss)
+            with self._lock:
+                if version == self._version:
+                    # lignes déjà présentes (autre requête entre-temps) : pas de doublon
+                    fresh = ~self._lookup(h1[miss], h2[miss])[1]
+                    self._store(h1[miss][fresh], h2[miss][fresh], out[miss][fresh])
+        with self._lock:
+            self.hits += int(hit.sum())
+            self.misses += len(miss)
+        return out
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {"rows": int(len(self._keys)), "max_rows": self.max_rows,
+                    "hits": self.hits, "misses": self.misses,
+                    "hit_rate": round(self.hits / total, 4) if total else None}
+
+
+ROW_CACHE = RowPDCache()
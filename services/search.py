@@ -0,0 +1,97 @@
+# services/search.py — index de recherche par nom d'entreprise (construit une fois par ticket)
+from __future__ import annotations
+import re
+from bisect import bisect_left
+from dataclasses import dataclass, field
+import numpy as np
+import pandas as pd
+
+from services.schema import compile_schema
+
+_ACCENTS = {"é": "e", "è": "e", "ê": "e", "ë": "e",
+            "á": "a", "à": "a", "â": "a", "ä": "a",
+            "í": "i", "ì": "i", "î": "i", "ï": "i",
+            "ó": "o", "ò": "o", "ô": "o", "ö": "o",
+            "ú": "u", "ù": "u", "û": "u", "ü": "u",
+            "ç": "c"}
+_TRANS = str.maketrans({**_ACCENTS, **{a.upper(): b.upper() for a, b in _ACCENTS.items()}})
+_WORD = re.compile(r"\w+")
+
+
+def normalize_name(s) -> str:
+    """Sans accents, en majuscules, espaces compactés."""
+    return " ".join(str(s).translate(_TRANS).upper().split())
+
+
+def find_company_column(df: pd.DataFrame) -> str:
+    ent_col = compile_schema(df.columns).company_col
+    if ent_col is not None:
+        return ent_col
+    text_cols = df.select_dtypes(include=["object", "category"]).columns.tolist()
+    return text_cols[0] if text_cols else df.columns[0]
+
+
+@dataclass
+class NameIndex:
+    """
+    Noms normalisés distincts + index inversé mot -> noms.
+    Les lignes sont repérées par position (compatible df.iloc).
+    """
+    ent_col: str
+    names: list[str]                      # noms normalisés distincts
+    codes: np.ndarray                     # ligne -> id de nom
+    postings: dict[str, frozenset[int]]   # mot -> ids de noms
+    words: list[str] = field(default_factory=list)  # mots triés (recherche par préfixe)
+
+    def _name_ids(self, token: str) -> set[int]:
+        # préfixe explicite : "SONA*"
+        if token.endswith("*") and _WORD.fullmatch(token[:-1] or "-"):
+            prefix, ids = token[:-1], set()
+            i = bisect_left(self.words, prefix)
+            while i < len(self.words) and self.words[i].startswith(prefix):
+                ids |= self.postings[self.words[i]]
+                i += 1
+            return ids
+        # mot simple : équivalent exact de \bmot\b
+        if _WORD.fullmatch(token):
+            return set(self.postings.get(token, ()))
+        # jeton composite (D'IVOIRE, S.A, ...) : motif historique sur les noms distincts
+        try:
+            rx = re.compile(rf"\b{token}\b")
+        except re.error:
+            return set()
+        return {i for i, n in enumerate(self.names) if rx.search(n)}
+
+    def match_ids(self, query: str) -> np.ndarray | None:
+        """Ids des noms contenant tous les jetons de la requête (None : requête vide, tout correspond)."""
+        tokens = normalize_name(query).split()
+        if not tokens:
+            return None
+        ids = self._name_ids(tokens[0])
+        for t in tokens[1:]:
+            if not ids:
+                break
+            ids &= self._name_ids(t)
+        return np.fromiter(sorted(ids), dtype=self.codes.dtype, count=len(ids))
+
+    def match_rows(self, query: str) -> np.ndarray:
+        """Positions des lignes dont le nom contient tous les jetons de la requête."""
+        ids = self.match_ids(query)
+        if ids is None:
+            return np.arange(len(self.codes))
+        if not len(ids):
+            return np.empty(0, dtype=np.intp)
+        return np.flatnonzero(np.isin(self.codes, ids))
+
+
+def build_name_index(df: pd.DataFrame, ent_col: str | None = None) -> NameIndex:
+    ent_col = ent_col or find_company_column(df)
+    # les valeurs manquantes deviennent "NAN" comme avec astype(str)
+    codes, uniques = pd.factorize(df[ent_col].astype(str))
+    names = [normalize_name(u) for u in uniques]
+    post: dict[str, set[int]] = {}
+    for i, n in enumerate(names):
+        for w in set(_WORD.findall(n)):
+            post.setdefault(w, set()).add(i)
+    postings = {w: frozenset(v) for w, v in post.items()}
+    return NameIndex(ent_col, names, codes.astype(np.int32), postings, sorted(postings))
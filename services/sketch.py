@@ -0,0 +1,78 @@
+# services/sketch.py — esquisse de quantiles fusionnable pour les PD (valeurs dans [0, 1])
+from __future__ import annotations
+import numpy as np
+
+from config import SKETCH_EPS
+
+
+class PDSketch:
+    """
+    Histogramme à pas fixe sur [0, 1] : ceil(1/eps) cases, fusion par addition.
+    Chaque case garde aussi son min et son max : on interpole entre eux, ce qui
+    rend exacts les paquets de valeurs identiques (PD ex-aequo).
+    Les quantiles restitués sont à au plus `eps` (en PD) des quantiles exacts,
+    quelle que soit la taille du panel ; la mémoire ne dépend que de eps.
+    """
+
+    def __init__(self, eps: float = SKETCH_EPS):
+        if not 0 < eps < 1:
+            raise ValueError("eps doit être dans ]0, 1[")
+        self.eps = eps
+        self.bins = int(np.ceil(1.0 / eps))
+        self.counts = np.zeros(self.bins, dtype=np.int64)
+        self.mins = np.full(self.bins, np.inf)
+        self.maxs = np.full(self.bins, -np.inf)
+        self.n = 0
+
+    def _bin(self, values: np.ndarray) -> np.ndarray:
+        return np.clip((values * self.bins).astype(np.int64), 0, self.bins - 1)
+
+    def update(self, values) -> "PDSketch":
+        v = np.asarray(values, dtype=float)
+        v = v[~np.isnan(v)]
+        if v.size:
+            b = self._bin(v)
+            self.counts += np.bincount(b, minlength=self.bins)
+            np.minimum.at(self.mins, b, v)
+            np.maximum.at(self.maxs, b, v)
+            self.n += int(v.size)
+        return self
+
+    def merge(self, other: "PDSketch") -> "PDSketch":
+        if other.bins != self.bins:
+            raise ValueError("Esquisses de précisions différentes.")
+        self.counts += other.counts
+        np.minimum(self.mins, other.mins, out=self.mins)
+        np.maximum(self.maxs, other.maxs, out=self.maxs)
+        self.n += other.n
+        return self
+
+    def quantile(self, qs) -> np.ndarray:
+        """Quantiles (interpolation linéaire comme pandas) approchés à eps près."""
+        qs = np.asarray(qs, dtype=float)
+        if self.n == 0:
+            return np.full(qs.shape, np.nan)
+        cum = np.cumsum(self.counts)
+        pos = qs * (self.n - 1)                       # rang 0-based visé
+        b = np.minimum(np.searchsorted(cum, pos, side="right"), self.bins - 1)
+        before = cum[b] - self.counts[b]
+        # position dans la case, interpolée entre son min et son max
+        frac = np.clip((pos - before) / np.maximum(self.counts[b] - 1, 1), 0, 1)
+        lo, hi = self.mins[b], self.maxs[b]
+        return np.clip(lo + frac * (hi - lo), 0.0, 1.0)
+
+    def pct_rank(self, values) -> np.ndarray:
+        """Rang centile approché (méthode 'average'), interpolé dans la case."""
+        v = np.asarray(values, dtype=float)
+        out = np.full(v.shape, np.nan)
+        ok = ~np.isnan(v)
+        if self.n == 0 or not ok.any():
+            return out
+        b = self._bin(v[ok])
+        cum = np.cumsum(self.counts)
+        before = cum[b] - self.counts[b]
+        lo, hi = self.mins[b], self.maxs[b]
+        span = hi - lo
+        frac = np.where(span > 0, np.clip((v[ok] - lo) / np.where(span > 0, span, 1), 0, 1), 0.5)
+        out[ok] = np.clip((before + frac * self.counts[b] + 0.5) / self.n, 1.0 / self.n, 1.0)
+        return out
@@ -0,0 +1,316 @@
+# services/stress.py — stress tests : chocs de scénario et perturbations Monte Carlo sur les ratios
+from __future__ import annotations
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Iterator
+import numpy as np
+import pandas as pd
+
+from config import (
+    RATING_ORDER, STRESS_BLOCK_ROWS, STRESS_MAX_REPLICATES, STRESS_MAX_SCENARIOS,
+    STRESS_WORKERS, STRESS_POOL_MIN_ROWS,
+)
+from services.criteria import evaluate_criteria
+from services.pipeline import model_pd
+from services.rating import _quantile_edges_from_pd, notation_codes, sector_bonus_codes
+from services.rerating import NOTATION_COLUMNS, distribution, rating_columns
+from services.schema import compile_schema, load_feature_list
+from services.sketch import PDSketch
+
+# Colonnes calculées par le scoring (retirées du panel avant de le rejouer)
+OUTPUT_COLUMNS = frozenset(NOTATION_COLUMNS) | {"Proba_defaillance", "Défaillance", "Statut"}
+# "baseline" : seuils et rangs par année du panel non choqué (les migrations reflètent le choc) ;
+# "panel" : chaque réplicat noté comme un upload (seuils recalculés, cf. apply_full_notation)
+CALIBRATIONS = ("baseline", "panel")
+_N = len(RATING_ORDER)
+_QS = (0.05, 0.5, 0.95)
+
+
+@dataclass(frozen=True)
+class Scenario:
+    """
+    Variation relative par colonne : x + (choc + sigma * Z) * |x|, Z ~ N(0, 1) tiré par ligne et
+    par réplicat (une baisse de 20 % rend un EBE négatif plus négatif). Sans sigma, le scénario
+    est déterministe et n'a qu'un réplicat. Les ratios dérivés (ROE, levier) ne sont pas recalculés :
+    ils ne bougent que s'ils sont choqués eux-mêmes.
+    """
+    name: str
+    shocks: dict = field(default_factory=dict)    # colonne -> choc relatif (-0.2 = -20 %)
+    sigma: dict = field(default_factory=dict)     # colonne -> écart-type relatif
+    replicates: int = 1
+    seed: int = 0
+
+
+def stress_columns(head: pd.DataFrame) -> list[str]:
+    """Colonnes choquables : features numériques de feature_list.json présentes (hors identifiants)."""
+    schema = compile_schema(tuple(head.columns))
+    feats = load_feature_list() or list(head.columns)
+    out = []
+    for src in schema.feature_sources(feats):
+        if (src is not None and src not in out and src not in schema.id_cols and src not in OUTPUT_COLUMNS
+                and pd.api.types.is_numeric_dtype(head[src])):
+            out.append(src)
+    return out
+
+
+def _number(value, name: str) -> float:
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or not np.isfinite(value):
+        raise ValueError(f"{name} : nombre attendu, reçu {value!r}")
+    return float(value)
+
+
+def parse_scenarios(body: dict, head: pd.DataFrame) -> tuple[list[Scenario], str]:
+    """
+    {"scenarios": [{"name": "choc", "shocks": {"EBE": -0.2, "capitaux propres": -0.1}},
+                   {"name": "mc", "replicates": 500, "sigma": 0.1, "seed": 1}],
+     "calibration": "baseline"}. Les noms de colonnes sont rapprochés comme à l'upload
+    (accents, casse, alias) ; `sigma` nombre = même écart-type sur toutes les features.
+    """
+    if not isinstance(body, dict):
+        raise ValueError("corps JSON : objet attendu")
+    calibration = body.get("calibration", "baseline")
+    if calibration not in CALIBRATIONS:
+        raise ValueError(f"calibration : {' ou '.join(CALIBRATIONS)}")
+    specs = body.get("scenarios")
+    if not isinstance(specs, list) or not specs:
+        raise ValueError("scenarios : liste non vide attendue")
+    if len(specs) > STRESS_MAX_SCENARIOS:
+        raise ValueError(f"au plus {STRESS_MAX_SCENARIOS} scénarios")
+
+    allowed = stress_columns(head)
+    schema = compile_schema(tuple(head.columns))
+
+    def resolve(key: str) -> str:
+        src = schema.col(key)
+        if src not in allowed:
+            raise ValueError(f"colonne non choquable : {key!r} (possibles : {', '.join(allowed)})")
+        return src
+
+    out = []
+    for i, spec in enumerate(specs):
+        if not isinstance(spec, dict):
+            raise ValueError("scénario : objet attendu")
+        unknown = set(spec) - {"name", "shocks", "sigma", "replicates", "seed"}
+        if unknown:
+            raise ValueError(f"scénario : clés inconnues {sorted(unknown)}")
+        name = str(spec.get("name") or f"scenario_{i + 1}")
+        shocks = spec.get("shocks") or {}
+        if not isinstance(shocks, dict):
+            raise ValueError(f"{name}.shocks : objet attendu")
+        shocks = {resolve(k): _number(v, f"{name}.shocks.{k}") for k, v in shocks.items()}
+        sigma = spec.get("sigma") or {}
+        if not isinstance(sigma, dict):
+            sigma = {c: sigma for c in allowed}
+        sigma = {resolve(k): _number(v, f"{name}.sigma.{k}") for k, v in sigma.items()}
+        if any(v < 0 for v in sigma.values()):
+            raise ValueError(f"{name}.sigma : écart-type positif attendu")
+        sigma = {k: v for k, v in sigma.items() if v > 0}
+        replicates = int(_number(spec.get("replicates", 1 if not sigma else 100), f"{name}.replicates"))
+        if not sigma:
+            replicates = 1
+        if not 1 <= replicates <= STRESS_MAX_REPLICATES:
+            raise ValueError(f"{name}.replicates : entre 1 et {STRESS_MAX_REPLICATES}")
+        out.append(Scenario(name, shocks, sigma, replicates, int(_number(spec.get("seed", 0), f"{name}.seed"))))
+    return out, calibration
+
+
+# ---------- panel de référence ----------
+@dataclass
+class StressContext:
+    """Panel rejoué (features numériques en matrice) et calibrage de référence ; picklable (pool)."""
+    numeric: list[str]               # colonnes numériques du panel (entrées du modèle et des critères)
+    X: np.ndarray                    # (lignes, colonnes numériques) float64
+    other: dict                      # colonnes année / secteur non numériques, répétées par réplicat
+    year_codes: np.ndarray           # -1 : année manquante
+    max_bonus: np.ndarray
+    calibration: str = "baseline"
+    edges: dict | None = None        # seuils absolus du panel non choqué
+    by_year: list = field(default_factory=list)   # PD triées du panel non choqué, par année
+    baseline: np.ndarray | None = None            # codes de la note de référence
+    baseline_pd: float = 0.0
+    baseline_default: float = 0.0
+
+    @property
+    def n(self) -> int:
+        return len(self.X)
+
+
+def build_context(df: pd.DataFrame, calibration: str = "baseline") -> StressContext:
+    """Panel d'un résultat stocké ; la référence est le panel non choqué, renoté avec le modèle courant."""
+    if df.empty:
+        raise ValueError("panel vide")
+    base = df.drop(columns=[c for c in df.columns if c in OUTPUT_COLUMNS])
+    col_year, col_sector = rating_columns(base.columns)
+    if col_year is None:
+        col_year = "__ANNEE__"
+        base[col_year] = ""
+    if col_sector is None:
+        col_sector = "__SECTEUR__"
+        base[col_sector] = "Inconnu"
+    numeric = [c for c in base.columns if pd.api.types.is_numeric_dtype(base[c])]
+    ctx = StressContext(
+        numeric=numeric,
+        X=base[numeric].to_numpy(dtype=np.float64, na_value=np.nan),
+        other={c: np.asarray(base[c], dtype=object) for c in (col_year, col_sector) if c not in numeric},
+        year_codes=pd.factorize(base[col_year])[0],
+        max_bonus=sector_bonus_codes(base[col_sector]),
+        calibration=calibration,
+    )
+    pdv, default = _score(ctx, ctx.X, 1)
+    ctx.edges = _quantile_edges_from_pd(pd.Series(pdv))
+    ctx.by_year = [np.sort(pdv[ctx.year_codes == y]) for y in range(ctx.year_codes.max() + 1)]
+    ctx.baseline = _rate(ctx, pdv, 1)
+    ctx.baseline_pd = float(pdv.mean()) if len(pdv) else 0.0
+    ctx.baseline_default = float(default.mean()) if len(pdv) else 0.0
+    return ctx
+
+
+def baseline_summary(ctx: StressContext) -> dict:
+    dist = distribution(ctx.baseline)
+    return {"rows": ctx.n, "calibration": ctx.calibration, "pd_mean": ctx.baseline_pd,
+            "default_rate": ctx.baseline_default, "distribution": dist,
+            "shares": {r: round(100.0 * c / max(1, ctx.n), 2) for r, c in dist.items()}}
+
+
+# ---------- un bloc de réplicats ----------
+def _score(ctx: StressContext, X: np.ndarray, replicates: int) -> tuple[np.ndarray, np.ndarray]:
+    """Cible métier et PD des lignes empilées (un seul appel au modèle)."""
+    frame = pd.DataFrame(X, columns=ctx.numeric)
+    for c, values in ctx.other.items():
+        frame[c] = np.tile(values, replicates)
+    schema = compile_schema(frame.columns)
+    criteria = evaluate_criteria(frame, schema=schema)
+    default = criteria.any()
+    frame["Défaillance"] = default.astype(int)
+    # lignes synthétiques : hors cache de PD par ligne
+    pdv = model_pd(frame, schema, criteria, use_cache=False).to_numpy(dtype=float)
+    return pdv, default
+
+
+def _rate(ctx: StressContext, pdv: np.ndarray, replicates: int) -> np.ndarray:
+    """Notes finales (codes) des lignes empilées, selon le calibrage du contexte."""
+    n = ctx.n
+    if ctx.calibration == "baseline":
+        # rang centile 'average' de chaque PD parmi les PD de référence de la même année
+        years = np.tile(ctx.year_codes, replicates)
+        u = np.full(len(pdv), np.nan)
+        for y, ref in enumerate(ctx.by_year):
+            m = years == y
+            lo = np.searchsorted(ref, pdv[m], side="left")
+            hi = np.searchsorted(ref, pdv[m], side="right")
+            u[m] = np.minimum((lo + (hi - lo + 1) / 2) / len(ref), 1.0)
+        return notation_codes(pdv, u, np.tile(ctx.max_bonus, replicates), ctx.edges)[3]
+
+    # chaque réplicat noté comme un upload : mêmes étapes qu'apply_full_notation
+    years = pd.Series(ctx.year_codes).where(ctx.year_codes >= 0)
+    out = np.empty(len(pdv), dtype=np.int8)
+    for r in range(replicates):
+        p = pd.Series(pdv[r * n:(r + 1) * n])
+        u = p.groupby(years).rank(pct=True, method="average").to_numpy(dtype=float)
+        out[r * n:(r + 1) * n] = notation_codes(p.to_numpy(), u, ctx.max_bonus, _quantile_edges_from_pd(p))[3]
+    return out
+
+
+def _shocked(ctx: StressContext, sc: Scenario, start: int, count: int) -> np.ndarray:
+    """Panel répété `count` fois puis choqué ; tirages fixés par (graine, n° de réplicat)."""
+    X = np.tile(ctx.X, (count, 1))
+    names = list(dict.fromkeys([*sc.shocks, *sc.sigma]))
+    if not names:
+        return X
+    cols = [ctx.numeric.index(c) for c in names]
+    delta = np.tile(np.array([sc.shocks.get(c, 0.0) for c in names]), (len(X), 1))
+    sigma = np.array([sc.sigma.get(c, 0.0) for c in names])
+    if sigma.any():
+        n = ctx.n
+        for i in range(count):
+            z = np.random.default_rng([sc.seed, start + i]).standard_normal((n, len(names)))
+            delta[i * n:(i + 1) * n] += sigma * z
+    X[:, cols] += delta * np.abs(X[:, cols])
+    return X
+
+
+def run_block(ctx: StressContext, sc: Scenario, start: int, count: int) -> dict:
+    """Agrégats des réplicats [start, start + count) : tailles bornées, fusionnables."""
+    pdv, default = _score(ctx, _shocked(ctx, sc, start, count), count)
+    codes = _rate(ctx, pdv, count)
+    base = np.tile(ctx.baseline, count).astype(np.int64)
+    return {
+        "pd_means": pdv.reshape(count, ctx.n).mean(axis=1),
+        "default_rates": default.reshape(count, ctx.n).mean(axis=1),
+        "dist": np.bincount(codes, minlength=_N),
+        "migration": np.bincount(base * _N + codes, minlength=_N * _N),
+        "sketch": PDSketch().update(pdv),
+    }
+
+
+def _quantiles(values: np.ndarray) -> dict:
+    return {f"p{round(q * 100):02d}": float(v) for q, v in zip(_QS, np.quantile(values, _QS))}
+
+
+def summarize(ctx: StressContext, sc: Scenario, parts: list[dict]) -> dict:
+    pd_means = np.concatenate([p["pd_means"] for p in parts])
+    defaults = np.concatenate([p["default_rates"] for p in parts])
+    dist = np.sum([p["dist"] for p in parts], axis=0)
+    mig = np.sum([p["migration"] for p in parts], axis=0).reshape(_N, _N)
+    sketch = parts[0]["sketch"]
+    for p in parts[1:]:
+        sketch.merge(p["sketch"])
+    total = max(1, int(mig.sum()))
+    rows = mig.sum(axis=1, keepdims=True)
+    return {
+        "scenario": sc.name, "replicates": sc.replicates, "rows": ctx.n * sc.replicates,
+        "shocks": sc.shocks, "sigma": sc.sigma,
+        "pd_mean": float(pd_means.mean()),
+        "pd_mean_delta": float(pd_means.mean()) - ctx.baseline_pd,
+        "pd_mean_quantiles": _quantiles(pd_means),          # moyenne du panel, sur les réplicats
+        "pd_quantiles": {f"p{round(q * 100):02d}": float(v) for q, v in zip(_QS, sketch.quantile(_QS))},
+        "default_rate": float(defaults.mean()),
+        "default_rate_quantiles": _quantiles(defaults),
+        "distribution": {r: round(int(c) / sc.replicates, 2) for r, c in zip(RATING_ORDER, dist)},  # par réplicat
+        "shares": {r: round(100.0 * int(c) / total, 2) for r, c in zip(RATING_ORDER, dist)},
+        "migration": mig.tolist(),
+        "migration_pct": np.round(100.0 * mig / np.maximum(rows, 1), 2).tolist(),
+        "downgrades_pct": round(100.0 * int(np.triu(mig, 1).sum()) / total, 2),
+        "upgrades_pct": round(100.0 * int(np.tril(mig, -1).sum()) / total, 2),
+    }
+
+
+# ---------- exécution (en processus ou pool) ----------
+_CTX: StressContext | None = None
+
+
+def _init_worker(ctx: StressContext) -> None:
+    global _CTX
+    _CTX = ctx
+
+
+def _pool_block(args) -> dict:
+    return run_block(_CTX, *args)
+
+
+def _blocks(n: int, replicates: int) -> list[tuple[int, int]]:
+    per_block = max(1, STRESS_BLOCK_ROWS // max(1, n))
+    return [(s, min(per_block, replicates - s)) for s in range(0, replicates, per_block)]
+
+
+def run_stress(ctx: StressContext, scenarios: list[Scenario], workers: int = STRESS_WORKERS) -> Iterator[dict]:
+    """
+    Résumé de chaque scénario, dans l'ordre, dès qu'il est calculé. Mémoire bornée par
+    STRESS_BLOCK_ROWS lignes par bloc ; au-delà de STRESS_POOL_MIN_ROWS lignes au total et
+    avec workers > 1, les blocs sont répartis sur un pool de processus (résultats identiques).
+    """
+    total = ctx.n * sum(sc.replicates for sc in scenarios)
+    pool = None
+    if workers > 1 and total >= STRESS_POOL_MIN_ROWS:
+        pool = ProcessPoolExecutor(workers, mp_context=mp.get_context("spawn"),
+                                   initializer=_init_worker, initargs=(ctx,))
+    try:
+        for sc in scenarios:
+            blocks = [(sc, start, count) for start, count in _blocks(ctx.n, sc.replicates)]
+            parts = (list(pool.map(_pool_block, blocks)) if pool is not None
+                     else [run_block(ctx, *b) for b in blocks])
+            yield summarize(ctx, sc, parts)
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
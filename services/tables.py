@@ -0,0 +1,153 @@
+# services/tables.py — tableaux /status et /rating paginés : agrégats et ordres de tri calculés une fois par ticket
+from __future__ import annotations
+import threading
+from dataclasses import dataclass, field
+from typing import Callable
+import numpy as np
+import pandas as pd
+
+from config import RATING_ORDER, TABLE_PAGE_SIZE, TABLE_MAX_PAGE_SIZE
+from services.schema import compile_schema
+from services.search import NameIndex, build_name_index, find_company_column
+
+STATUSES = ("Saine", "Défaillante")
+SORT_KEYS = ("ligne", "pd", "annee", "note", "entreprise")   # "ligne" : ordre du fichier
+
+# Colonnes lues par vue (hors entreprise / année, résolues par ticket)
+VIEW_COLUMNS = {"status": ["Statut", "Proba_defaillance"], "rating": ["Notation_finale"]}
+
+
+def _rating_codes(s: pd.Series) -> np.ndarray:
+    """Rang de la note dans RATING_ORDER (AAA = 0), -1 si absente ou inconnue."""
+    if isinstance(s.dtype, pd.CategoricalDtype) and list(s.cat.categories) == RATING_ORDER:
+        return s.cat.codes.to_numpy()
+    return pd.Categorical(s, categories=RATING_ORDER, ordered=True).codes
+
+
+@dataclass
+class TableView:
+    """
+    Vue d'un ticket pour les tableaux paginés :
+      - index des noms (filtre entreprise) et, par nom distinct, nombre de lignes,
+        de lignes Saine / Défaillante et de chaque note : les KPI et la distribution
+        d'un filtre sont une somme sur les noms retenus, sans relire les lignes ;
+      - ordres de tri (positions triées) calculés au premier usage puis réutilisés.
+    """
+    index: NameIndex
+    year_col: str | None
+    row_counts: np.ndarray        # (noms,)
+    status_counts: np.ndarray     # (noms, 2) : Saine, Défaillante
+    rating_counts: np.ndarray     # (noms, len(RATING_ORDER))
+    has_rating: bool
+    load: Callable[[list[str]], pd.DataFrame]   # projection de colonnes du résultat stocké
+    _orders: dict[str, np.ndarray] = field(default_factory=dict)
+    _lock: threading.Lock = field(default_factory=threading.Lock)
+
+    @property
+    def n_rows(self) -> int:
+        return len(self.index.codes)
+
+    # -- agrégats --
+    def kpi(self, ids: np.ndarray | None) -> dict:
+        rows = self.row_counts if ids is None else self.row_counts[ids]
+        status = self.status_counts if ids is None else self.status_counts[ids]
+        st = status.sum(axis=0)
+        return {"n": int(rows.sum()), "nb_saines": int(st[0]), "nb_def": int(st[1])}
+
+    def dist(self, ids: np.ndarray | None) -> dict:
+        counts = (self.rating_counts if ids is None else self.rating_counts[ids]).sum(axis=0)
+        return {r: int(c) for r, c in zip(RATING_ORDER, counts)}
+
+    # -- tri --
+    def _sort_key(self, key: str) -> np.ndarray:
+        if key == "entreprise":
+            rank = np.argsort(np.argsort(np.asarray(self.index.names, dtype=object), kind="stable"))
+            return rank[self.index.codes].astype(float)
+        if key == "pd":
+            return self.load(["Proba_defaillance"])["Proba_defaillance"].to_numpy(dtype=float, na_value=np.nan)
+        if key == "note":
+            codes = _rating_codes(self.load(["Notation_finale"])["Notation_finale"]).astype(float)
+            codes[codes < 0] = np.nan
+            return codes
+        # année : numérique si possible, sinon ordre alphabétique
+        s = self.load([self.year_col])[self.year_col]
+        v = pd.to_numeric(s, errors="coerce").to_numpy(dtype=float, na_value=np.nan)
+        if np.isnan(v).all() and s.notna().any():
+            v = pd.factorize(s.astype(str), sort=True)[0].astype(float)
+        return v
+
+    def order(self, key: str, descending: bool = False) -> np.ndarray:
+        """Positions triées (tri stable, valeurs manquantes en dernier dans les deux sens)."""
+        if key == "ligne" or (key == "annee" and self.year_col is None) or (key == "note" and not self.has_rating):
+            pos = np.arange(self.n_rows)
+            return pos[::-1] if descending else pos
+        name = f"{key}:{'desc' if descending else 'asc'}"
+        with self._lock:
+            cached = self._orders.get(name)
+        if cached is None:
+            k = self._sort_key(key)
+            cached = np.argsort(-k if descending else k, kind="stable")   # NaN reste en fin
+            with self._lock:
+                self._orders[name] = cached
+        return cached
+
+    # -- page --
+    def page(self, company: str = "", sort: str = "ligne", descending: bool = False,
+             page: int = 1, size: int = TABLE_PAGE_SIZE) -> dict:
+        """Positions des lignes de la page + agrégats du filtre (indépendants de la page)."""
+        size = max(1, min(int(size), TABLE_MAX_PAGE_SIZE))
+        ids = self.index.match_ids(company) if company else None
+        order = self.order(sort if sort in SORT_KEYS else "ligne", descending)
+        if ids is not None:
+            keep = np.zeros(len(self.index.names) + 1, dtype=bool)
+            keep[ids] = True
+            order = order[keep[self.index.codes[order]]]
+        kpi = self.kpi(ids)
+        pages = max(1, -(-kpi["n"] // size))
+        page = max(1, min(int(page), pages))
+        return {
+            "positions": order[(page - 1) * size:page * size],
+            "total": kpi["n"], "page": page, "pages": pages, "size": size,
+            "kpi": kpi, "dist": self.dist(ids),
+        }
+
+
+def build_table_view(head: pd.DataFrame, load: Callable[[list[str]], pd.DataFrame]) -> TableView:
+    """Construit les agrégats à partir des colonnes entreprise / Statut / note du résultat."""
+    ent_col = find_company_column(head)
+    year_col = compile_schema(head.columns).year_col
+    has_rating = "Notation_finale" in head.columns
+    cols = [ent_col] + [c for c in ("Statut", "Notation_finale") if c in head.columns]
+    df = load(cols)
+    index = build_name_index(df, ent_col)
+    codes, n_names = index.codes, len(index.names)
+
+    row_counts = np.bincount(codes, minlength=n_names)
+    status_counts = np.zeros((n_names, len(STATUSES)), dtype=np.int64)
+    if "Statut" in df.columns:
+        st = df["Statut"]
+        for j, label in enumerate(STATUSES):
+            status_counts[:, j] = np.bincount(codes, weights=(st == label).to_numpy(), minlength=n_names)
+    rating_counts = np.zeros((n_names, len(RATING_ORDER)), dtype=np.int64)
+    if has_rating:
+        rc = _rating_codes(df["Notation_finale"])
+        ok = rc >= 0
+        flat = codes[ok].astype(np.int64) * len(RATING_ORDER) + rc[ok]
+        rating_counts = np.bincount(flat, minlength=n_names * len(RATING_ORDER)).reshape(n_names, -1)
+    return TableView(index, year_col, row_counts, status_counts, rating_counts, has_rating, load)
+
+
+def page_records(df: pd.DataFrame, view: str, ent_col: str, year_col: str | None) -> list[dict]:
+    """Lignes d'une page au format des gabarits (Entreprise, Année, Statut / PD (%) ou note)."""
+    out = pd.DataFrame({
+        "Entreprise": df[ent_col],
+        "Année": df[year_col] if year_col else "",
+    })
+    if view == "status":
+        out["Statut"] = df["Statut"] if "Statut" in df.columns else ""
+        if "Proba_defaillance" in df.columns:
+            out["PD (%)"] = (df["Proba_defaillance"].astype(float) * 100).round(2)
+    else:
+        out["Notation_finale"] = df["Notation_finale"]
+    out = out.astype(object).where(out.notna(), None)
+    return out.to_dict(orient="records")
@@ -0,0 +1,324 @@
+# services/training.py — entraînement reproductible du modèle de PD (utilisé par train_model.py)
+"""
+Étapes :
+  1. lecture + nettoyage + cible « Défaillance » (mêmes règles qu'au scoring), mis en cache
+     en Parquet sous TRAIN_CACHE_DIR, clé = sha256 de la source (+ onglet, PREP_VERSION) ;
+  2. recherche d'hyperparamètres optionnelle par élimination successive : chaque tour note
+     les candidats en validation croisée avec peu d'arbres, seul le meilleur tiers passe
+     au tour suivant avec 3x plus d'arbres ;
+  3. AUC en validation croisée, ajustement final (calibration isotonique par défaut),
+     métriques sur l'échantillon de test ;
+  4. artefacts versionnés sous <out>/versions/<version>/ (pipeline.joblib, classifier.joblib,
+     feature_list.json, pipeline.flat.npz, manifest.json), puis promotion dans <out>/.
+Les plis et les candidats sont répartis sur `n_jobs` processus ; les arbres du modèle final
+sur `n_jobs` threads.
+"""
+from __future__ import annotations
+import json, os, platform, shutil, tempfile, time
+from datetime import datetime, timezone
+from typing import Callable
+import numpy as np
+import pandas as pd
+import joblib
+import sklearn
+from sklearn.calibration import CalibratedClassifierCV
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.experimental import enable_halving_search_cv  # noqa: F401 (active HalvingRandomSearchCV)
+from sklearn.impute import SimpleImputer
+from sklearn.metrics import accuracy_score, brier_score_loss, roc_auc_score
+from sklearn.model_selection import HalvingRandomSearchCV, StratifiedKFold, cross_val_score, train_test_split
+from sklearn.pipeline import Pipeline
+
+from config import TRAIN_CACHE_DIR, TRAIN_N_JOBS
+from services.flat_forest import compile_file, flat_path_for
+from services.io_excel import read_upload
+from services.labeling import compute_defaillance
+from services.model_registry import MODEL_DIR, MANIFEST_NAME, _file_hash
+from services.preprocessing import basic_clean
+from services.schema import compile_schema
+
+PREP_VERSION = 1   # à incrémenter si le nettoyage ou la cible changent (invalide le cache)
+CALIBRATIONS = ("isotonic", "sigmoid", "none")
+DEFAULT_PARAMS = {"n_estimators": 300, "max_depth": None, "min_samples_leaf": 1, "max_features": "sqrt"}
+SEARCH_SPACE = {
+    "max_depth": [None, 6, 10, 16],
+    "min_samples_leaf": [1, 2, 4, 8],
+    "max_features": ["sqrt", 0.5, 1.0],
+}
+SEARCH_FACTOR = 3
+MIN_SEARCH_TREES = 10
+# Ordre de promotion : pipeline.joblib en dernier, c'est lui qui déclenche le rechargement (ModelRegistry)
+ARTIFACTS = ("feature_list.json", "classifier.joblib", "pipeline.flat.npz", MANIFEST_NAME, "pipeline.joblib")
+
+
+# ---------- données ----------
+def _read_source(path: str, sheet: int | str = 0) -> pd.DataFrame:
+    if sheet != 0 and os.path.splitext(path.lower())[1] in (".xlsx", ".xls"):
+        df = pd.read_excel(path, sheet_name=sheet)
+        df.columns = [str(c).strip() for c in df.columns]
+        return df
+    return read_upload(path, os.path.basename(path))
+
+
+def _columnar(df: pd.DataFrame) -> pd.DataFrame:
+    """Colonnes objet mêlant texte et nombres (jamais des features) -> texte : écriture Parquet possible."""
+    for c in df.columns[(df.dtypes == object).to_numpy()]:
+        s = df[c]
+        if pd.api.types.infer_dtype(s, skipna=True) not in ("string", "empty"):
+            df[c] = s.where(s.isna(), s.astype(str))
+    return df
+
+
+def load_dataset(path: str, sheet: int | str = 0,
+                 cache_dir: str | None = TRAIN_CACHE_DIR) -> tuple[pd.DataFrame, str, bool]:
+    """Jeu nettoyé + cible ; (données, sha256 de la source, lu depuis le cache ?)."""
+    digest = _file_hash(path)
+    cached = None
+    if cache_dir:
+        cached = os.path.join(cache_dir, f"{digest[:24]}-{sheet}-v{PREP_VERSION}.parquet")
+        if os.path.exists(cached):
+            try:
+                return pd.read_parquet(cached), digest, True
+            except (OSError, ValueError):
+                pass
+
+    df = _read_source(path, sheet)
+    schema = compile_schema(df.columns)
+    df = _columnar(basic_clean(df, schema))
+    df["Défaillance"] = compute_defaillance(df, schema=schema)
+
+    if cached:
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp = f"{cached}.{os.getpid()}.tmp"
+        try:
+            df.to_parquet(tmp, index=False)
+            os.replace(tmp, cached)
+        except (OSError, ValueError, TypeError, NotImplementedError):
+            if os.path.exists(tmp):
+                os.remove(tmp)
+    return df, digest, False
+
+
+def feature_matrix(df: pd.DataFrame) -> tuple[pd.DataFrame, pd.Series]:
+    """X / y comme au scoring (services.pipeline.model_pd) : colonnes numériques hors identifiants et cible."""
+    schema = compile_schema(df.columns)
+    drop_cols = set(schema.id_cols) | {"Défaillance"}
+    X = (df.drop(columns=[c for c in drop_cols if c in df.columns])
+           .select_dtypes(include=["number"])
+           .astype(float)
+           .replace([np.inf, -np.inf], np.nan))
+    return X, df["Défaillance"].astype(int)
+
+
+def _check_target(y: pd.Series, folds: int) -> None:
+    counts = y.value_counts()
+    if len(counts) < 2:
+        raise ValueError("La cible « Défaillance » ne contient qu'une classe : entraînement impossible.")
+    if counts.min() < 2 * folds:
+        raise ValueError(f"Trop peu d'exemples de la classe minoritaire ({counts.min()}) pour {folds} plis.")
+
+
+# ---------- modèle ----------
+def _cv(folds: int, seed: int) -> StratifiedKFold:
+    return StratifiedKFold(n_splits=folds, shuffle=True, random_state=seed)
+
+
+def build_model(params: dict, seed: int, n_jobs: int | None = None) -> Pipeline:
+    """Pipeline imputer (médiane) -> forêt aléatoire (compilable par services.flat_forest)."""
+    rf = RandomForestClassifier(**params, class_weight="balanced_subsample", random_state=seed, n_jobs=n_jobs)
+    return Pipeline([("imputer", SimpleImputer(strategy="median")), ("rf", rf)])
+
+
+def search_params(X: pd.DataFrame, y: pd.Series, n_candidates: int, folds: int, seed: int,
+                  n_jobs: int, n_estimators: int) -> tuple[dict, dict]:
+    """
+    Élimination successive (HalvingRandomSearchCV, ressource = nombre d'arbres) :
+    les mauvais candidats sont écartés après quelques dizaines d'arbres.
+    Renvoie (meilleurs paramètres, rapport).
+    """
+    rounds = max(1, int(np.ceil(np.log(max(n_candidates, 1)) / np.log(SEARCH_FACTOR))))
+    search = HalvingRandomSearchCV(
+        build_model(DEFAULT_PARAMS, seed),
+        {f"rf__{k}": v for k, v in SEARCH_SPACE.items()},
+        n_candidates=n_candidates, factor=SEARCH_FACTOR, resource="rf__n_estimators",
+        max_resources=n_estimators,
+        min_resources=min(n_estimators, max(MIN_SEARCH_TREES, n_estimators // SEARCH_FACTOR ** (rounds - 1))),
+        cv=_cv(folds, seed), scoring="roc_auc", refit=False, random_state=seed, n_jobs=n_jobs,
+    ).fit(X, y)
+    best = {k.split("__", 1)[1]: v for k, v in search.best_params_.items() if k != "rf__n_estimators"}
+    report = {
+        "candidates": [int(n) for n in search.n_candidates_],
+        "trees": [int(n) for n in search.n_resources_],
+        "best_cv_auc": round(float(search.best_score_), 6),
+        "best_params": best,
+    }
+    return best, report
+
+
+def _without_jobs(model) -> None:
+    """n_jobs=None sur les objets ajustés : pas de pool de threads à l'inférence dans les workers web."""
+    members = [getattr(cc, "estimator", None) or getattr(cc, "base_estimator", None)
+               for cc in getattr(model, "calibrated_classifiers_", [])]
+    for m in [model, *members]:
+        m.set_params(**{k: None for k in m.get_params() if k == "n_jobs" or k.endswith("__n_jobs")})
+
+
+def _forest(model) -> RandomForestClassifier:
+    """Forêt ajustée (premier membre si calibré) : classifier.joblib, utile aux modes B/C."""
+    cals = getattr(model, "calibrated_classifiers_", None)
+    if cals:
+        model = getattr(cals[0], "estimator", None) or getattr(cals[0], "base_estimator", None)
+    return model.named_steps["rf"]
+
+
+def fit_model(X: pd.DataFrame, y: pd.Series, params: dict, seed: int, n_jobs: int,
+              calibration: str = "isotonic", folds: int = 5):
+    """Modèle final : forêt seule (arbres en parallèle) ou calibrée (plis en parallèle)."""
+    if calibration == "none":
+        model = build_model(params, seed, n_jobs).fit(X, y)
+    else:
+        model = CalibratedClassifierCV(build_model(params, seed), method=calibration,
+                                       cv=_cv(folds, seed), n_jobs=n_jobs).fit(X, y)
+    _without_jobs(model)
+    return model
+
+
+def _holdout_metrics(y: pd.Series, proba: np.ndarray) -> dict:
+    return {
+        "rows": int(len(y)),
+        "auc": round(float(roc_auc_score(y, proba)), 6) if y.nunique() == 2 else None,
+        "accuracy": round(float(accuracy_score(y, (proba >= 0.5).astype(int))), 6),
+        "brier": round(float(brier_score_loss(y, proba)), 6),
+        "pd_min": round(float(proba.min()), 6),
+        "pd_median": round(float(np.median(proba)), 6),
+        "pd_max": round(float(proba.max()), 6),
+    }
+
+
+# ---------- artefacts ----------
+def _promote(src_dir: str, out_dir: str) -> None:
+    """Copie dans out_dir, fichier par fichier (tmp + os.replace), pipeline.joblib en dernier."""
+    for name in ARTIFACTS:
+        src, dst = os.path.join(src_dir, name), os.path.join(out_dir, name)
+        if not os.path.exists(src):
+            if os.path.exists(dst):
+                os.remove(dst)     # forêt compilée d'un ancien modèle
+            continue
+        tmp = f"{dst}.{os.getpid()}.tmp"
+        shutil.copyfile(src, tmp)
+        os.replace(tmp, dst)
+
+
+def write_artifacts(model, features: list[str], manifest: dict, out_dir: str = MODEL_DIR,
+                    promote: bool = True) -> dict:
+    """Écrit <out>/versions/<version>/ (+ forêt compilée si parité) et complète le manifest."""
+    root = os.path.join(out_dir, "versions")
+    os.makedirs(root, exist_ok=True)
+    staging = tempfile.mkdtemp(prefix=".train-", dir=root)
+    try:
+        pipe_path = os.path.join(staging, "pipeline.joblib")
+        joblib.dump(model, pipe_path)
+        joblib.dump(_forest(model), os.path.join(staging, "classifier.joblib"))
+        with open(os.path.join(staging, "feature_list.json"), "w", encoding="utf-8") as f:
+            json.dump(features, f, ensure_ascii=False, indent=2)
+
+        t0 = time.perf_counter()
+        try:
+            _, err = compile_file(pipe_path, flat_path_for(pipe_path))
+            manifest["flat_parity_error"] = err
+        except (TypeError, ValueError) as e:
+            manifest["flat_parity_error"] = None
+            manifest["flat_error"] = str(e)
+        manifest["timing"]["compile_s"] = round(time.perf_counter() - t0, 3)
+
+        manifest["artifacts"] = {name: _file_hash(os.path.join(staging, name))
+                                 for name in ARTIFACTS if name != MANIFEST_NAME
+                                 and os.path.exists(os.path.join(staging, name))}
+        stamp = datetime.now(timezone.utc)
+        manifest["created_at"] = stamp.isoformat(timespec="seconds")
+        manifest["version"] = f"{stamp:%Y%m%dT%H%M%SZ}-{manifest['artifacts']['pipeline.joblib'][:8]}"
+        manifest["timing"]["total_s"] = round(sum(manifest["timing"].values()), 3)
+        with open(os.path.join(staging, MANIFEST_NAME), "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+        directory = os.path.join(root, manifest["version"])
+        if os.path.exists(directory):
+            shutil.rmtree(directory)
+        os.replace(staging, directory)
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+
+    manifest["directory"] = directory
+    if promote:
+        _promote(directory, out_dir)
+    manifest["promoted"] = promote
+    return manifest
+
+
+# ---------- orchestration ----------
+def train(data_path: str, out_dir: str = MODEL_DIR, sheet: int | str = 0, n_jobs: int = TRAIN_N_JOBS,
+          search: int = 0, folds: int = 5, seed: int = 42, calibration: str = "isotonic",
+          test_size: float = 0.2, params: dict | None = None, cache_dir: str | None = TRAIN_CACHE_DIR,
+          promote: bool = True, log: Callable[[str], None] = print) -> dict:
+    """Entraîne, évalue et écrit un modèle versionné ; renvoie son manifest."""
+    if calibration not in CALIBRATIONS:
+        raise ValueError(f"Calibration inconnue : {calibration} (attendu : {', '.join(CALIBRATIONS)})")
+    params = {**DEFAULT_PARAMS, **(params or {})}
+    timing: dict[str, float] = {}
+    lap = time.perf_counter()
+
+    def step(name: str) -> None:
+        nonlocal lap
+        now = time.perf_counter()
+        timing[name] = round(now - lap, 3)
+        lap = now
+
+    df, digest, cache_hit = load_dataset(data_path, sheet, cache_dir)
+    X, y = feature_matrix(df)
+    _check_target(y, folds)
+    step("load_s")
+    log(f"Données : {len(X)} lignes, {X.shape[1]} features, {int(y.sum())} défaillantes"
+        f"{' (cache)' if cache_hit else ''}")
+
+    X_train, X_test, y_train, y_test = train_test_split(
+        X, y, test_size=test_size, random_state=seed, stratify=y)
+
+    search_report = None
+    if search:
+        best, search_report = search_params(X_train, y_train, search, folds, seed, n_jobs, params["n_estimators"])
+        params.update(best)
+        step("search_s")
+        log(f"Recherche : {best} (AUC CV {search_report['best_cv_auc']:.3f}, "
+            f"candidats par tour {search_report['candidates']})")
+
+    cv_auc = cross_val_score(build_model(params, seed), X_train, y_train, cv=_cv(folds, seed),
+                             scoring="roc_auc", n_jobs=n_jobs)
+    step("cv_s")
+
+    model = fit_model(X_train, y_train, params, seed, n_jobs, calibration, folds)
+    step("fit_s")
+    holdout = _holdout_metrics(y_test, model.predict_proba(X_test)[:, 1])
+    log(f"AUC CV : {cv_auc.mean():.3f} ± {cv_auc.std():.3f} — test : AUC {holdout['auc']}, "
+        f"Acc {holdout['accuracy']}")
+
+    manifest = {
+        "features": list(X.columns),
+        "source": {"name": os.path.basename(data_path), "sha256": digest, "sheet": sheet,
+                   "rows": int(len(X)), "positives": int(y.sum()), "cache_hit": cache_hit,
+                   "prep_version": PREP_VERSION},
+        "model": {"params": params, "calibration": calibration, "seed": seed, "folds": folds,
+                  "test_size": test_size, "n_jobs": n_jobs},
+        "metrics": {"cv_auc": [round(float(s), 6) for s in cv_auc],
+                    "cv_auc_mean": round(float(cv_auc.mean()), 6),
+                    "cv_auc_std": round(float(cv_auc.std()), 6),
+                    "holdout": holdout},
+        "search": search_report,
+        "timing": timing,
+        "environment": {"python": platform.python_version(), "sklearn": sklearn.__version__,
+                        "numpy": np.__version__, "pandas": pd.__version__},
+    }
+    manifest = write_artifacts(model, list(X.columns), manifest, out_dir, promote)
+    log(f"Version {manifest['version']} écrite dans {manifest['directory']}"
+        f"{' et promue dans ' + out_dir if promote else ''} ({timing['total_s']} s)")
+    return manifest
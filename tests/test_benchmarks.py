@@ -0,0 +1,27 @@
+import numpy as np
+
+from benchmarks.run import bench_size, parse_size
+from benchmarks.synthetic import feature_columns, make_panel, make_template_panel
+from services.labeling import compute_defaillance
+from services.preprocessing import basic_clean
+
+
+def test_panel_follows_feature_list_and_default_rate():
+    df = make_panel(5000, default_rate=0.2, comma_rate=0.25, seed=3)
+    assert set(feature_columns()) <= set(df.columns)
+    assert (df["NOM DE L'ENTREPRISE"] == "SONATEL SENEGAL").sum() == 10   # une ligne par année
+    assert (df.dtypes == object).sum() > 3                                 # colonnes à virgule décimale
+    clean = basic_clean(df.copy())
+    assert all(np.issubdtype(clean[c].dtype, np.number) for c in feature_columns())
+    assert abs(compute_defaillance(clean).mean() - 0.2) < 0.02
+    assert list(make_template_panel(3).columns) == ["Entreprise", "Secteur", "Proba_defaillance"]
+
+
+def test_bench_size_reports_every_stage(tmp_path):
+    assert parse_size("100k") == 100_000 and parse_size("1M") == 1_000_000
+    results = bench_size(300, repeat=1, workdir=str(tmp_path), excel_max_rows=0)
+    stages = {r["stage"]: r for r in results}
+    assert "skipped" in stages["read_excel"] and "skipped" in stages["download_xlsx"]
+    for name in ("basic_clean", "compute_defaillance", "predict_pd", "apply_full_notation",
+                 "status_filter", "download_csv", "download_parquet", "download_arrow"):
+        assert stages[name]["min_s"] >= 0 and stages[name]["rows"] == 300
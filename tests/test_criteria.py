@@ -0,0 +1,50 @@
+import numpy as np
+import pandas as pd
+
+from services.criteria import evaluate_criteria
+from services.labeling import compute_defaillance
+from services.pd_rules import pd_from_rules
+
+
+def _panel(n=500, seed=0):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        "Bénéfice net": rng.normal(1, 2, n),
+        "EBE": rng.normal(1, 2, n),
+        "capitaux propres": rng.choice([0.0, -1.0, 1.0, 3.0, np.nan], n),
+        "total dettes": rng.normal(2, 2, n),
+        "Rendement des capitaux propres (ROE)": rng.normal(0.1, 0.2, n),
+        "Levier financier": rng.normal(1, 0.5, n),
+        "Fonds de roulement": rng.normal(1, 2, n),
+    })
+    df.loc[rng.random(n) < 0.1, "EBE"] = np.nan
+    return df
+
+
+def _legacy_count(df):
+    cp, td = df["capitaux propres"], df["total dettes"]
+    ratio = (td / cp.replace(0, np.nan)).replace([np.inf, -np.inf], np.nan)
+    crits = [df["Bénéfice net"] < 0, df["EBE"] < 0, cp <= 0,
+             df["Rendement des capitaux propres (ROE)"] < 0, ratio > 1.5,
+             df["Levier financier"] > 1.0, df["Fonds de roulement"] < 0]
+    return sum(c.astype(int) for c in crits)
+
+
+def test_label_and_rule_pd_share_one_matrix():
+    df = _panel()
+    crit = evaluate_criteria(df)
+    assert crit.matrix.shape == (len(df), 7)
+    legacy = _legacy_count(df)
+    np.testing.assert_array_equal(compute_defaillance(df, criteria=crit), (legacy > 0).astype(int))
+    np.testing.assert_allclose(pd_from_rules(df, criteria=crit), (legacy / 5.0).clip(0, 1))
+    assert crit.breakdown().sum().sum() == legacy.sum()
+
+
+def test_thresholds_and_missing_columns():
+    df = _panel()[["Levier financier"]]
+    strict = evaluate_criteria(df, cfg={"levier_excessif": 0.5})
+    assert strict.names == ("levier_excessif",)
+    assert strict.count().sum() > evaluate_criteria(df).count().sum()
+    empty = pd.DataFrame({"x": [1.0]})
+    assert compute_defaillance(empty).tolist() == [0]
+    assert pd_from_rules(empty).tolist() == [0.05]
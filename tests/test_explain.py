@@ -0,0 +1,79 @@
+import uuid
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from app import create_app
+from benchmarks.synthetic import make_panel
+from services.explain import ExplanationCache, attribute, input_columns, model_explainer
+from services.flat_forest import compile_model, parity_sample
+from services.jobs import _run_explain, read_status
+from services.pipeline import score_frame, compact_result
+from services.preprocessing import squash_pd
+from services.result_store import MemoryResultStore, SpillingResultStore
+from services.training import feature_matrix, fit_model
+
+
+@pytest.fixture(scope="module")
+def result():
+    return compact_result(score_frame(make_panel(300, seed=4)))
+
+
+def _check_additive(model, flat):
+    X = parity_sample(flat, 500)
+    pdv, base, contrib = attribute(flat, X)
+    ref = squash_pd(pd.Series(model.predict_proba(pd.DataFrame(X, columns=flat.feature_names))[:, 1]))
+    np.testing.assert_allclose(pdv, ref.to_numpy(), atol=1e-9)
+    np.testing.assert_allclose(contrib.sum(axis=1), pdv - base, atol=1e-9)
+
+
+def test_contributions_sum_to_pd_minus_base(result):
+    import joblib
+    from services.model_registry import PIPE_PATH
+
+    flat, _ = model_explainer()
+    _check_additive(joblib.load(PIPE_PATH), flat)
+
+    X, y = feature_matrix(result.assign(Défaillance=result["Défaillance"].astype(int)))
+    calibrated = fit_model(X, y, {"n_estimators": 10, "max_leaf_nodes": 16}, seed=0, n_jobs=1, folds=3)
+    _check_additive(calibrated, compile_model(calibrated))
+
+
+def test_endpoint_explains_requested_rows_and_caches(result):
+    store = MemoryResultStore()
+    client = create_app(result_store=store).test_client()
+    ticket = store.put(result)
+    assert 'data-row="0"' in client.get(f"/status?id={ticket}&size=5").data.decode()
+
+    r = client.get(f"/api/v1/results/{ticket}/explain?rows=7,2&top=3").get_json()
+    assert [x["row"] for x in r["rows"]] == [7, 2] and len(r["rows"][0]["contributions"]) == 3
+    for x in r["rows"]:
+        assert x["pd"] == pytest.approx(float(result["Proba_defaillance"].iloc[x["row"]]), abs=1e-6)
+        assert bool(x["criteria_ko"]) == bool(result["Défaillance"].iloc[x["row"]])
+    full = client.get(f"/api/v1/results/{ticket}/explain?rows=2").get_json()["rows"][0]
+    assert sum(c["contribution"] for c in full["contributions"]) == pytest.approx(full["pd"] - full["base"])
+
+    assert client.get(f"/api/v1/results/{ticket}/explain").status_code == 400
+    assert client.get(f"/api/v1/results/{ticket}/explain?rows={len(result)}").status_code == 400
+    assert client.get(f"/api/v1/results/{uuid.uuid4()}/explain?rows=0").status_code == 404
+    assert client.get(f"/api/v1/results/{ticket}/explain.parquet").status_code == 404
+
+
+def test_full_run_job_serves_later_lookups(result, tmp_path):
+    store = SpillingResultStore(str(tmp_path / "store"))
+    ticket = store.put(result)
+    flat, version = model_explainer()
+    cache = ExplanationCache(str(tmp_path / "explanations"))
+    job_id = str(uuid.uuid4())
+    _run_explain(str(tmp_path), job_id, ticket, input_columns(result.columns, flat),
+                 cache.path(ticket, version), store.directory)
+    assert read_status(str(tmp_path), job_id)["state"] == "done"
+
+    def compute(rows):
+        raise AssertionError("lignes déjà calculées par le job")
+
+    (rec,) = cache.lookup(ticket, version, [len(result) - 1], compute)
+    assert rec["row"] == len(result) - 1
+    assert cache.lookup(ticket, version, [len(result) - 1], compute) == [rec] and cache.hits == 1
+    assert len(pd.read_parquet(cache.full(ticket, version))) == len(result)
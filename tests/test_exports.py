@@ -0,0 +1,50 @@
+import uuid
+
+import numpy as np
+import pandas as pd
+
+from services.exports import ExportCache, _csv_chunks, _write_xlsx
+
+
+def _frame(n=120):
+    rng = np.random.default_rng(0)
+    return pd.DataFrame({
+        "Entreprise": [f"SOC {i}" for i in range(n)],
+        "Proba_defaillance": rng.random(n),
+        "Overlay_bonus": rng.integers(0, 3, n),
+        "Reason": [None if i % 7 == 0 else "ABS=A | Q=BBB | B+1" for i in range(n)],
+    })
+
+
+def test_streamed_exports_match_pandas_writers(tmp_path, monkeypatch):
+    monkeypatch.setattr("services.exports.EXPORT_CHUNK_ROWS", 50)
+    df = _frame()
+    assert b"".join(_csv_chunks(df)) == df.to_csv(index=False).encode("utf-8")
+
+    _write_xlsx(df, str(tmp_path / "stream.xlsx"))
+    df.to_excel(tmp_path / "pandas.xlsx", index=False, sheet_name="Résultats")
+    pd.testing.assert_frame_equal(pd.read_excel(tmp_path / "stream.xlsx"), pd.read_excel(tmp_path / "pandas.xlsx"))
+
+
+def test_export_cache_reuses_files(tmp_path):
+    cache, ticket, df = ExportCache(str(tmp_path)), str(uuid.uuid4()), _frame()
+    assert cache.get(ticket, "parquet") is None
+    path = cache.build(df, ticket, "parquet")
+    assert cache.get(ticket, "parquet") == path
+    pd.testing.assert_frame_equal(pd.read_parquet(path), df)
+
+    streamed = b"".join(cache.stream_csv(df, ticket))
+    with open(cache.get(ticket, "csv"), "rb") as f:
+        assert f.read() == streamed
+
+
+def test_download_rejects_unknown_format():
+    from app import create_app
+    from services.result_store import MemoryResultStore
+
+    store = MemoryResultStore()
+    client = create_app(result_store=store).test_client()
+    ticket = store.put(_frame())
+    r = client.get(f"/download?id={ticket}&fmt=pdf")
+    assert r.status_code == 400 and "csv" in r.get_json()["error"]
+    assert client.get(f"/download?id={ticket}&fmt=csv").status_code == 200
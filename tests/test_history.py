@@ -0,0 +1,71 @@
+import io
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from app import create_app
+from services.history import HistoryStore
+from services.rerating import rating_codes, summarize
+from services.result_store import MemoryResultStore
+
+
+def _result(ratings, years=(2021, 2022)) -> pd.DataFrame:
+    names = ["Sonatel Sénégal", "ORANGE CI", "SGBCI"]
+    rows = [(n, y) for n in names for y in years]
+    return pd.DataFrame({
+        "Entreprise": [n for n, _ in rows],
+        "ANNEE": [y for _, y in rows],
+        "SECTEUR": ["Télécom", "Télécom", "Télécom", "Télécom", None, None],
+        "Proba_defaillance": np.linspace(0.05, 0.5, len(rows)),
+        "Notation_finale": pd.Categorical(ratings),
+    })
+
+
+@pytest.fixture
+def history(tmp_path):
+    h = HistoryStore(str(tmp_path / "history.sqlite3"))
+    h.append(_result(["AA", "A", "BBB", "BB", "B", None]), "u1", "v1", "a.xlsx")
+    h.append(_result(["AAA", "AA", "BBB", "BBB", "CCC", "CC"]), "u2", "v2", "b.xlsx")
+    return h
+
+
+def test_append_is_idempotent_and_history_is_chronological(history):
+    assert history.append(_result(["A"] * 6), "u1") == 0
+    assert [u["upload_id"] for u in history.uploads()] == ["u2", "u1"]
+    assert history.companies("sonatel") == [{"company": "SONATEL SENEGAL", "rows": 4, "uploads": 2}]
+
+    found = history.company_history("SONATEL SENEGAL", last=8)
+    assert [u["upload_id"] for u in found["uploads"]] == ["u1", "u2"]
+    assert [r["Notation_finale"] for u in found["uploads"] for r in u["rows"]] == ["AA", "A", "AAA", "AA"]
+    assert found["uploads"][0]["rows"][0]["company"] == "Sonatel Sénégal"
+    assert [u["upload_id"] for u in history.company_history("sonatel senegal", last=1)["uploads"]] == ["u2"]
+    assert history.company_history("INCONNUE") is None
+
+
+def test_migrations_use_latest_rating_per_firm_year(history):
+    m = history.migrations(2021, 2022)
+    expected = summarize(rating_codes(pd.Series(["AAA", "BBB", "CCC"])), rating_codes(pd.Series(["AA", "BBB", "CC"])))
+    assert m["companies"] == 3 and m["migration"] == expected["migration"] and m["downgrades"] == 2
+    only_u1 = history.migrations(2021, 2022, upload_id="u1")   # SGBCI 2022 non noté dans u1
+    assert only_u1["companies"] == 2 and only_u1["downgrades"] == 2
+    assert history.migrations(2021, 2022, sector="Télécom")["companies"] == 2
+    assert history.migrations(2021, 2022, upload_id="absent") is None
+
+
+def test_predict_feeds_history_and_endpoints(tmp_path):
+    h = HistoryStore(str(tmp_path / "history.sqlite3"))
+    client = create_app(result_store=MemoryResultStore(), history=h).test_client()
+    df = pd.DataFrame({"Entreprise": ["SONATEL SENEGAL", "SONATEL SENEGAL", "ORANGE CI"],
+                       "Année": [2021, 2022, 2022], "Bénéfice net": [1.0, -2.0, 3.0]})
+    buf = io.BytesIO(df.to_csv(index=False).encode())
+    assert client.post("/predict", data={"file": (buf, "panel.csv")}).status_code == 302
+    h.flush()
+
+    (upload,) = client.get("/api/v1/history/uploads").get_json()["uploads"]
+    assert upload["rows"] == 3 and upload["source"] == "panel.csv"
+    data = client.get("/api/v1/history/companies/sonatel senegal?year=2022").get_json()
+    assert [r["year"] for r in data["uploads"][0]["rows"]] == [2022]
+    assert client.get("/api/v1/history/migrations?from=2021").get_json()["companies"] == 1
+    assert client.get("/api/v1/history/migrations").status_code == 400
+    assert client.get("/api/v1/history/companies/absente").status_code == 404
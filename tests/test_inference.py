@@ -1,2 +1,131 @@
 def test_placeholder():
     assert True
+
+
+import os
+import joblib
+import numpy as np
+import pytest
+from sklearn.linear_model import LogisticRegression
+from sklearn.pipeline import Pipeline
+from sklearn.impute import SimpleImputer
+
+from services.model_registry import ModelRegistry, NoModelAvailable
+
+
+def _fit(n_iter=100):
+    X = np.array([[0.0], [1.0], [2.0], [3.0]])
+    y = np.array([0, 0, 1, 1])
+    return Pipeline([("imputer", SimpleImputer()), ("clf", LogisticRegression(max_iter=n_iter))]).fit(X, y)
+
+
+def test_registry_loads_once_and_reloads_on_change(tmp_path):
+    pipe_path = tmp_path / "pipeline.joblib"
+    joblib.dump(_fit(), pipe_path)
+    reg = ModelRegistry(str(pipe_path), str(tmp_path / "classifier.joblib"))
+
+    b1 = reg.get()
+    assert b1.mode == "A"
+    assert reg.get() is b1  # pas de rechargement sans changement
+
+    joblib.dump(_fit(n_iter=50), pipe_path)
+    os.utime(pipe_path, ns=(0, 1))
+    b2 = reg.get()
+    assert b2 is not b1 and b2.mode == "A"
+
+
+def test_registry_without_artifacts(tmp_path):
+    reg = ModelRegistry(str(tmp_path / "p.joblib"), str(tmp_path / "c.joblib"))
+    assert reg.warm() is None
+    with pytest.raises(NoModelAvailable):
+        reg.get()
+
+
+def test_microbatcher_matches_direct_calls(tmp_path):
+    from concurrent.futures import ThreadPoolExecutor
+    import pandas as pd
+    from services.inference import MicroBatcher
+
+    pipe_path = tmp_path / "pipeline.joblib"
+    joblib.dump(_fit(), pipe_path)
+    reg = ModelRegistry(str(pipe_path), str(tmp_path / "classifier.joblib"))
+    batcher = MicroBatcher(window_ms=50, max_rows=1000, registry=reg)
+
+    frames = [pd.DataFrame({"x": [i * 0.1, 3.0 - i * 0.1]}, index=[10 * i, 10 * i + 1]) for i in range(8)]
+    with ThreadPoolExecutor(8) as ex:
+        got = list(ex.map(batcher.predict, frames))
+
+    pipe = reg.get().pipe
+    for df, pd_pred in zip(frames, got):
+        np.testing.assert_array_equal(pd_pred, pipe.predict_proba(df)[:, 1])
+    stats = batcher.stats()
+    assert stats["requests"] == 8 and stats["batches"] < 8
+    assert sum(stats["batch_rows"].values()) == stats["batches"] and stats["rows"] == 16
+
+
+def test_microbatcher_relays_errors(tmp_path):
+    from services.inference import MicroBatcher
+    import pandas as pd
+
+    reg = ModelRegistry(str(tmp_path / "p.joblib"), str(tmp_path / "c.joblib"))
+    with pytest.raises(NoModelAvailable):
+        MicroBatcher(window_ms=1, registry=reg).predict(pd.DataFrame({"x": [1.0]}))
+
+
+def _forest_pipeline(calibrated=False):
+    from sklearn.calibration import CalibratedClassifierCV
+    from sklearn.ensemble import RandomForestClassifier
+
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(400, 5))
+    y = (X[:, 0] + X[:, 1] * X[:, 2] + rng.normal(0, 0.5, 400) > 0).astype(int)
+    X[rng.random(X.shape) < 0.1] = np.nan
+    pipe = Pipeline([("imputer", SimpleImputer(strategy="median")),
+                     ("rf", RandomForestClassifier(n_estimators=25, max_depth=5, random_state=0))])
+    if calibrated:
+        pipe = CalibratedClassifierCV(pipe, method="isotonic", cv=3)
+    return pipe.fit(X, y), X
+
+
+@pytest.mark.parametrize("calibrated", [False, True])
+def test_flat_forest_matches_predict_proba(calibrated):
+    from services.flat_forest import compile_model, check_parity
+
+    model, X = _forest_pipeline(calibrated)
+    flat = compile_model(model)
+    np.testing.assert_allclose(flat.predict_proba(X), model.predict_proba(X), atol=1e-12)
+    assert check_parity(model, flat) <= 1e-9
+
+
+def test_registry_prefers_matching_flat_artifact(tmp_path):
+    from services.flat_forest import FlatForest, compile_file
+
+    model, X = _forest_pipeline()
+    pipe_path = tmp_path / "pipeline.joblib"
+    joblib.dump(model, pipe_path)
+    compile_file(str(pipe_path))
+    reg = ModelRegistry(str(pipe_path), str(tmp_path / "classifier.joblib"))
+    assert isinstance(reg.get().pipe, FlatForest) and reg.get().mode == "A"
+    assert not isinstance(ModelRegistry(str(pipe_path), "", engine="sklearn").get().pipe, FlatForest)
+
+    # artefact compilé à partir d'un autre pipeline : ignoré
+    joblib.dump(_fit(), pipe_path)
+    os.utime(pipe_path, ns=(0, 1))
+    assert not isinstance(reg.get().pipe, FlatForest)
+
+
+def test_registry_maps_flat_forest_read_only(tmp_path):
+    from services.flat_forest import compile_file
+
+    model, X = _forest_pipeline(calibrated=True)
+    pipe_path = tmp_path / "pipeline.joblib"
+    joblib.dump(model, pipe_path)
+    compile_file(str(pipe_path))
+    shared = tmp_path / "mmap"
+    flat = ModelRegistry(str(pipe_path), "", mmap_dir=str(shared)).get().pipe
+    assert isinstance(flat.left, np.memmap) and not flat.left.flags.writeable
+    np.testing.assert_allclose(flat.predict_proba(X), model.predict_proba(X), atol=1e-12)
+
+    # second processus : dépliage déjà présent, réutilisé tel quel
+    again = ModelRegistry(str(pipe_path), "", mmap_dir=str(shared)).get().pipe
+    assert again.left.filename == flat.left.filename and len(list(shared.iterdir())) == 1
@@ -1,2 +1,39 @@
 def test_placeholder():
     assert True
+
+
+import io
+
+import pandas as pd
+from openpyxl import Workbook
+
+from services.io_excel import read_excel, read_excel_streaming, iter_excel_chunks, read_upload, spool_upload
+
+
+def _workbook(path):
+    wb = Workbook()
+    ws = wb.active
+    ws.append(["NOM ", "ANNEE", "EBE"])
+    ws.append(["SONATEL", 2021, 1.5])
+    ws.append([])                       # ligne vide intermédiaire conservée
+    ws.append(["ORANGE", 2022.0, "1,5"])
+    ws.append(["SAPH", None, 3])
+    ws.append([])                       # lignes vides finales ignorées
+    wb.save(path)
+
+
+def test_streaming_reader_matches_read_excel(tmp_path):
+    path = str(tmp_path / "t.xlsx")
+    _workbook(path)
+    with open(path, "rb") as f:
+        expected = read_excel(io.BytesIO(f.read()))
+    for chunk_rows in (1, 2, 1000):
+        pd.testing.assert_frame_equal(read_excel_streaming(path, chunk_rows), expected)
+    assert [len(c) for c in iter_excel_chunks(path, 2)] == [2, 2]
+
+
+def test_csv_and_parquet_uploads(tmp_path):
+    df = pd.DataFrame({"NOM": ["A", "B"], "EBE": [0.1, -2.25]})
+    for name, data in [("f.csv", df.to_csv(index=False, sep=";").encode()), ("f.parquet", df.to_parquet())]:
+        path = spool_upload(io.BytesIO(data), str(tmp_path))
+        pd.testing.assert_frame_equal(read_upload(path, name), df)
@@ -0,0 +1,19 @@
+import io
+
+import pytest
+
+from services import jobs
+from services.jobs import JobManager
+from services.result_store import MemoryResultStore
+
+
+def test_failed_submit_releases_its_slot(tmp_path, monkeypatch):
+    def broken_spool(*args, **kw):
+        raise OSError("disque plein")
+
+    monkeypatch.setattr(jobs, "spool_upload", broken_spool)
+    manager = JobManager(MemoryResultStore(), directory=str(tmp_path), max_pending=1)
+    for _ in range(3):   # sans libération, le 2e appel lèverait JobQueueFull
+        with pytest.raises(OSError):
+            manager.submit(io.BytesIO(b"x"), "panel.csv")
+    assert manager._pending == 0
@@ -0,0 +1,56 @@
+import os
+import time
+
+from app import create_app
+from services.metrics import Metrics, NULL_TIMER, SamplingProfiler
+from services.result_store import MemoryResultStore
+
+
+def test_stage_timer_feeds_histograms_and_server_timing():
+    m = Metrics(enabled=True)
+    timer = m.timer()
+    timer.stage("lecture")
+    timer.stage("inference")
+    total = timer.stop()
+    header = timer.server_timing(total)
+    assert header.startswith("lecture;dur=") and "inference;dur=" in header and "total;dur=" in header
+
+    m.inc("brvm_predicted_rows_total", 5, mode="pipeline")
+    m.collector("brvm_result_store_items", "gauge", "items", lambda: {(): 2})
+    m.collector("brvm_microbatch_batch_rows", "histogram", "rows", lambda: {(): ({"1": 2, "2": 0, "+Inf": 1}, 2000)})
+    text = m.render()
+    w = f'worker="{os.getpid()}"'   # chaque série est étiquetée par processus
+    assert f'brvm_stage_seconds_count{{stage="inference",{w}}} 1' in text
+    assert f'brvm_stage_seconds_bucket{{stage="lecture",{w},le="+Inf"}} 1' in text
+    assert f'brvm_predicted_rows_total{{mode="pipeline",{w}}} 5' in text
+    assert f"# TYPE brvm_result_store_items gauge\nbrvm_result_store_items{{{w}}} 2" in text
+    assert f'brvm_microbatch_batch_rows_bucket{{{w},le="2"}} 2' in text
+    assert f'brvm_microbatch_batch_rows_bucket{{{w},le="+Inf"}} 3' in text
+    assert f"brvm_microbatch_batch_rows_count{{{w}}} 3" in text
+
+
+def test_disabled_metrics_are_noops():
+    m = Metrics(enabled=False)
+    assert m.timer() is NULL_TIMER
+    m.inc("x")
+    m.observe("y", 1.0)
+    assert m.render() == "\n"
+
+
+def test_sampling_profiler_collapses_stacks():
+    prof = SamplingProfiler(interval_ms=1).start()
+    end = time.perf_counter() + 0.05
+    while time.perf_counter() < end:
+        sum(range(1000))
+    out = prof.stop().collapsed()
+    assert "test_sampling_profiler_collapses_stacks" in out
+
+
+def test_app_exposes_metrics_and_server_timing():
+    client = create_app(result_store=MemoryResultStore()).test_client()
+    r = client.post("/api/v1/score", json=[{"Bénéfice net": 1.0, "EBE": -1.0}])
+    assert r.status_code == 200 and "total;dur=" in r.headers["Server-Timing"]
+    text = client.get("/metrics").data.decode()
+    assert f'brvm_request_seconds_count{{endpoint="api_score",worker="{os.getpid()}"}}' in text
+    assert "brvm_rows_processed_total" in text
+    assert "# TYPE brvm_microbatch_queue_depth gauge" in text and "brvm_microbatch_batch_requests_count" in text
@@ -0,0 +1,63 @@
+import numpy as np
+import pandas as pd
+
+from services.pipeline import score_frame, score_chunked, compact_result
+from services.sketch import PDSketch
+
+
+def _panel(n=3000, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "NOM DE L'ENTREPRISE": rng.choice(["SONATEL SENEGAL", "SAPH", "BOA MALI"], n),
+        "SECTEUR D'ACTIVITE": rng.choice(["Télécom", "Agro-industrie", "Banque"], n),
+        "ANNEE": rng.choice([2020, 2021, 2022], n),
+        "Bénéfice net": rng.normal(1, 2, n) * 1e6,
+        "EBE": rng.normal(1, 2, n) * 1e6,
+        "capitaux propres": [f"{v:.3f}".replace(".", ",") for v in rng.normal(2, 2, n) * 1e6],
+        "total dettes": rng.normal(2, 1, n) * 1e6,
+        "Total actif": rng.normal(5, 2, n) * 1e6,
+        "Fonds de roulement": rng.normal(1, 2, n) * 1e6,
+        "Levier financier": rng.normal(1, 0.5, n),
+    })
+
+
+def test_sketch_quantiles_within_eps():
+    rng = np.random.default_rng(1)
+    values = rng.beta(0.7, 4, 50_000)
+    parts = [PDSketch(0.002).update(v) for v in np.array_split(values, 7)]
+    sk = parts[0]
+    for p in parts[1:]:
+        sk.merge(p)
+    qs = [0.07, 0.19, 0.5, 0.94, 0.98]
+    assert np.max(np.abs(sk.quantile(qs) - np.quantile(values, qs))) <= 0.002
+
+
+def test_chunked_scoring_tracks_exact_scoring():
+    df = _panel()
+    before = df.copy()
+    exact = score_frame(df)
+    chunked = pd.concat(score_chunked((df.iloc[i:i + 450] for i in range(0, len(df), 450)), eps=1e-4), ignore_index=True)
+    pd.testing.assert_frame_equal(df, before)  # entrée de l'appelant jamais modifiée
+
+    assert len(chunked) == len(exact)
+    np.testing.assert_allclose(chunked["Proba_defaillance"], exact["Proba_defaillance"].to_numpy())
+    for col in ["Notation_absolue", "Notation_quantiles", "Statut"]:
+        agree = (chunked[col].to_numpy() == exact[col].to_numpy()).mean()
+        assert agree > 0.97, (col, agree)
+
+
+def test_compact_result_roundtrips_through_store(tmp_path):
+    from services.result_store import SpillingResultStore, memory_report
+
+    full = score_frame(_panel(2000))
+    small = compact_result(full)
+    assert memory_report(small)["bytes"] * 3 < memory_report(full)["bytes"]
+    assert small["Notation_finale"].cat.ordered and small["Overlay_bonus"].dtype == np.int8
+    assert (small["Notation_finale"].astype(str) == full["Notation_finale"]).all()
+    np.testing.assert_allclose(small["Proba_defaillance"], full["Proba_defaillance"], rtol=1e-6)
+
+    store = SpillingResultStore(str(tmp_path))
+    ticket = store.put(small)
+    back = SpillingResultStore(str(tmp_path)).get(ticket)
+    pd.testing.assert_frame_equal(back, small)
+    assert store.memory_report(ticket)["columns"]["Statut"]["dtype"] == "category"
@@ -0,0 +1,83 @@
+import numpy as np
+import pandas as pd
+
+from config import RATING_ORDER
+from services.rating import (
+    Q_TARGET, _quantile_edges_from_pd, prob_to_abs_rating_dynamic,
+    _blend_notes, apply_sector_overlay, cap_vs_absolute, apply_full_notation,
+)
+
+
+def _reference_notation(df, col_pd, col_year, col_sector):
+    """Implémentation ligne à ligne historique, conservée comme oracle."""
+    out = df.copy()
+    out[col_pd] = pd.to_numeric(out[col_pd], errors="coerce").clip(0, 1)
+    out = out.dropna(subset=[col_pd]).copy()
+    edges = _quantile_edges_from_pd(out[col_pd])
+    u = out.groupby(col_year)[col_pd].rank(pct=True, method="average")
+    out["Notation_absolue"] = out[col_pd].apply(lambda x: prob_to_abs_rating_dynamic(x, edges))
+    out["Notation_quantiles"] = u.apply(lambda v: next((r for r in RATING_ORDER if v <= Q_TARGET[r]), "C"))
+    out["Notation_prudente"] = [_blend_notes(a, b) for a, b in zip(out["Notation_quantiles"], out["Notation_absolue"])]
+    notes, bonuses = [], []
+    for nb, p, s, na in zip(out["Notation_prudente"], out[col_pd], out[col_sector], out["Notation_absolue"]):
+        no, b = apply_sector_overlay(nb, p, s)
+        notes.append(cap_vs_absolute(no, na))
+        bonuses.append(b)
+    out["Notation_overlay"] = notes
+    out["Overlay_bonus"] = bonuses
+    out["Notation_finale"] = out["Notation_overlay"]
+    out["Reason"] = [f"ABS={a} | Q={q} | B+{b}" for a, q, b in
+                     zip(out["Notation_absolue"], out["Notation_quantiles"], out["Overlay_bonus"])]
+    return out
+
+
+def _panel(n=2000, seed=0):
+    rng = np.random.default_rng(seed)
+    pdv = rng.beta(0.8, 3, n)
+    pdv[rng.random(n) < 0.1] = 0.25       # ex-aequo
+    pdv[rng.random(n) < 0.02] = np.nan
+    return pd.DataFrame({
+        "PD": pdv,
+        "ANNEE": rng.choice([2020, 2021, 2022, np.nan], n),
+        "SECTEUR": rng.choice(np.array(["Télécom", "Électricité", "Banque", "Transport", "Commerce", None],
+                                       dtype=object), n),
+    })
+
+
+def test_vectorized_notation_matches_reference():
+    for seed in range(3):
+        df = _panel(seed=seed)
+        before = df.copy()
+        got = apply_full_notation(df, "PD", "ANNEE", "SECTEUR")
+        pd.testing.assert_frame_equal(df, before)  # entrée intacte malgré l'absence de copie
+        ref = _reference_notation(df, "PD", "ANNEE", "SECTEUR")
+        pd.testing.assert_frame_equal(got, ref)
+
+
+def test_empty_after_dropna():
+    df = pd.DataFrame({"PD": [np.nan], "ANNEE": [2020], "SECTEUR": ["Banque"]})
+    assert apply_full_notation(df, "PD", "ANNEE", "SECTEUR").empty
+
+
+def test_sector_bonus_codes_match_substring_rules():
+    from services.rating import _normtxt, sector_bonus_codes, sector_bonus_value
+
+    def legacy(sector):
+        if sector is None or (isinstance(sector, float) and np.isnan(sector)):
+            return 0
+        s = _normtxt(sector)
+        if any(k in s for k in ["eau", "electric", "energie", "utility", "electricite", "électricité"]):
+            return 2
+        if any(k in s for k in ["telecom", "télécom"]):
+            return 2
+        if any(k in s for k in ["banque", "bank", "finance", "assur"]):
+            return 1
+        if any(k in s for k in ["industrie", "manufact", "services", "transport", "logist", "agro", "mines"]):
+            return 1
+        return 0
+
+    sectors = pd.Series(["Télécommunications", "ÉNERGIE", "Banque & Assurances", "Agro-industrie",
+                         "Distribution", None, np.nan, "Réseaux d'eau", 42], dtype=object)
+    expected = [legacy(s) for s in sectors]
+    assert [sector_bonus_value(s) for s in sectors] == expected
+    assert sector_bonus_codes(sectors).tolist() == expected
@@ -0,0 +1,78 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from app import create_app
+from services.pipeline import score_frame, compact_result
+from services.rating import apply_full_notation
+from services.rerating import (
+    expand_grid, parse_params, rating_inputs, rerate, rerate_summary, sweep,
+)
+from services.result_store import MemoryResultStore
+
+
+def _result(n=3000, seed=0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    pdv = rng.beta(0.8, 3, n)
+    pdv[rng.random(n) < 0.1] = 0.25       # ex-aequo
+    df = pd.DataFrame({
+        "Entreprise": rng.choice(["SONATEL SENEGAL", "ORANGE CI", "SGBCI"], n),
+        "ANNEE": rng.choice([2020, 2021, 2022, np.nan], n),
+        "SECTEUR": rng.choice(np.array(["Télécom", "Électricité", "Banque", "Commerce", None], dtype=object), n),
+        "Proba_defaillance": pdv,
+    })
+    return compact_result(apply_full_notation(df, "Proba_defaillance", "ANNEE", "SECTEUR"))
+
+
+def test_default_params_reproduce_stored_ratings():
+    res = _result()
+    out = rerate(res, parse_params({}))
+    assert list(out.columns) == list(res.columns)
+    assert (out["Notation_finale"].astype(str) == res["Notation_finale"].astype(str)).all()
+    assert rerate_summary(res, out)["changed"] == 0
+
+
+def test_sweep_matches_rerate_per_set():
+    res = _result(seed=1)
+    params = expand_grid({
+        "grid": {"overlay_caps.max_up_over_abs": [0, 3], "target_shares.AAA": [2, 12]},
+        "base": {"overlay_caps": {"max_bonus_mid": 1}},
+        "sets": [{"abs_edges": {"AAA": 0.03}}],
+    })
+    assert len(params) == 5 and params[1].overlay_caps["max_bonus_mid"] == 1   # sets puis grille
+    got = sweep(rating_inputs(res), params)
+    for p, s in zip(params, got):
+        expected = rerate_summary(res, rerate(res, p))
+        assert s["distribution"] == expected["distribution"]
+        assert s["migration"] == expected["migration"]
+        assert s["params"] == p.as_dict()
+
+
+def test_invalid_params_are_rejected():
+    for spec in [{"target_shares": {"D": 1}}, {"overlay_caps": {"max_bonus_mid": 1.5}},
+                 {"abs_edges": {"AAA": 0.5}}, {"seuils": {}}]:
+        with pytest.raises(ValueError):
+            parse_params(spec)
+    with pytest.raises(ValueError):
+        expand_grid({"grid": {"target_shares.AAA": list(range(100))}})
+
+
+def test_rerate_and_sweep_endpoints():
+    store = MemoryResultStore()
+    client = create_app(result_store=store).test_client()
+    ticket = store.put(compact_result(score_frame(pd.DataFrame({
+        "Entreprise": ["A", "B", "C", "D"], "Année": [2021, 2021, 2022, 2022],
+        "Bénéfice net": [1.0, -2.0, 3.0, -1.0], "EBE": [-1.0, 2.0, 1.0, -3.0]}))))
+
+    r = client.post(f"/api/v1/results/{ticket}/rerate", json={"overlay_caps": {"max_up_over_abs": 0}})
+    data = r.get_json()
+    assert r.status_code == 200 and data["rows"] == 4 and sum(data["distribution"].values()) == 4
+    stored = store.get(data["ticket"])["Notation_finale"].astype(str).value_counts()
+    assert {k: v for k, v in data["distribution"].items() if v} == stored.to_dict()
+    assert client.get(data["rating_url"]).status_code == 200
+
+    r = client.post(f"/api/v1/results/{ticket}/sweep", json={"grid": {"overlay_caps.max_up_over_abs": [0, 1, 2]}})
+    data = r.get_json()
+    assert r.status_code == 200 and len(data["sets"]) == 3 and sum(data["baseline"].values()) == 4
+    assert client.post(f"/api/v1/results/{ticket}/sweep", json={}).status_code == 400
+    assert client.post("/api/v1/results/inconnu/rerate", json={}).status_code == 404
@@ -0,0 +1,71 @@
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from services.result_store import MemoryResultStore, SpillingResultStore
+
+
+def _frame(n=100):
+    return pd.DataFrame({
+        "Entreprise": [f"SOC {i}" for i in range(n)],
+        "Proba_defaillance": np.linspace(0, 1, n),
+        "Mixte": [1, "a"] * (n // 2),
+    })
+
+
+def test_memory_store_lru_and_budget():
+    store = MemoryResultStore(max_items=2, ttl_s=3600, max_bytes=10**9)
+    a, b = store.put(_frame()), store.put(_frame())
+    store.get(a)                    # a redevient le plus récent
+    c = store.put(_frame())
+    assert a in store and c in store and b not in store
+
+    tiny = MemoryResultStore(max_items=10, ttl_s=3600, max_bytes=1)
+    first, last = tiny.put(_frame()), tiny.put(_frame())
+    assert first not in tiny and last in tiny  # le dernier est toujours conservé
+
+
+def test_spilling_store_is_shared_and_projects(tmp_path):
+    writer = SpillingResultStore(str(tmp_path), max_items=1, ttl_s=3600, max_bytes=10**9)
+    ticket = writer.put(_frame())
+    other = SpillingResultStore(str(tmp_path), max_items=1, ttl_s=3600, max_bytes=10**9)
+
+    head = other.head(ticket)
+    assert list(head.columns) == ["Entreprise", "Proba_defaillance", "Mixte"] and head.empty
+    part = other.get(ticket, columns=["Proba_defaillance", "absente"])
+    assert list(part.columns) == ["Proba_defaillance"] and len(part) == 100
+    assert other.get("../../etc/passwd") is None
+
+    other.discard(ticket)
+    assert writer.get(ticket, columns=["Entreprise"]) is None
+
+
+def test_memory_hit_keeps_spill_file_alive(tmp_path):
+    store = SpillingResultStore(str(tmp_path), ttl_s=60)
+    ticket = store.put(_frame())
+    path = tmp_path / f"{ticket}.parquet"
+    os.utime(path, (time.time() - 120,) * 2)        # fichier ancien, ticket encore consulté en mémoire
+    assert store.get(ticket) is not None
+    assert SpillingResultStore(str(tmp_path), ttl_s=60).sweep() == 0 and path.exists()
+
+
+def test_expired_spill_file_is_not_revived_by_head(tmp_path):
+    ticket = SpillingResultStore(str(tmp_path), ttl_s=60).put(_frame())
+    path = tmp_path / f"{ticket}.parquet"
+    os.utime(path, (time.time() - 120,) * 2)
+    other = SpillingResultStore(str(tmp_path), ttl_s=60)    # ticket absent de sa mémoire
+    assert other.head(ticket) is None and not path.exists()
+
+
+def test_spill_dir_is_swept_within_disk_budget(tmp_path):
+    writer = SpillingResultStore(str(tmp_path), ttl_s=3600, sweep_interval_s=3600)
+    tickets = [writer.put(_frame()) for _ in range(4)]
+    size = os.path.getsize(tmp_path / f"{tickets[0]}.parquet")
+    for age, t in zip((10, 40, 30, 20), tickets):          # tickets[0] consulté le plus récemment
+        os.utime(tmp_path / f"{t}.parquet", (time.time() - age,) * 2)
+
+    store = SpillingResultStore(str(tmp_path), ttl_s=3600, max_disk_bytes=int(3.5 * size), sweep_interval_s=3600)
+    last = store.put(_frame())
+    assert {p.stem for p in tmp_path.glob("*.parquet")} == {tickets[0], tickets[3], last}
@@ -0,0 +1,46 @@
+import numpy as np
+import pandas as pd
+
+from services.schema import compile_schema, coerce_numeric
+
+
+def _legacy_clean(df):
+    for col in df.select_dtypes(include=["object"]).columns:
+        try:
+            df[col] = df[col].str.replace(",", ".").astype(float)
+        except Exception:
+            pass
+    return df
+
+
+def test_schema_resolves_aliases_once_per_header():
+    cols = ["NOM DE L'ENTREPRISE", "Secteur d'activité", "Année", "Bénéfice net", "ROE"]
+    schema = compile_schema(cols)
+    assert compile_schema(list(cols)) is schema  # cache par signature d'en-tête
+    assert schema.company_col == "NOM DE L'ENTREPRISE"
+    assert schema.sector_col == "Secteur d'activité" and schema.year_col == "Année"
+    assert schema.col("bénéfice net ") == "Bénéfice net"           # espace final du modèle
+    assert schema.col("rendement des capitaux propres (roe)") == "ROE"
+    # identifiants et features du modèle : rapprochement exact historique (entrées du modèle inchangées)
+    assert schema.id_cols == ("NOM DE L'ENTREPRISE",)
+    assert schema.feature_sources(["Bénéfice net ", "Bénéfice net", "ROE"]) == [None, "Bénéfice net", "ROE"]
+
+
+def test_coerce_numeric_matches_legacy_loop():
+    df = pd.DataFrame({
+        "NOM DE L'ENTREPRISE": ["SONATEL", "SAPH", "BOA"],
+        "capitaux propres": ["1,5", "-2,25", np.nan],
+        "Code": ["12", "7", "NaN"],
+        "Note": ["1,2", "n/a", "3"],
+        "EBE": [1.0, 2.0, 3.0],
+        "Mixte": [1.5, "2,5", None],                # non-texte -> NaN, comme .str.replace
+        "Graphies": ["1_000", " 2 ", "1e500"],      # lues par float() mais pas par to_numeric
+        "Proba_defaillance": ["0,1", "x", "0,3"],   # montant connu : pas de NaN forcé
+        "Entiers": pd.Series([1, 2, 3], dtype=object),
+    })
+    schema = compile_schema(df.columns)
+    assert schema.numeric == {"capitaux propres", "EBE", "Proba_defaillance"}
+    got = coerce_numeric(df.copy(), schema)
+    pd.testing.assert_frame_equal(got, _legacy_clean(df.copy()))
+    assert got["Note"].dtype == object and got["capitaux propres"].dtype == float
+    assert got["Proba_defaillance"].dtype == object and got["Graphies"].dtype == float
@@ -0,0 +1,55 @@
+import io
+
+import numpy as np
+
+from services.scoring_cache import RowPDCache, UploadCache, hash_stream, row_hashes
+
+
+def test_row_hashes_normalize_nan_and_signed_zero():
+    X = np.array([[0.0, np.nan, 1.5], [-0.0, -np.nan, 1.5], [0.0, 0.0, 1.5]])
+    h1, h2 = row_hashes(X)
+    assert h1[0] == h1[1] and h2[0] == h2[1]
+    assert h1[0] != h1[2]
+
+
+def test_row_cache_serves_seen_rows_and_evicts():
+    cache = RowPDCache(max_rows=4)
+    X = np.arange(12, dtype=float).reshape(6, 2)
+    calls = []
+
+    def fn(rows):
+        calls.append(list(rows))
+        return X[rows, 0] / 100
+
+    first = cache.predict(X[:3], "v1", lambda r: fn(r))
+    again = cache.predict(X[[2, 0, 1]], "v1", lambda r: fn(r))
+    assert calls == [[0, 1, 2]]
+    np.testing.assert_array_equal(again, first[[2, 0, 1]])
+    assert cache.stats()["hits"] == 3
+
+    cache.predict(X, "v1", lambda r: X[r, 0] / 100)
+    assert cache.stats()["rows"] == 4                     # borné
+    cache.predict(X[:1], "v2", lambda r: np.array([0.5]))  # nouvelle version : cache vidé
+    assert cache.stats()["rows"] == 1
+
+
+def test_upload_cache_requires_live_ticket(tmp_path):
+    stream = io.BytesIO(b"a;b\n1;2\n")
+    digest = hash_stream(stream)
+    assert stream.tell() == 0
+    cache = UploadCache(str(tmp_path), max_items=2, ttl_s=3600)
+    key = UploadCache.key(digest, "x.csv", "v1")
+    assert key != UploadCache.key(digest, "x.csv", "v2")
+
+    cache.put(key, "T1")
+    assert cache.get(key, lambda t: t == "T1") == "T1"
+    assert cache.get(key, lambda t: False) is None        # résultat expiré entre-temps
+    for i in range(3):
+        cache.put(f"k{i}", f"T{i}")
+    assert len(list(tmp_path.iterdir())) == 2
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+    from concurrent.futures import ThreadPoolExecutor
+    with ThreadPoolExecutor(8) as ex:                       # compteurs partagés par les threads du worker
+        list(ex.map(lambda _: cache.get("k2", lambda t: True), range(400)))
+    assert cache.stats()["hits"] + cache.stats()["misses"] == 402
@@ -0,0 +1,29 @@
+import pandas as pd
+
+from services.search import build_name_index, normalize_name
+
+
+def _legacy_mask(names: pd.Series, query: str) -> pd.Series:
+    norm = names.astype(str).map(normalize_name)
+    mask = pd.Series(True, index=names.index)
+    for t in normalize_name(query).split():
+        mask &= norm.str.contains(rf"\b{t}\b", regex=True, na=False)
+    return mask
+
+
+def test_index_matches_word_boundary_filter():
+    df = pd.DataFrame({"NOM DE L'ENTREPRISE": [
+        "SONATEL SENEGAL", "Orange Côte d'Ivoire", "SOCIÉTÉ GÉNÉRALE CI", "Sonatel  Mali",
+        None, "BOLLORÉ TRANSPORT & LOGISTICS", "SONATELLITE"]})
+    index = build_name_index(df)
+    assert index.ent_col == "NOM DE L'ENTREPRISE"
+    for q in ["sonatel", "SONATEL SENEGAL", "cote d'ivoire", "societe generale", "bollore &", "x", "nan"]:
+        expected = _legacy_mask(df[index.ent_col], q)
+        assert index.match_rows(q).tolist() == list(expected[expected].index), q
+
+
+def test_prefix_search():
+    df = pd.DataFrame({"Entreprise": ["SONATEL SENEGAL", "SONATELLITE", "ORANGE"]})
+    index = build_name_index(df)
+    assert index.match_rows("sonatel*").tolist() == [0, 1]
+    assert index.match_rows("sona* sen*").tolist() == [0]
@@ -0,0 +1,62 @@
+import json
+
+import numpy as np
+import pytest
+
+from app import create_app
+from benchmarks.synthetic import make_panel
+from services.pipeline import score_frame, compact_result
+from services.rerating import rating_codes
+from services.result_store import MemoryResultStore
+from services import stress
+from services.stress import build_context, parse_scenarios, run_stress
+
+
+@pytest.fixture(scope="module")
+def result():
+    return compact_result(score_frame(make_panel(400, seed=2)))
+
+
+def test_baseline_reproduces_stored_ratings_and_zero_shock(result):
+    ctx = build_context(result)
+    assert (ctx.baseline == rating_codes(result["Notation_finale"])).all()
+    scenarios, _ = parse_scenarios({"scenarios": [{"name": "zero"}]}, result.iloc[:0])
+    (summary,) = run_stress(ctx, scenarios)
+    assert summary["pd_mean_delta"] == 0 and summary["downgrades_pct"] == summary["upgrades_pct"] == 0
+    assert np.trace(np.array(summary["migration"])) == len(result)
+
+
+def test_replicate_blocks_do_not_change_results(result, monkeypatch):
+    ctx = build_context(result)
+    body = {"scenarios": [{"name": "mc", "replicates": 6, "sigma": 0.2, "seed": 7},
+                          {"name": "choc", "shocks": {"levier financier": 0.5, "EBE": -0.2}}]}
+    scenarios, _ = parse_scenarios(body, result.iloc[:0])
+    whole = list(run_stress(ctx, scenarios))
+    monkeypatch.setattr(stress, "STRESS_BLOCK_ROWS", len(result) * 2)    # 3 blocs de 2 réplicats
+    blocks = list(run_stress(ctx, scenarios))
+    assert whole == blocks
+    assert whole[0]["rows"] == 6 * len(result) and whole[1]["replicates"] == 1
+    assert whole[1]["pd_mean_delta"] > 0 and whole[1]["downgrades_pct"] > 0
+
+
+def test_invalid_scenarios_are_rejected(result):
+    head = result.iloc[:0]
+    for body in [{}, {"scenarios": [{"shocks": {"Entreprise": 0.1}}]},
+                 {"scenarios": [{"sigma": -1}]}, {"scenarios": [{"name": "x"}], "calibration": "?"}]:
+        with pytest.raises(ValueError):
+            parse_scenarios(body, head)
+
+
+def test_stress_endpoint_streams_one_line_per_scenario(result):
+    store = MemoryResultStore()
+    client = create_app(result_store=store).test_client()
+    ticket = store.put(result)
+    r = client.post(f"/api/v1/results/{ticket}/stress", json={
+        "calibration": "panel",
+        "scenarios": [{"name": "choc", "shocks": {"capitaux propres": -0.1}},
+                      {"name": "mc", "replicates": 3, "sigma": 0.05}]})
+    lines = [json.loads(line) for line in r.data.decode().splitlines()]
+    assert r.status_code == 200 and r.mimetype == "application/x-ndjson"
+    assert lines[0]["baseline"]["rows"] == len(result)
+    assert [line["scenario"] for line in lines[1:]] == ["choc", "mc"]
+    assert client.post(f"/api/v1/results/{ticket}/stress", json={"scenarios": []}).status_code == 400
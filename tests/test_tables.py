@@ -0,0 +1,55 @@
+import numpy as np
+import pandas as pd
+
+from app import create_app
+from config import RATING_ORDER
+from services.result_store import MemoryResultStore
+from services.tables import build_table_view
+
+
+def _result() -> pd.DataFrame:
+    return pd.DataFrame({
+        "Entreprise": ["SONATEL SENEGAL", "ORANGE CI", "SONATEL MALI", "ORANGE CI", "SONATEL SENEGAL"],
+        "Année": [2021, 2020, 2022, 2019, 2020],
+        "Statut": ["Saine", "Défaillante", "Saine", "Saine", "Défaillante"],
+        "Proba_defaillance": [0.10, 0.80, np.nan, 0.30, 0.55],
+        "Notation_finale": ["AA", "CCC", "A", "BBB", "B"],
+    })
+
+
+def test_aggregates_match_filtered_frame():
+    df = _result()
+    view = build_table_view(df, lambda cols: df[cols])
+    for q in ["", "sonatel", "orange", "absent"]:
+        out = view.page(q, size=2)
+        sub = df if not q else df[df["Entreprise"].str.contains(q.upper())]
+        assert out["kpi"] == {"n": len(sub), "nb_saines": int((sub["Statut"] == "Saine").sum()),
+                              "nb_def": int((sub["Statut"] == "Défaillante").sum())}, q
+        assert out["dist"] == sub["Notation_finale"].value_counts().reindex(RATING_ORDER, fill_value=0).to_dict()
+        assert out["pages"] == max(1, -(-len(sub) // 2))
+
+
+def test_sort_and_page():
+    df = _result()
+    view = build_table_view(df, lambda cols: df[cols])
+    assert view.page(sort="pd")["positions"].tolist() == [0, 3, 4, 1, 2]   # NaN en dernier
+    assert view.page(sort="pd", descending=True)["positions"].tolist() == [1, 4, 3, 0, 2]
+    assert view.page(sort="annee", page=2, size=2)["positions"].tolist() == [4, 0]
+    assert view.page("sonatel", sort="note")["positions"].tolist() == [0, 2, 4]
+    assert view.page(page=99, size=2)["page"] == 3
+
+
+def test_json_table_endpoint():
+    store = MemoryResultStore()
+    client = create_app(result_store=store).test_client()
+    ticket = store.put(_result())
+    r = client.get(f"/api/v1/results/{ticket}/table?view=status&sort=pd&order=desc&size=2&company=orange")
+    data = r.get_json()
+    assert r.status_code == 200 and data["total"] == 2 and data["pages"] == 1
+    assert [row["PD (%)"] for row in data["rows"]] == [80.0, 30.0]
+    r = client.get(f"/api/v1/results/{ticket}/table?view=rating&page=3&size=2")
+    assert r.get_json()["rows"] == [{"Entreprise": "SONATEL SENEGAL", "Année": 2020, "Notation_finale": "B"}]
+    assert client.get(f"/api/v1/results/{ticket}/table?view=x").status_code == 400
+    assert client.get("/api/v1/results/inconnu/table").status_code == 404
+    html = client.get(f"/status?id={ticket}&size=2").data.decode()
+    assert "Page 1 / 3 — 5 lignes" in html
@@ -0,0 +1,62 @@
+import json
+import os
+
+import pytest
+
+from app import create_app
+from benchmarks.synthetic import make_panel, write_upload
+from services import inference
+from services.model_registry import ModelRegistry
+from services.training import feature_matrix, load_dataset, train
+from train_model import main
+
+
+@pytest.fixture(scope="module")
+def panel_path(tmp_path_factory):
+    return write_upload(make_panel(600, seed=3), str(tmp_path_factory.mktemp("data") / "panel.csv"))
+
+
+def _quiet(*_):
+    pass
+
+
+def test_dataset_cache_and_features(panel_path, tmp_path):
+    df, digest, hit = load_dataset(panel_path, cache_dir=str(tmp_path))
+    again, digest2, hit2 = load_dataset(panel_path, cache_dir=str(tmp_path))
+    assert (hit, hit2) == (False, True) and digest == digest2
+    assert again.equals(df)
+    X, y = feature_matrix(again)
+    assert "IDENTIFIANT" not in X.columns and "ANNEE" not in X.columns and "Défaillance" not in X.columns
+    assert 0 < y.sum() < len(y)
+
+
+def test_train_writes_versioned_artifacts_and_is_reproducible(panel_path, tmp_path):
+    out, cache = str(tmp_path / "models"), str(tmp_path / "cache")
+    kw = dict(out_dir=out, cache_dir=cache, params={"n_estimators": 30}, folds=3, n_jobs=1, log=_quiet)
+    m1 = train(panel_path, search=4, **kw)
+    m2 = train(panel_path, search=4, promote=False, **kw)
+    assert m2["source"]["cache_hit"] and m1["artifacts"] == m2["artifacts"]
+    assert m1["search"]["candidates"][0] == 4 and m1["search"]["trees"] == [10, 30]
+    assert m1["flat_parity_error"] == 0.0 and 0.5 < m1["metrics"]["cv_auc_mean"] <= 1
+    with open(os.path.join(m1["directory"], "manifest.json"), encoding="utf-8") as f:
+        assert json.load(f)["version"] == m1["version"]
+    with open(os.path.join(out, "feature_list.json"), encoding="utf-8") as f:
+        assert json.load(f) == m1["features"]
+
+    bundle = ModelRegistry(os.path.join(out, "pipeline.joblib"), os.path.join(out, "classifier.joblib"),
+                           mmap_dir=None).get()
+    assert bundle.mode == "A" and bundle.manifest["version"] == m1["version"]
+
+
+def test_cli_without_calibration_and_model_endpoint(panel_path, tmp_path, monkeypatch):
+    out = str(tmp_path / "models")
+    m = main([panel_path, "--out", out, "--cache-dir", "", "--calibration", "none",
+              "--n-estimators", "10", "--folds", "3", "--n-jobs", "1", "--no-promote"])
+    assert not m["promoted"] and not os.path.exists(os.path.join(out, "pipeline.joblib"))
+    assert m["model"]["calibration"] == "none" and m["model"]["params"]["n_estimators"] == 10
+
+    registry = ModelRegistry(os.path.join(m["directory"], "pipeline.joblib"),
+                             os.path.join(m["directory"], "classifier.joblib"), mmap_dir=None)
+    monkeypatch.setattr(inference, "REGISTRY", registry)
+    data = create_app().test_client().get("/api/v1/model").get_json()
+    assert data["mode"] == "pipeline" and data["manifest"]["source"]["sha256"] == m["source"]["sha256"]